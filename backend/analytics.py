@@ -0,0 +1,407 @@
+"""
+FINMAR subscription analytics.
+Vectorized NumPy computations over subscriptions held as columnar arrays: monthly
+cohorts and retention, churn by plan, plan-change flows, and MRR movements with a
+forward revenue projection. Nothing here touches the database; server.py loads the
+records and caches the results.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Months are counted from 1970-01 so month arithmetic is integer arithmetic
+OPEN_END = np.iinfo(np.int64).max
+START_OFFSET_MAX = 2 ** 32 - 1
+# Epoch seconds stand in for timestamps; a missing one sorts after every real one
+NO_TIMESTAMP = np.iinfo(np.int64).max
+
+END_ACTIVE = 0
+END_CANCELLED = 1
+END_REPLACED = 2
+END_OTHER = 3
+
+
+def factorize(values: Sequence[Any], sort: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer codes per distinct value, and the distinct values.
+
+    pandas groups the values by equality in one hash-table pass, so distinct values never
+    share a code. Labels come out sorted, keeping codes and label order the same from run to
+    run; sort=False keeps first-seen order instead, for columns such as user ids where only
+    the grouping matters and sorting every distinct value would cost more than the grouping.
+    """
+    codes, labels = pd.factorize(np.array(values, dtype=object))
+    codes = codes.astype(np.int64, copy=False)
+    if not sort:
+        return codes, labels
+    # Sorting the distinct values and remapping the codes by rank beats sorting in pandas
+    order = np.argsort(labels, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[codes], labels[order]
+
+
+def epoch_seconds(values: Sequence[str]) -> np.ndarray:
+    """Epoch seconds for "YYYY-MM-DDTHH:MM:SS" strings, NO_TIMESTAMP for "" """
+    seconds = np.array(values, dtype="datetime64[s]")
+    return np.where(np.isnat(seconds), NO_TIMESTAMP, seconds.astype(np.int64))
+
+
+def to_months(seconds: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 for each epoch second; NO_TIMESTAMP becomes OPEN_END.
+
+    Calendar conversion runs once per distinct day (a few thousand) and rows look their
+    month up by day, which is far cheaper than converting every row.
+    """
+    missing = seconds == NO_TIMESTAMP
+    days = np.where(missing, 0, seconds) // 86400
+    first_day = days.min(initial=0)
+    day_months = np.arange(first_day, days.max(initial=0) + 1).astype("datetime64[D]").astype("datetime64[M]")
+    result = day_months.astype(np.int64)[days - first_day]
+    result[missing] = OPEN_END
+    return result
+
+
+def month_index(day: str) -> int:
+    return int(np.datetime64(day[:7], "M").astype(np.int64))
+
+
+def month_label(index: int) -> str:
+    return str(np.datetime64(int(index), "M"))
+
+
+STATUS_REASONS = {"active": END_ACTIVE, "cancelled": END_CANCELLED, "inactive": END_REPLACED}
+
+
+class SubscriptionColumns:
+    """Subscriptions as parallel arrays, one row per subscription.
+
+    Takes one sequence per column with no missing values: tiers as "plan_type/plan_tier",
+    add-ons comma-joined and timestamps as epoch seconds (NO_TIMESTAMP when absent), so no
+    date is parsed here. from_records builds them from subscription documents; server.py
+    has MongoDB project them directly.
+    """
+
+    def __init__(
+        self,
+        user_ids: Sequence[str],
+        plan_tiers: Sequence[str],
+        statuses: Sequence[str],
+        amounts: Sequence[float],
+        started: Sequence[int],
+        ended: Sequence[int],
+        add_ons: Optional[Sequence[str]] = None,
+        next_billing: Optional[Sequence[int]] = None
+    ):
+        self.size = len(user_ids)
+        self.user, self.user_labels = factorize(user_ids, sort=False)
+        self.tier, self.tier_labels = factorize(plan_tiers)
+        # Plan types are the tier labels' prefix, so they come from the few labels, not every row
+        tier_plans = [label.split("/", 1)[0] for label in self.tier_labels]
+        plan_codes, self.plan_labels = factorize(tier_plans)
+        self.plan = plan_codes[self.tier] if self.size else np.zeros(0, dtype=np.int64)
+        status, status_labels = factorize(statuses)
+        reasons = np.array([STATUS_REASONS.get(label, END_OTHER) for label in status_labels], dtype=np.int8)
+        self.reason = reasons[status] if self.size else np.zeros(0, dtype=np.int8)
+        self.amount = np.asarray(amounts, dtype=np.float64)
+        self.add_on, self.add_on_labels = factorize(add_ons if add_ons is not None else [""] * self.size)
+        billing = np.asarray(next_billing if next_billing is not None else [NO_TIMESTAMP] * self.size, dtype=np.int64)
+        self.next_billing = np.where(
+            billing == NO_TIMESTAMP, np.datetime64("NaT", "D"), (billing // 86400).astype("datetime64[D]")
+        )
+
+        self.start_second = np.asarray(started, dtype=np.int64)
+        self.start = to_months(self.start_second)
+        self.end = to_months(np.asarray(ended, dtype=np.int64))
+        self.end[self.reason == END_ACTIVE] = OPEN_END
+
+        # Each user's subscriptions in start order; the next row is the successor. Start offsets
+        # fit in 32 bits (136 years; missing starts sort last), so user and start pack into one
+        # int64 key and a single stable sort
+        first_second = self.start_second.min() if self.size else 0
+        start_offset = np.minimum(self.start_second - first_second, START_OFFSET_MAX)
+        self.order = np.argsort((self.user << 32) | start_offset, kind="stable")
+        users = self.user[self.order]
+        self.has_successor = np.zeros(self.size, dtype=bool)
+        self.has_successor[self.order[:-1]] = users[:-1] == users[1:]
+        self.successor = np.full(self.size, -1, dtype=np.int64)
+        self.successor[self.order[:-1]] = self.order[1:]
+        self.predecessor = np.full(self.size, -1, dtype=np.int64)
+
+        # Older rows lack an end date: a superseded plan ended when its successor started,
+        # and anything else that is no longer active is taken to have ended in its first month
+        missing = (self.reason != END_ACTIVE) & (self.end == OPEN_END)
+        inferred = missing & self.has_successor
+        self.end[inferred] = self.start[self.successor[inferred]]
+        self.end[missing & ~inferred] = self.start[missing & ~inferred]
+        self.reason[(self.reason == END_OTHER) & self.has_successor] = END_REPLACED
+
+        # A replaced plan carries on into its successor; cancelled ones do not
+        continued = np.flatnonzero((self.reason == END_REPLACED) & self.has_successor)
+        self.predecessor[self.successor[continued]] = continued
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "SubscriptionColumns":
+        def timestamps(values: List[Optional[str]]) -> np.ndarray:
+            return epoch_seconds([value[:19] if value else "" for value in values])
+
+        return cls(
+            [record.get("user_id") or "" for record in records],
+            [f"{record.get('plan_type') or 'unknown'}/{record.get('plan_tier') or 'unknown'}" for record in records],
+            [record.get("status") or "" for record in records],
+            [record.get("amount") or 0.0 for record in records],
+            timestamps([record.get("start_date") or record.get("created_at") for record in records]),
+            timestamps([record.get("cancelled_at") or record.get("ended_at") for record in records]),
+            [",".join(record.get("add_ons") or []) for record in records],
+            timestamps([record.get("next_billing_date") for record in records])
+        )
+
+
+def cohort_retention(columns: SubscriptionColumns, as_of: int, max_offset: int = 24) -> List[Dict[str, Any]]:
+    """Share of each monthly signup cohort still subscribed k months later"""
+    if not columns.size:
+        return []
+    user_count = len(columns.user_labels)
+    first = np.full(user_count, OPEN_END, dtype=np.int64)
+    np.minimum.at(first, columns.user, columns.start)
+    last = np.zeros(user_count, dtype=np.int64)
+    np.maximum.at(last, columns.user, columns.end)
+
+    valid = first <= as_of
+    first, last = first[valid], last[valid]
+    cohort_months, cohort = np.unique(first, return_inverse=True)
+    lifetime = np.clip(np.minimum(last, as_of + 1) - first, 0, max_offset + 1)
+
+    # counts[c, l] = users of cohort c whose subscription lasted exactly l months (capped)
+    width = max_offset + 2
+    counts = np.bincount(cohort * width + lifetime, minlength=len(cohort_months) * width).reshape(-1, width)
+    retained = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+    sizes = counts.sum(axis=1)
+
+    cohorts = []
+    for index, month in enumerate(cohort_months):
+        observed = min(int(as_of - month), max_offset) + 1
+        cohorts.append({
+            "cohort": month_label(month),
+            "size": int(sizes[index]),
+            "retention": np.round(retained[index, :observed] / sizes[index], 4).tolist()
+        })
+    return cohorts
+
+
+def churn_by_group(
+    columns: SubscriptionColumns, group: np.ndarray, labels: np.ndarray, as_of: int, months: int = 12
+) -> Dict[str, Dict[str, Any]]:
+    """Monthly churn rate per group: cancellations in a month over subscriptions active at its start"""
+    first_month = as_of - months + 1
+    span = months + 1
+    groups = len(labels)
+
+    # Bucket starts and ends into [before window, window months...]; later months are dropped
+    start_bucket = np.clip(columns.start - first_month + 1, 0, span)
+    end_bucket = np.clip(np.where(columns.end == OPEN_END, as_of + 1, columns.end) - first_month + 1, 0, span)
+    churned = (columns.reason == END_CANCELLED) | (columns.reason == END_OTHER)
+
+    def histogram(flat: np.ndarray) -> np.ndarray:
+        return np.bincount(flat, minlength=groups * (span + 1)).reshape(groups, span + 1)
+
+    group_offset = group * (span + 1)
+    end_flat = group_offset + end_bucket
+    starts = histogram(group_offset + start_bucket)
+    ends = histogram(end_flat)
+    cancellations = histogram(end_flat[churned])
+
+    # Active at the start of window month m = started before m minus ended before m
+    active = (starts.cumsum(axis=1) - ends.cumsum(axis=1))[:, :months]
+    lost = cancellations[:, 1:months + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(active > 0, lost / active, 0.0)
+        overall = np.where(active.sum(axis=1) > 0, lost.sum(axis=1) / active.sum(axis=1), 0.0)
+
+    month_labels = [month_label(month) for month in range(first_month, as_of + 1)]
+    return {
+        str(label): {
+            "months": month_labels,
+            "active": active[index].tolist(),
+            "churned": lost[index].tolist(),
+            "churn_rate": np.round(rate[index], 4).tolist(),
+            "average_churn_rate": round(float(overall[index]), 4)
+        }
+        for index, label in enumerate(labels)
+    }
+
+
+def plan_change_flows(columns: SubscriptionColumns, limit: int = 50) -> Dict[str, Any]:
+    """Counts of plan changes between tiers, split into upgrades, downgrades and lateral moves"""
+    changed = np.flatnonzero((columns.reason == END_REPLACED) & columns.has_successor)
+    following = columns.successor[changed]
+    direction = np.sign(columns.amount[following] - columns.amount[changed]).astype(np.int8)
+
+    tiers = len(columns.tier_labels)
+    pairs = columns.tier[changed] * tiers + columns.tier[following]
+    pair_codes, inverse, pair_counts = np.unique(pairs, return_inverse=True, return_counts=True)
+    # A pair's direction is the majority over its changes (add-ons can tip individual ones)
+    pair_direction = np.sign(np.bincount(inverse, weights=direction, minlength=len(pair_codes))).astype(np.int8)
+
+    names = {1: "upgrade", -1: "downgrade", 0: "lateral"}
+    top = np.argsort(-pair_counts, kind="stable")[:limit]
+    return {
+        "upgrades": int((direction > 0).sum()),
+        "downgrades": int((direction < 0).sum()),
+        "lateral": int((direction == 0).sum()),
+        "flows": [
+            {
+                "from": str(columns.tier_labels[pair_codes[index] // tiers]),
+                "to": str(columns.tier_labels[pair_codes[index] % tiers]),
+                "count": int(pair_counts[index]),
+                "direction": names[int(pair_direction[index])]
+            }
+            for index in top
+        ]
+    }
+
+
+def subscription_analytics(columns: SubscriptionColumns, as_of: str, months: int = 12, max_offset: int = 24) -> Dict[str, Any]:
+    """Cohorts, churn by plan type and tier, and plan-change flows as of a YYYY-MM-DD date"""
+    as_of_month = month_index(as_of)
+    return {
+        "as_of": as_of,
+        "subscriptions": columns.size,
+        "cohorts": cohort_retention(columns, as_of_month, max_offset),
+        "churn_by_plan_type": churn_by_group(columns, columns.plan, columns.plan_labels, as_of_month, months),
+        "churn_by_plan_tier": churn_by_group(columns, columns.tier, columns.tier_labels, as_of_month, months),
+        "plan_changes": plan_change_flows(columns)
+    }
+
+
+def monthly_recurring_revenue(
+    columns: SubscriptionColumns, plan_prices: Dict[str, float], add_on_prices: Dict[str, float]
+) -> np.ndarray:
+    """Monthly value of each subscription: catalog plan price plus recurring add-ons.
+
+    Plans missing from the catalog fall back to the charged amount. Prices are looked up once
+    per distinct tier and add-on combination, then broadcast to the rows.
+    """
+    base = np.array([plan_prices.get(label, np.nan) for label in columns.tier_labels], dtype=np.float64)
+    extras = np.array([
+        sum(add_on_prices.get(name, 0.0) for name in label.split(",") if name) for label in columns.add_on_labels
+    ], dtype=np.float64)
+    if not columns.size:
+        return np.zeros(0, dtype=np.float64)
+    value = base[columns.tier] + extras[columns.add_on]
+    return np.where(np.isnan(value), columns.amount, value)
+
+
+def mrr_movements(columns: SubscriptionColumns, mrr: np.ndarray, as_of: int, months: int = 12) -> List[Dict[str, Any]]:
+    """Opening and closing MRR per month with its new, expansion, contraction and churn components"""
+    first_month = as_of - months + 1
+    carried = columns.predecessor >= 0
+    change = np.where(carried, mrr - mrr[columns.predecessor], 0.0)
+    continued = (columns.reason == END_REPLACED) & columns.has_successor
+    lost = (columns.end != OPEN_END) & ~continued
+
+    # Bucket 0 is before the window and months + 1 after it, so each sum is one bincount
+    start_bucket = np.clip(columns.start - first_month + 1, 0, months + 1)
+    end_bucket = np.clip(columns.end - first_month + 1, 0, months + 1)
+
+    def monthly(bucket: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        return np.bincount(bucket, weights=weights, minlength=months + 2)[1:months + 1]
+
+    # A plan change ends one row and starts the next in the same month, so its net effect
+    # on closing MRR is the price difference
+    opening = mrr[(columns.start < first_month) & (columns.end >= first_month)].sum()
+    closing = opening + np.cumsum(monthly(start_bucket, mrr) - monthly(end_bucket, mrr))
+    new = monthly(start_bucket, np.where(carried, 0.0, mrr))
+    expansion = monthly(start_bucket, np.maximum(change, 0.0))
+    contraction = monthly(start_bucket, np.maximum(-change, 0.0))
+    churn = monthly(end_bucket, np.where(lost, mrr, 0.0))
+    openings = np.concatenate(([opening], closing[:-1]))
+
+    return [
+        {
+            "month": month_label(first_month + index),
+            "opening_mrr": round(float(openings[index]), 2),
+            "new": round(float(new[index]), 2),
+            "expansion": round(float(expansion[index]), 2),
+            "contraction": round(float(contraction[index]), 2),
+            "churn": round(float(churn[index]), 2),
+            "net_new": round(float(new[index] + expansion[index] - contraction[index] - churn[index]), 2),
+            "closing_mrr": round(float(closing[index]), 2)
+        }
+        for index in range(months)
+    ]
+
+
+def movement_rates(history: List[Dict[str, Any]], lookback: int = 3) -> Dict[str, float]:
+    """Average monthly rates over the last completed months; contraction counts as churn"""
+    completed = history[-lookback - 1:-1]
+    opening = sum(month["opening_mrr"] for month in completed)
+    if opening <= 0:
+        return {"churn_rate": 0.0, "growth_rate": 0.0, "lookback_months": len(completed)}
+    churned = sum(month["churn"] + month["contraction"] for month in completed)
+    grown = sum(month["new"] + month["expansion"] for month in completed)
+    return {
+        "churn_rate": round(churned / opening, 4),
+        "growth_rate": round(grown / opening, 4),
+        "lookback_months": len(completed)
+    }
+
+
+def mrr_projection(
+    columns: SubscriptionColumns, mrr: np.ndarray, as_of: str, rates: Dict[str, float],
+    months: int = 12, billing_days: int = 30
+) -> List[Dict[str, Any]]:
+    """Renewals expected per month from next billing dates, decayed by churn, and projected MRR"""
+    today = np.datetime64(as_of, "D")
+    active = columns.reason == END_ACTIVE
+    values = mrr[active]
+    billing = columns.next_billing[active]
+    billing = np.where(np.isnat(billing), today, billing)
+    # Overdue subscriptions stay on their billing cycle
+    behind = (today - billing).astype(np.int64)
+    billing = billing + np.where(behind > 0, -(-behind // billing_days) * billing_days, 0)
+
+    def renewals_before(bound: np.datetime64) -> np.ndarray:
+        remaining = (bound - billing).astype(np.int64)
+        return np.maximum(0, -(-remaining // billing_days))
+
+    current = float(values.sum())
+    retention = 1.0 - rates["churn_rate"]
+    net_rate = rates["growth_rate"] - rates["churn_rate"]
+    first_month = month_index(as_of)
+    projection = []
+    before = renewals_before(today)
+    for index in range(months):
+        bound = np.datetime64(month_label(first_month + index + 1), "M").astype("datetime64[D]")
+        upto = renewals_before(bound)
+        renewals = upto - before
+        scheduled = float(renewals @ values)
+        projection.append({
+            "month": month_label(first_month + index),
+            "renewals": int(renewals.sum()),
+            "scheduled_revenue": round(scheduled, 2),
+            "expected_revenue": round(scheduled * retention ** index, 2),
+            "projected_mrr": round(current * (1 + net_rate) ** index, 2)
+        })
+        before = upto
+    return projection
+
+
+def mrr_analytics(
+    columns: SubscriptionColumns, plan_prices: Dict[str, float], add_on_prices: Dict[str, float],
+    as_of: str, months: int = 12, projection_months: int = 12, lookback: int = 3
+) -> Dict[str, Any]:
+    """Current MRR, its monthly movements, and a forward revenue projection as of a YYYY-MM-DD date"""
+    mrr = monthly_recurring_revenue(columns, plan_prices, add_on_prices)
+    history = mrr_movements(columns, mrr, month_index(as_of), months)
+    rates = movement_rates(history, lookback)
+    active = columns.reason == END_ACTIVE
+    return {
+        "as_of": as_of,
+        "current_mrr": round(float(mrr[active].sum()), 2),
+        "active_subscriptions": int(active.sum()),
+        "history": history,
+        "rates": rates,
+        "projection": mrr_projection(columns, mrr, as_of, rates, projection_months)
+    }
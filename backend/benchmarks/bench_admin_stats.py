@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the admin dashboard stats
+Seeds a throwaway database on MONGO_URL with N users, subscriptions, payment transactions
+and N/10 contacts, then times:
+  - the seven sequential round trips get_admin_stats made before the snapshot
+  - compute_admin_stats, which reads the maintained counters and revenue rollups
+  - a snapshot hit, and 50 concurrent admins arriving on a cold snapshot
+  - count_business_metrics, the full recount the reconciler runs in the background
+The database is dropped afterwards.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_admin_stats.py [--docs 10000 100000 1000000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_bench')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+SEED_BATCH_SIZE = 10000
+PLAN_TYPES = ("accounting", "business", "personal")
+CONCURRENT_ADMINS = 50
+
+
+async def seed(db, count: int):
+    """N users with one subscription and one payment each, spread over the last 400 days"""
+    now = datetime.now(timezone.utc)
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        users, subscriptions, payments, contacts = [], [], [], []
+        for index in range(offset, min(offset + SEED_BATCH_SIZE, count)):
+            created = (now - timedelta(minutes=index * 400 * 1440 // count)).isoformat()
+            user_id, plan_type = f"user_{index:012x}", PLAN_TYPES[index % len(PLAN_TYPES)]
+            users.append({"user_id": user_id, "email": f"{user_id}@example.com", "name": user_id, "created_at": created})
+            subscriptions.append({
+                "subscription_id": f"sub_{index:012x}", "user_id": user_id, "plan_type": plan_type,
+                "plan_tier": "basic", "amount": 99.0, "status": "active" if index % 4 else "cancelled",
+                "created_at": created
+            })
+            payments.append({
+                "transaction_id": f"txn_{index:012x}", "user_id": user_id, "plan_type": plan_type,
+                "amount": 99.0, "status": "completed" if index % 5 else "pending", "created_at": created
+            })
+            if index % 10 == 0:
+                contacts.append({
+                    "contact_id": f"contact_{index:012x}", "email": f"{user_id}@example.com",
+                    "status": "new" if index % 3 else "read", "created_at": created
+                })
+        await asyncio.gather(
+            db.users.insert_many(users, ordered=False),
+            db.subscriptions.insert_many(subscriptions, ordered=False),
+            db.payment_transactions.insert_many(payments, ordered=False),
+            *([db.contacts.insert_many(contacts, ordered=False)] if contacts else [])
+        )
+    await server.ensure_indexes()
+    await server.run_revenue_backfill(await server.create_job("revenue_backfill", {"trigger": "benchmark"}))
+    await server.reconcile_business_metrics()
+
+
+async def sequential_admin_stats(db):
+    """The dashboard stats as get_admin_stats computed them before the snapshot: seven round trips"""
+    await db.users.count_documents({})
+    await db.subscriptions.count_documents({"status": "active"})
+    await db.contacts.count_documents({"status": "new"})
+    await db.contacts.count_documents({})
+    await db.payment_transactions.aggregate([
+        {"$match": {"status": "completed"}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]).to_list(1)
+    thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    await db.payment_transactions.aggregate([
+        {"$match": {"status": "completed", "created_at": {"$gte": thirty_days_ago}}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]).to_list(1)
+    await db.subscriptions.aggregate([
+        {"$match": {"status": "active"}},
+        {"$group": {"_id": "$plan_type", "count": {"$sum": 1}}}
+    ]).to_list(10)
+
+
+async def best_of(repeat: int, action) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await action()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def concurrent_cold_snapshot() -> int:
+    """Invalidate the snapshot and let CONCURRENT_ADMINS load the dashboard at once; returns computations run"""
+    computations = 0
+
+    async def compute():
+        nonlocal computations
+        computations += 1
+        return await server.compute_admin_stats()
+
+    server.admin_stats_cache.invalidate("dashboard")
+    await asyncio.gather(*(server.admin_stats_cache.get("dashboard", compute) for _ in range(CONCURRENT_ADMINS)))
+    return computations
+
+
+async def bench(url: str, count: int, repeat: int) -> dict:
+    client = AsyncIOMotorClient(url, serverSelectionTimeoutMS=5000)
+    name = f"finmar_bench_{uuid.uuid4().hex[:12]}"
+    db = server.db = client[name]
+    try:
+        await seed(db, count)
+        results = {
+            "sequential": await best_of(repeat, lambda: sequential_admin_stats(db)),
+            "compute": await best_of(repeat, server.compute_admin_stats),
+            "snapshot_hit": await best_of(repeat, lambda: server.admin_stats_cache.get("dashboard", server.compute_admin_stats)),
+            "cold_concurrent": await best_of(repeat, concurrent_cold_snapshot),
+            "recount": await best_of(repeat, server.count_business_metrics)
+        }
+        results["computations"] = await concurrent_cold_snapshot()
+        return results
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = os.environ['MONGO_URL']
+    columns = ("sequential", "compute", "snapshot_hit", "cold_concurrent", "recount")
+    print(f"{'docs':>9} " + " ".join(f"{column:>16}" for column in columns))
+    for count in args.docs:
+        results = asyncio.run(bench(url, count, args.repeat))
+        print(f"{count:>9} " + " ".join(f"{results[column] * 1000:>14.2f}ms" for column in columns)
+              + f"  ({results['computations']} computation for {CONCURRENT_ADMINS} admins)")
+
+
+if __name__ == "__main__":
+    main()
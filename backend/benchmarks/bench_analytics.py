@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the subscription analytics engine
+Builds SubscriptionColumns from synthetic rows shaped like SUBSCRIPTION_ANALYTICS_PIPELINE
+output and times factorize on the user ids, the column build and the full analytics pass
+(column build, subscription_analytics and mrr_analytics), best of --repeat runs.
+
+    python benchmarks/bench_analytics.py [--rows 10000 100000 1000000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import analytics
+
+PLAN_PRICES = {"business/basic": 99.0, "business/premium": 199.0, "personal/basic": 29.0, "personal/premium": 59.0}
+STATUSES = np.array(["active", "cancelled", "inactive"])
+ADD_ONS = np.array(["", "", "", "crm", "crm,payroll"])
+
+
+def synthetic_rows(count: int, seed: int = 7):
+    """One column per SUBSCRIPTION_ANALYTICS_FIELDS entry, about 1.5 subscriptions per user.
+
+    Strings are separate objects per row and timestamps epoch seconds, as decoded from the
+    aggregation's BSON.
+    """
+    rng = np.random.default_rng(seed)
+    user_pool = np.array([f"user_{value:012x}" for value in rng.integers(0, 2 ** 48, max(1, count * 2 // 3))])
+    users = user_pool[rng.integers(0, len(user_pool), count)].tolist()
+    tiers = np.array(list(PLAN_PRICES))[rng.integers(0, len(PLAN_PRICES), count)].tolist()
+    statuses = STATUSES[rng.integers(0, len(STATUSES), count)]
+    amounts = rng.choice([29.0, 59.0, 99.0, 199.0], count).tolist()
+    started = int(np.datetime64("2024-01-01T00:00:00", "s").astype(np.int64)) + rng.integers(0, 900 * 86400, count)
+    ended = np.where(statuses == "active", analytics.NO_TIMESTAMP, started + rng.integers(86400, 200 * 86400, count))
+    billing = started + 30 * 86400
+    add_ons = ADD_ONS[rng.integers(0, len(ADD_ONS), count)].tolist()
+    return users, tiers, statuses.tolist(), amounts, started.tolist(), ended.tolist(), add_ons, billing.tolist()
+
+
+def best_of(repeat: int, action) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'factorize':>10} {'columns':>10} {'full pass':>10}")
+    for count in args.rows:
+        rows = synthetic_rows(count)
+        factorize = best_of(args.repeat, lambda: analytics.factorize(rows[0], sort=False))
+        build = best_of(args.repeat, lambda: analytics.SubscriptionColumns(*rows))
+
+        def full_pass():
+            columns = analytics.SubscriptionColumns(*rows)
+            analytics.subscription_analytics(columns, "2026-05-01")
+            analytics.mrr_analytics(columns, PLAN_PRICES, {"crm": 20.0, "payroll": 30.0}, "2026-05-01")
+
+        full = best_of(args.repeat, full_pass)
+        print(f"{count:>9} {factorize:>9.3f}s {build:>9.3f}s {full:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
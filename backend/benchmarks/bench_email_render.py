@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark for admin email rendering
+Times the new-contact notification, the highest-volume email, rendered three ways:
+  - fstring: the f-string HTML the notify_* helpers built before the Jinja2 templates,
+    which did not escape user input
+  - fstring_escaped: the same with html.escape on every user-supplied field, the fair
+    baseline since the templates autoescape
+  - render_email: the precompiled, autoescaped templates inside the cached layout
+Reports microseconds per render (best of --repeat) and renders per second for short and
+long contact messages.
+
+    python benchmarks/bench_email_render.py [--renders 20000] [--repeat 5]
+"""
+
+import argparse
+import html
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_bench')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+
+import server
+
+MESSAGE_LENGTHS = (200, 2000)
+
+
+def fstring_layout(title: str, content: str) -> str:
+    """get_email_template as it was before the Jinja2 templates"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    </head>
+    <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f8fafc;">
+        <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+            <tr>
+                <td align="center">
+                    <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
+                        <!-- Header -->
+                        <tr>
+                            <td style="background-color: #0f172a; padding: 30px; text-align: center;">
+                                <h1 style="margin: 0; color: #f59e0b; font-size: 28px; font-weight: bold;">FINMAR</h1>
+                                <p style="margin: 5px 0 0; color: #94a3b8; font-size: 14px;">Admin Notification</p>
+                            </td>
+                        </tr>
+                        <!-- Content -->
+                        <tr>
+                            <td style="padding: 40px 30px;">
+                                <h2 style="margin: 0 0 20px; color: #0f172a; font-size: 22px;">{title}</h2>
+                                {content}
+                            </td>
+                        </tr>
+                        <!-- Footer -->
+                        <tr>
+                            <td style="background-color: #f1f5f9; padding: 20px 30px; text-align: center;">
+                                <p style="margin: 0; color: #64748b; font-size: 12px;">
+                                    This is an automated notification from FINMAR Admin System.<br>
+                                    © 2026 FINMAR. All rights reserved.
+                                </p>
+                            </td>
+                        </tr>
+                    </table>
+                </td>
+            </tr>
+        </table>
+    </body>
+    </html>
+    """
+
+
+def fstring_new_contact(name: str, email: str, service: str, message: str, business: str = None) -> str:
+    """The notify_new_contact HTML as it was built, without escaping"""
+    content = f"""
+    <p style="color: #475569; line-height: 1.6;">A new contact inquiry has been submitted:</p>
+    <table style="width: 100%; margin: 20px 0; border-collapse: collapse;">
+        <tr>
+            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
+                <strong style="color: #0f172a;">From:</strong>
+                <span style="color: #475569; margin-left: 10px;">{name} ({email})</span>
+            </td>
+        </tr>
+        <tr>
+            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
+                <strong style="color: #0f172a;">Business:</strong>
+                <span style="color: #475569; margin-left: 10px;">{business or 'Not provided'}</span>
+            </td>
+        </tr>
+        <tr>
+            <td style="padding: 12px; background-color: #fef3c7; border-radius: 8px;">
+                <strong style="color: #92400e;">Service Interest:</strong>
+                <span style="color: #92400e; margin-left: 10px;">{service.title()}</span>
+            </td>
+        </tr>
+    </table>
+    <div style="background-color: #f8fafc; padding: 20px; border-radius: 8px; margin: 20px 0;">
+        <strong style="color: #0f172a;">Message:</strong>
+        <p style="color: #475569; margin: 10px 0 0; line-height: 1.6;">{message}</p>
+    </div>
+    <p style="color: #475569; line-height: 1.6;">
+        <a href="https://finmar.com.au/admin/contacts" style="color: #f59e0b; text-decoration: none;">Respond in Admin Portal →</a>
+    </p>
+    """
+    return fstring_layout("New Contact Inquiry 📩", content)
+
+
+def fstring_escaped_new_contact(name: str, email: str, service: str, message: str, business: str = None) -> str:
+    return fstring_new_contact(
+        html.escape(name), html.escape(email), html.escape(service), html.escape(message),
+        html.escape(business) if business else business
+    )
+
+
+def contact(length: int) -> dict:
+    message = ("Hi, we're a <small> team & need help with BAS lodgement. " * (length // 50 + 1))[:length]
+    return {"name": "Jane O'Brien", "email": "jane@example.com", "service": "bookkeeping", "message": message,
+            "business": "O'Brien & Sons"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--renders", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    renderers = {
+        "fstring": fstring_new_contact,
+        "fstring_escaped": fstring_escaped_new_contact,
+        "render_email": lambda **fields: server.render_email("new_contact", **fields)
+    }
+    print(f"{'message':>8} {'renderer':>16} {'us/render':>10} {'renders/s':>10}")
+    for length in MESSAGE_LENGTHS:
+        fields = contact(length)
+        for name, render in renderers.items():
+            seconds = min(timeit.repeat(lambda: render(**fields), number=args.renders, repeat=args.repeat))
+            per_render = seconds / args.renders
+            print(f"{length:>8} {name:>16} {per_render * 1e6:>10.1f} {1 / per_render:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
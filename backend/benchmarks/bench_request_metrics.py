@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the request metrics middleware
+Drives GET /api/health with and without RequestMetricsMiddleware and reports the overhead
+it adds:
+  - isolated: the middleware around a bare ASGI app that answers at once, in microseconds
+  - full stack: the app's middleware stack and router in-process, as a share of the request time
+  - http: two uvicorn servers on localhost, one without the middleware, timed from a
+    keep-alive client, as a share of the round trip
+Requests alternate between the two variants; each round compares median request times and
+the overhead reported is the median over rounds. The servers run without the lifespan, so
+no MongoDB is needed.
+
+    python benchmarks/bench_request_metrics.py [--rounds 30] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_bench')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+
+import server
+
+
+def health_scope() -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/health", "raw_path": b"/api/health", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 50000), "server": ("bench", 80)
+    }
+
+
+def request_receive():
+    """The request body once, then nothing until the response is sent, as a server does"""
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.get_running_loop().create_future()
+
+    return receive
+
+
+async def send(message):
+    pass
+
+
+async def answer(scope, receive, send):
+    """A bare ASGI app, so the isolated timing is the middleware alone"""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def without_metrics_middleware():
+    return [middleware for middleware in server.app.user_middleware if middleware.cls is not server.RequestMetricsMiddleware]
+
+
+def build_stacks():
+    """The app's middleware stack as served, and the same stack without RequestMetricsMiddleware"""
+    with_metrics = server.app.build_middleware_stack()
+    user_middleware = server.app.user_middleware
+    server.app.user_middleware = without_metrics_middleware()
+    try:
+        without_metrics = server.app.build_middleware_stack()
+    finally:
+        server.app.user_middleware = user_middleware
+    return with_metrics, without_metrics
+
+
+async def paired(with_metrics, without_metrics, rounds: int, requests: int):
+    """Per-round (with, without) median request times.
+
+    Requests alternate between the stacks in ABBA order, so drift on a busy machine lands on
+    both sides, and medians keep scheduler and GC pauses out of the comparison.
+    """
+    pairs = []
+    for _ in range(rounds + 1):
+        timings = {with_metrics: [], without_metrics: []}
+        for index in range(requests):
+            stack = with_metrics if index % 4 in (0, 3) else without_metrics
+            started = time.perf_counter()
+            await stack(health_scope(), request_receive(), send)
+            timings[stack].append(time.perf_counter() - started)
+        pairs.append((statistics.median(timings[with_metrics]), statistics.median(timings[without_metrics])))
+    # The first round warms both stacks up
+    return pairs[1:]
+
+
+def serve(port: int, metrics: bool):
+    import uvicorn
+
+    if not metrics:
+        server.app.user_middleware = without_metrics_middleware()
+    uvicorn.run(server.app, host="127.0.0.1", port=port, lifespan="off", access_log=False, log_level="warning")
+
+
+def start_server(metrics: bool) -> tuple:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port)] + ([] if metrics else ["--without-metrics"])
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            return process, socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+
+def http_health(connection: socket.socket) -> None:
+    """One keep-alive GET /api/health, read until the body is complete"""
+    connection.sendall(b"GET /api/health HTTP/1.1\r\nHost: bench\r\n\r\n")
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += connection.recv(65536)
+    head, body = response.split(b"\r\n\r\n", 1)
+    length = int(next(line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")))
+    while len(body) < length:
+        body += connection.recv(65536)
+
+
+def paired_http(with_metrics: socket.socket, without_metrics: socket.socket, rounds: int, requests: int):
+    """paired() over HTTP: per-round (with, without) median round trips"""
+    pairs = []
+    for _ in range(rounds + 1):
+        timings = {with_metrics: [], without_metrics: []}
+        for index in range(requests):
+            connection = with_metrics if index % 4 in (0, 3) else without_metrics
+            started = time.perf_counter()
+            http_health(connection)
+            timings[connection].append(time.perf_counter() - started)
+        pairs.append((statistics.median(timings[with_metrics]), statistics.median(timings[without_metrics])))
+    return pairs[1:]
+
+
+def report(label: str, pairs) -> None:
+    overheads = sorted((with_ - without) / without for with_, without in pairs)
+    baseline = statistics.median(without for _, without in pairs)
+    added = statistics.median(with_ - without for with_, without in pairs)
+    print(f"{label:<11} {baseline * 1e6:.0f}us per /api/health without the middleware, {added * 1e6:.1f}us added; "
+          f"overhead median {statistics.median(overheads):.2%}, "
+          f"interquartile {overheads[len(overheads) // 4]:.2%} to {overheads[3 * len(overheads) // 4]:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--without-metrics", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, metrics=not args.without_metrics)
+
+    isolated = asyncio.run(paired(server.RequestMetricsMiddleware(answer), answer, args.rounds, args.requests))
+    added = statistics.median(with_ - without for with_, without in isolated)
+    print(f"{'isolated:':<11} {added * 1e6:.2f}us added per request")
+
+    report("full stack:", asyncio.run(paired(*build_stacks(), args.rounds, args.requests)))
+
+    servers = [start_server(metrics=True), start_server(metrics=False)]
+    try:
+        report("http:", paired_http(servers[0][1], servers[1][1], args.rounds, args.requests))
+    finally:
+        for process, connection in servers:
+            connection.close()
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+FINMAR MongoDB command monitoring.
+A pymongo CommandListener that times every command by collection, command name,
+normalized query shape and originating route, and keeps a rolling log of slow
+commands. Listener callbacks run on Motor's executor threads, so shared state is
+guarded by a lock; server.py wires the metrics, route lookup and explain callbacks.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Commands whose plan can be inspected with the explain command
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+# Session, transaction and routing fields that explain rejects or does not need
+EXPLAIN_EXCLUDED_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+BACKGROUND_ROUTE = "background"
+# Reused so shapes are not paying for a new encoder per command
+shape_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def normalize(value: Any) -> Any:
+    """Replace literal values in a filter with "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {
+            key: [normalize(item) for item in inner] if key in LOGICAL_OPERATORS and isinstance(inner, list) else normalize(inner)
+            for key, inner in value.items()
+        }
+    return "?"
+
+
+def pipeline_shape(pipeline: Any) -> List[Any]:
+    """$match stages are normalized; other stages keep only their name so paging values do not split shapes"""
+    stages = []
+    for stage in pipeline if isinstance(pipeline, list) else []:
+        name = next(iter(stage), "?") if isinstance(stage, dict) else "?"
+        stages.append({name: normalize(stage[name])} if name == "$match" else name)
+    return stages
+
+
+def query_shape(name: str, command: Dict[str, Any]) -> str:
+    """Literal-free description of what a command selects, e.g. {"user_id":"?"} sort {"created_at":-1}"""
+    if name == "aggregate":
+        shape: Any = pipeline_shape(command.get("pipeline"))
+    elif name in ("find", "count", "distinct"):
+        shape = normalize(command.get("filter", command.get("query")) or {})
+    elif name == "findAndModify":
+        shape = normalize(command.get("query") or {})
+    elif name in ("update", "delete"):
+        statements = command.get(f"{name}s") or [{}]
+        shape = normalize(statements[0].get("q") or {})
+    else:
+        return ""
+    text = shape_encoder.encode(shape)
+    sort = command.get("sort")
+    if sort:
+        text += " sort " + shape_encoder.encode(dict(sort))
+    return text
+
+
+def command_collection(name: str, command: Dict[str, Any]) -> Optional[str]:
+    """Collection a command targets, or None for database and server commands"""
+    target = command.get("collection") if name == "getMore" else command.get(name)
+    return target if isinstance(target, str) else None
+
+
+def explain_command(command: Dict[str, Any]) -> Dict[str, Any]:
+    """The explain form of a monitored command, run at queryPlanner verbosity so writes are not executed"""
+    inner = {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in EXPLAIN_EXCLUDED_FIELDS
+    }
+    return {"explain": inner, "verbosity": "queryPlanner"}
+
+
+def find_key(document: Any, key: str) -> Any:
+    """First value stored under key anywhere in a nested explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Stage chain and indexes of the winning plan, for find, aggregate and write explains alike"""
+    plan = find_key(explain, "winningPlan") or {}
+    # Slot-based engine plans nest the classic plan tree under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages: List[str] = []
+    indexes: List[str] = []
+    node = plan
+    while isinstance(node, dict) and node:
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+        "winning_plan": plan,
+    }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Per-shape command statistics and a slow-command log fed by pymongo command events.
+
+    on_command(collection, command, route, seconds, succeeded) is called with the lock held
+    and must not block or log. Slow commands are logged after the lock is released, and
+    on_slow(entry, command) is then called once per shape per TTL; it should schedule the
+    explain and pass its summary to record_explain.
+    """
+
+    def __init__(self, slow_ms: float, shape_limit: int = 500, slow_log_size: int = 100, explain_ttl_seconds: float = 600):
+        self.slow_ms = slow_ms
+        self.shape_limit = shape_limit
+        self.explain_ttl_seconds = explain_ttl_seconds
+        self.route_of: Callable[[], Optional[str]] = lambda: None
+        self.on_command: Callable[[str, str, str, float, bool], None] = lambda *args: None
+        self.on_slow: Callable[[Dict[str, Any], Dict[str, Any]], None] = lambda entry, command: None
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[Any, int], Tuple[str, str, str, str, Optional[Dict[str, Any]]]] = {}
+        self.shapes: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self.slow_log: deque = deque(maxlen=slow_log_size)
+        self.explained: Dict[Tuple[str, str, str], Tuple[float, Optional[Dict[str, Any]]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        name = event.command_name
+        if name == "explain":
+            return
+        collection = command_collection(name, event.command)
+        if collection is None:
+            return
+        route = self.route_of() or BACKGROUND_ROUTE
+        command = event.command if name in EXPLAINABLE_COMMANDS else None
+        self.pending[(event.connection_id, event.request_id)] = (
+            event.database_name, collection, query_shape(name, event.command), route, command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.finish(event, True)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.finish(event, False)
+
+    def finish(self, event, succeeded: bool):
+        started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        database, collection, shape, route, command = started
+        name = event.command_name
+        duration_ms = event.duration_micros / 1000
+        key = (collection, name, shape)
+        with self.lock:
+            self.on_command(collection, name, route, duration_ms / 1000, succeeded)
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= self.shape_limit:
+                    evicted, _ = self.shapes.popitem(last=False)
+                    self.explained.pop(evicted, None)
+                stats = self.shapes[key] = {
+                    "collection": collection, "command": name, "shape": shape,
+                    "count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "routes": {}
+                }
+            else:
+                self.shapes.move_to_end(key)
+            stats["count"] += 1
+            stats["failures"] += not succeeded
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["routes"][route] = stats["routes"].get(route, 0) + 1
+            if duration_ms < self.slow_ms:
+                return
+            explain = False
+            stats["slow"] += 1
+            entry = {
+                "at": datetime.now(timezone.utc).isoformat(), "database": database,
+                "collection": collection, "command": name, "shape": shape, "route": route,
+                "duration_ms": round(duration_ms, 1), "succeeded": succeeded, "explain": None,
+            }
+            self.slow_log.append(entry)
+            # One explain per shape per TTL; later entries reuse the cached plan
+            explained = self.explained.get(key)
+            if explained and time.monotonic() - explained[0] < self.explain_ttl_seconds:
+                entry["explain"] = explained[1]
+            elif command is not None:
+                self.explained[key] = (time.monotonic(), None)
+                explain = True
+        logger.warning(f"Slow MongoDB {name} on {collection} from {route}: {duration_ms:.0f}ms")
+        if explain:
+            self.on_slow(entry, command)
+
+    def record_explain(self, entry: Dict[str, Any], summary: Optional[Dict[str, Any]]):
+        """Attach an explain summary to its slow-log entry and cache it for the shape"""
+        key = (entry["collection"], entry["command"], entry["shape"])
+        with self.lock:
+            entry["explain"] = summary
+            self.explained[key] = (time.monotonic(), summary)
+
+    def snapshot(self, sort: str = "total_ms", limit: int = 50) -> Dict[str, Any]:
+        """Top shapes by the given statistic and the slow log, newest first"""
+        with self.lock:
+            shapes = [dict(stats, routes=dict(stats["routes"])) for stats in self.shapes.values()]
+            slow = [dict(entry) for entry in reversed(self.slow_log)]
+        for stats in shapes:
+            stats["avg_ms"] = round(stats["total_ms"] / stats["count"], 2)
+            stats["total_ms"] = round(stats["total_ms"], 1)
+            stats["max_ms"] = round(stats["max_ms"], 1)
+        shapes.sort(key=lambda stats: stats[sort], reverse=True)
+        return {"slow_threshold_ms": self.slow_ms, "shapes": shapes[:limit], "slow": slow}
@@ -1,27 +1,53 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 import os
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, Callable, Awaitable
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, date, timezone, timedelta
 import jwt
 import bcrypt
 import httpx
 import asyncio
+import time
+import re
+import html
+import unicodedata
 import resend
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque, OrderedDict
+from functools import lru_cache
+import hashlib
+import bisect
+import base64
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+from operator import itemgetter
+
+from analytics import NO_TIMESTAMP, SubscriptionColumns, subscription_analytics, mrr_analytics
+from mongo_monitor import CommandMonitor, explain_command, summarize_plan
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+SLOW_QUERY_LOG_MS = float(os.environ.get('SLOW_QUERY_LOG_MS', '500'))
+# Times every command by collection, query shape and route (see MONGO COMMAND METRICS)
+command_monitor = CommandMonitor(SLOW_QUERY_LOG_MS)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[command_monitor])
 db = client[os.environ['DB_NAME']]
 
 # JWT Configuration
@@ -44,8 +70,15 @@ ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'sajeev@getupsolutions.com.au')
 if RESEND_API_KEY:
     resend.api_key = RESEND_API_KEY
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # startup_tasks and shutdown_db_client are defined at the end of this module
+    await startup_tasks()
+    yield
+    await shutdown_db_client()
+
 # Create the main app
-app = FastAPI(title="FINMAR API", version="1.0.0")
+app = FastAPI(title="FINMAR API", version="1.0.0", lifespan=lifespan)
 
 # Create router with /api prefix
 api_router = APIRouter(prefix="/api")
@@ -155,6 +188,26 @@ class UserUpdate(BaseModel):
 class ContactUpdate(BaseModel):
     status: str  # new, in_progress, resolved, closed
 
+class BulkContactAction(BaseModel):
+    contact_ids: List[str]
+    action: str = "update"  # update or delete
+    status: Optional[str] = None
+
+class BulkSubscriptionUpdate(BaseModel):
+    subscription_ids: List[str]
+    status: str
+
+class BulkUserAction(BaseModel):
+    user_ids: List[str]
+    action: str  # delete
+
+class UserDeleteJobRequest(BaseModel):
+    user_ids: List[str]
+
+class ExportRequest(BaseModel):
+    collections: List[str] = ["payment_transactions", "subscriptions", "users"]
+    incremental: bool = True
+
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
     business_name: Optional[str] = None
@@ -245,193 +298,364 @@ def create_jwt_token(user_id: str, email: str, role: str = "user") -> str:
 
 # ==================== EMAIL HELPERS ====================
 
+# Outbound email is written to db.email_outbox and delivered by a pool of workers
+# through Resend's batch API, so notifications survive restarts and bursts queue up
+EMAIL_OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', '2'))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '50'))  # Resend allows up to 100
+EMAIL_SEND_THREADS = int(os.environ.get('EMAIL_SEND_THREADS', '4'))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '6'))
+EMAIL_RETRY_BASE_SECONDS = 30
+EMAIL_OUTBOX_POLL_SECONDS = 5
+EMAIL_CLAIM_TIMEOUT_SECONDS = 300
+EMAIL_SENT_RETENTION_DAYS = 30
+
+email_executor = ThreadPoolExecutor(max_workers=EMAIL_SEND_THREADS, thread_name_prefix="email-send")
+outbox_wakeup = asyncio.Event()
+
+async def enqueue_email(to: List[str], subject: str, html_content: str) -> str:
+    """Queue an email for delivery by the outbox workers"""
+    now = datetime.now(timezone.utc).isoformat()
+    email_doc = {
+        "email_id": f"email_{uuid.uuid4().hex[:12]}",
+        "from": SENDER_EMAIL,
+        "to": to,
+        "subject": subject,
+        "html": html_content,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.email_outbox.insert_one(email_doc)
+    outbox_wakeup.set()
+    return email_doc["email_id"]
+
 async def send_admin_notification(subject: str, html_content: str):
-    """Send email notification to admin"""
+    """Queue email notification to admin"""
     if not RESEND_API_KEY:
         logger.warning("RESEND_API_KEY not configured, skipping email")
         return None
     
     try:
-        params = {
-            "from": SENDER_EMAIL,
-            "to": [ADMIN_EMAIL],
-            "subject": f"[FINMAR Admin] {subject}",
-            "html": html_content
-        }
-        result = await asyncio.to_thread(resend.Emails.send, params)
-        logger.info(f"Admin notification sent: {subject}")
-        return result
+        email_id = await enqueue_email([ADMIN_EMAIL], f"[FINMAR Admin] {subject}", html_content)
+        logger.info(f"Admin notification queued: {subject}")
+        return email_id
     except Exception as e:
-        logger.error(f"Failed to send admin notification: {str(e)}")
+        logger.error(f"Failed to queue admin notification: {str(e)}")
         return None
 
-def get_email_template(title: str, content: str) -> str:
-    """Generate HTML email template"""
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    </head>
-    <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f8fafc;">
-        <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-            <tr>
-                <td align="center">
-                    <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
-                        <!-- Header -->
-                        <tr>
-                            <td style="background-color: #0f172a; padding: 30px; text-align: center;">
-                                <h1 style="margin: 0; color: #f59e0b; font-size: 28px; font-weight: bold;">FINMAR</h1>
-                                <p style="margin: 5px 0 0; color: #94a3b8; font-size: 14px;">Admin Notification</p>
-                            </td>
-                        </tr>
-                        <!-- Content -->
-                        <tr>
-                            <td style="padding: 40px 30px;">
-                                <h2 style="margin: 0 0 20px; color: #0f172a; font-size: 22px;">{title}</h2>
-                                {content}
-                            </td>
-                        </tr>
-                        <!-- Footer -->
-                        <tr>
-                            <td style="background-color: #f1f5f9; padding: 20px 30px; text-align: center;">
-                                <p style="margin: 0; color: #64748b; font-size: 12px;">
-                                    This is an automated notification from FINMAR Admin System.<br>
-                                    © 2026 FINMAR. All rights reserved.
-                                </p>
-                            </td>
-                        </tr>
-                    </table>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
-    """
+async def send_email_batch(params: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Send emails through the Resend batch API on the dedicated email executor"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(email_executor, resend.Batch.send, params)
+    return [item.get("id") for item in (result or {}).get("data") or []]
+
+def outbox_retry_delay(attempts: int) -> float:
+    """Exponential backoff between delivery attempts"""
+    return EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+
+async def claim_outbox_batch(worker_id: str) -> List[Dict[str, Any]]:
+    """Atomically claim due emails for one worker"""
+    now = datetime.now(timezone.utc)
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now.isoformat()}},
+        {"status": "sending", "claimed_at": {"$lte": (now - timedelta(seconds=EMAIL_CLAIM_TIMEOUT_SECONDS)).isoformat()}}
+    ]}
+    candidates = await db.email_outbox.find(due, {"_id": 0, "email_id": 1}).sort(
+        "next_attempt_at", 1
+    ).limit(EMAIL_OUTBOX_BATCH_SIZE).to_list(EMAIL_OUTBOX_BATCH_SIZE)
+    if not candidates:
+        return []
+    
+    claim_id = f"{worker_id}_{uuid.uuid4().hex[:8]}"
+    await db.email_outbox.update_many(
+        {"email_id": {"$in": [c["email_id"] for c in candidates]}, **due},
+        {"$set": {"status": "sending", "claim_id": claim_id, "claimed_at": now.isoformat()}}
+    )
+    return await db.email_outbox.find({"claim_id": claim_id, "status": "sending"}, {"_id": 0}).to_list(EMAIL_OUTBOX_BATCH_SIZE)
+
+async def deliver_outbox_batch(batch: List[Dict[str, Any]]):
+    """Send a claimed batch and record the outcome of every email"""
+    # Writes are fenced on this worker's claim: if the claim went stale and another worker
+    # re-claimed an email, that worker now owns its status and these updates match nothing
+    params = [
+        {"from": email["from"], "to": email["to"], "subject": email["subject"], "html": email["html"]}
+        for email in batch
+    ]
+    now = datetime.now(timezone.utc)
+    try:
+        provider_ids = await send_email_batch(params)
+    except Exception as e:
+        logger.error(f"Email batch of {len(batch)} failed: {str(e)}")
+        operations = []
+        for email in batch:
+            attempts = email.get("attempts", 0) + 1
+            update = {"attempts": attempts, "last_error": str(e), "updated_at": now.isoformat()}
+            if attempts >= EMAIL_MAX_ATTEMPTS:
+                update["status"] = "failed"
+            else:
+                update["status"] = "pending"
+                update["next_attempt_at"] = (now + timedelta(seconds=outbox_retry_delay(attempts))).isoformat()
+            operations.append(UpdateOne(claimed_email(email), {"$set": update}))
+        await record_outbox_outcomes(operations)
+        return
+    
+    if len(provider_ids) != len(batch):
+        # The provider accepted the batch, so a retry would send duplicates; ids cannot be
+        # paired by position, so every email is recorded as sent without one
+        logger.error(f"Email batch of {len(batch)} returned {len(provider_ids)} provider ids")
+        provider_ids = [None] * len(batch)
+    expire_at = now + timedelta(days=EMAIL_SENT_RETENTION_DAYS)
+    operations = [
+        UpdateOne(claimed_email(email), {"$set": {
+            "status": "sent",
+            "provider_id": provider_id,
+            "attempts": email.get("attempts", 0) + 1,
+            "sent_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "expire_at": expire_at
+        }})
+        for email, provider_id in zip(batch, provider_ids)
+    ]
+    await record_outbox_outcomes(operations)
+    logger.info(f"Email batch of {len(batch)} sent")
+
+def claimed_email(email: Dict[str, Any]) -> Dict[str, Any]:
+    return {"email_id": email["email_id"], "claim_id": email["claim_id"], "status": "sending"}
+
+async def record_outbox_outcomes(operations: List[UpdateOne]):
+    result = await db.email_outbox.bulk_write(operations, ordered=False)
+    if result.matched_count < len(operations):
+        logger.warning(
+            f"{len(operations) - result.matched_count} of {len(operations)} emails were re-claimed "
+            "by another worker before their outcome was recorded"
+        )
+
+async def process_outbox_once(worker_id: str) -> int:
+    """Claim and deliver one batch, returning the number of emails handled"""
+    batch = await claim_outbox_batch(worker_id)
+    if batch:
+        await deliver_outbox_batch(batch)
+    return len(batch)
+
+async def email_outbox_worker(worker_id: str):
+    """Deliver queued emails until cancelled"""
+    while True:
+        try:
+            if await process_outbox_once(worker_id):
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Email outbox worker {worker_id} error: {str(e)}")
+        outbox_wakeup.clear()
+        try:
+            await asyncio.wait_for(outbox_wakeup.wait(), timeout=EMAIL_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+# Email templates are compiled once at import and autoescape every user-supplied field.
+# The shared layout's only variable is the footer year, so it is rendered once per year and
+# each email only renders its own body between the cached layout head and tail.
+# benchmarks/bench_email_render.py compares render cost with the old f-strings.
+EMAIL_TEMPLATE_DIR = ROOT_DIR / 'templates' / 'email'
+EMAIL_LAYOUT_SLOT = "<!--email-body-->"
+
+email_env = Environment(
+    loader=FileSystemLoader(str(EMAIL_TEMPLATE_DIR)),
+    # Every email template is HTML; a fixed True also spares each render the per-name lookup
+    autoescape=True,
+    auto_reload=False
+)
+# The templates use none of Jinja's default globals (range, dict, lipsum, ...), which every
+# render would otherwise copy into its context
+email_env.globals.clear()
+EMAIL_TEMPLATES = {
+    name: email_env.get_template(f"{name}.html")
+    for name in ("new_user", "new_subscription", "subscription_cancelled", "new_contact", "digest")
+}
+
+@lru_cache(maxsize=2)
+def email_layout(year: int) -> Tuple[str, str]:
+    """Layout head and tail around the body slot for a footer year"""
+    head, tail = email_env.get_template("layout.html").render(body=Markup(EMAIL_LAYOUT_SLOT), year=year).split(EMAIL_LAYOUT_SLOT)
+    return head, tail
+
+def render_email(template_name: str, **context) -> str:
+    """Render an email body template inside the shared layout"""
+    head, tail = email_layout(datetime.now(timezone.utc).year)
+    return head + EMAIL_TEMPLATES[template_name].render(**context) + tail
+
+# ==================== NOTIFICATION DIGESTS ====================
+
+# Up to NOTIFY_DIGEST_THRESHOLD notifications per window are emailed immediately; past
+# that, events are written to db.notification_digest and flushed as one summary email when
+# the window closes, so outbound email stays roughly constant however busy the site gets.
+# Buffered events are persisted so a restart does not lose them, and buffering only
+# happens while this process runs the flusher; otherwise nothing would ever drain it.
+NOTIFY_DIGEST_WINDOW_SECONDS = int(os.environ.get('NOTIFY_DIGEST_WINDOW_SECONDS', '300'))
+NOTIFY_DIGEST_THRESHOLD = int(os.environ.get('NOTIFY_DIGEST_THRESHOLD', '10'))
+NOTIFY_DIGEST_MAX_EVENTS = int(os.environ.get('NOTIFY_DIGEST_MAX_EVENTS', '1000'))
+DIGEST_MAX_ROWS_PER_KIND = 50
+
+DIGEST_EVENT_LABELS = {
+    "new_user": "New User Registrations",
+    "new_subscription": "New Subscription Purchases",
+    "subscription_cancelled": "Subscription Cancellations",
+    "new_contact": "New Contact Inquiries"
+}
+
+class NotificationDigest:
+    """Time-windowed admission deciding between immediate and digest delivery"""
+    
+    def __init__(self, window_seconds: int, threshold: int, max_events: int):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.max_events = max_events
+        self.window_started = time.monotonic()
+        self.sent_in_window = 0
+        self.buffered_in_window = 0
+        self.dropped_in_window = 0
+        # Events dropped since the last flush, by kind, so the digest can still count them
+        self.overflow: Dict[str, int] = defaultdict(int)
+        self.buffering = False
+        self.flusher_running = False
+        self.stats = {"immediate": 0, "buffered": 0, "dropped": 0, "digests_sent": 0}
+    
+    def admit(self, kind: str) -> str:
+        """"send" to email now, "buffer" to hold for the digest, or "drop" once the window's digest is full"""
+        now = time.monotonic()
+        if now - self.window_started >= self.window_seconds:
+            self.window_started = now
+            self.sent_in_window = 0
+            self.buffered_in_window = 0
+            self.dropped_in_window = 0
+        # Once buffering starts, later events wait for the digest too so emails stay in order
+        if not self.flusher_running or (not self.buffering and self.sent_in_window < self.threshold):
+            self.sent_in_window += 1
+            self.stats["immediate"] += 1
+            return "send"
+        self.buffering = True
+        if self.buffered_in_window >= self.max_events:
+            if not self.dropped_in_window:
+                logger.warning(f"Notification digest holds {self.max_events} events; dropping the rest of this window")
+            self.dropped_in_window += 1
+            self.overflow[kind] += 1
+            self.stats["dropped"] += 1
+            return "drop"
+        self.buffered_in_window += 1
+        self.stats["buffered"] += 1
+        return "buffer"
+
+notification_digest = NotificationDigest(NOTIFY_DIGEST_WINDOW_SECONDS, NOTIFY_DIGEST_THRESHOLD, NOTIFY_DIGEST_MAX_EVENTS)
+
+async def dispatch_admin_notification(kind: str, subject: str, **context):
+    """Email a notification now, or hold it for the next digest during bursts"""
+    decision = notification_digest.admit(kind)
+    if decision == "send":
+        await send_admin_notification(subject, render_email(kind, **context))
+    elif decision == "buffer":
+        try:
+            await db.notification_digest.insert_one({
+                "event_id": f"event_{uuid.uuid4().hex[:12]}",
+                "kind": kind,
+                "context": context,
+                "at": datetime.now(timezone.utc).isoformat(),
+                "claim_id": None
+            })
+        except Exception as e:
+            logger.error(f"Failed to buffer {kind} notification: {str(e)}")
+
+async def claim_digest_events() -> Tuple[str, List[Dict[str, Any]]]:
+    """Claim every unclaimed (or abandoned) buffered event, oldest first"""
+    now = datetime.now(timezone.utc)
+    claim_id = f"digest_{uuid.uuid4().hex[:8]}"
+    stale = (now - timedelta(seconds=EMAIL_CLAIM_TIMEOUT_SECONDS)).isoformat()
+    await db.notification_digest.update_many(
+        {"$or": [{"claim_id": None}, {"claimed_at": {"$lte": stale}}]},
+        {"$set": {"claim_id": claim_id, "claimed_at": now.isoformat()}}
+    )
+    events = await db.notification_digest.find({"claim_id": claim_id}, {"_id": 0}).sort("at", 1).to_list(None)
+    return claim_id, events
+
+async def flush_notification_digest():
+    """Send buffered notifications as a single summary email"""
+    notification_digest.buffering = False
+    claim_id, events = await claim_digest_events()
+    if not events:
+        return
+    overflow, notification_digest.overflow = notification_digest.overflow, defaultdict(int)
+    for event in events:
+        event["at"] = datetime.fromisoformat(event["at"])
+    groups = []
+    for kind, label in DIGEST_EVENT_LABELS.items():
+        kind_events = [event for event in events if event["kind"] == kind]
+        if kind_events or overflow.get(kind):
+            groups.append({
+                "kind": kind,
+                "label": label,
+                "total": len(kind_events) + overflow.get(kind, 0),
+                "dropped": overflow.get(kind, 0),
+                "events": kind_events[:DIGEST_MAX_ROWS_PER_KIND]
+            })
+    total = len(events) + sum(overflow.values())
+    html = render_email(
+        "digest",
+        groups=groups,
+        total=total,
+        window_start=events[0]["at"].strftime("%d %b %Y %H:%M UTC"),
+        window_end=events[-1]["at"].strftime("%d %b %Y %H:%M UTC")
+    )
+    # The digest is in the durable outbox before its events are removed; if queueing fails
+    # the claim goes stale and the next flush picks the events up again, with the overflow
+    if await send_admin_notification(f"Activity Digest: {total} events", html):
+        await db.notification_digest.delete_many({"claim_id": claim_id})
+        notification_digest.stats["digests_sent"] += 1
+    else:
+        for kind, count in overflow.items():
+            notification_digest.overflow[kind] += count
+
+async def notification_digest_flusher():
+    """Flush the digest buffer at the end of every window"""
+    notification_digest.flusher_running = True
+    try:
+        while True:
+            await asyncio.sleep(NOTIFY_DIGEST_WINDOW_SECONDS)
+            try:
+                await flush_notification_digest()
+            except Exception as e:
+                logger.error(f"Failed to flush notification digest: {str(e)}")
+    finally:
+        notification_digest.flusher_running = False
 
 async def notify_new_user(user_name: str, user_email: str, business_name: str = None):
     """Send notification for new user registration"""
-    content = f"""
-    <p style="color: #475569; line-height: 1.6;">A new user has registered on FINMAR:</p>
-    <table style="width: 100%; margin: 20px 0; border-collapse: collapse;">
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">Name:</strong>
-                <span style="color: #475569; margin-left: 10px;">{user_name}</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px; margin-top: 8px;">
-                <strong style="color: #0f172a;">Email:</strong>
-                <span style="color: #475569; margin-left: 10px;">{user_email}</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px; margin-top: 8px;">
-                <strong style="color: #0f172a;">Business:</strong>
-                <span style="color: #475569; margin-left: 10px;">{business_name or 'Not provided'}</span>
-            </td>
-        </tr>
-    </table>
-    <p style="color: #475569; line-height: 1.6;">
-        <a href="https://finmar.com.au/admin/users" style="color: #f59e0b; text-decoration: none;">View in Admin Portal →</a>
-    </p>
-    """
-    html = get_email_template("New User Registration", content)
-    await send_admin_notification("New User Registration", html)
+    await dispatch_admin_notification(
+        "new_user", "New User Registration",
+        user_name=user_name, user_email=user_email, business_name=business_name
+    )
 
 async def notify_new_subscription(user_name: str, user_email: str, plan_type: str, plan_tier: str, amount: float):
     """Send notification for new subscription purchase"""
-    content = f"""
-    <p style="color: #475569; line-height: 1.6;">A new subscription has been purchased:</p>
-    <table style="width: 100%; margin: 20px 0; border-collapse: collapse;">
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">Customer:</strong>
-                <span style="color: #475569; margin-left: 10px;">{user_name} ({user_email})</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">Plan:</strong>
-                <span style="color: #475569; margin-left: 10px;">{plan_type.title()} - {plan_tier.title()}</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #10b981; border-radius: 8px;">
-                <strong style="color: #ffffff;">Amount:</strong>
-                <span style="color: #ffffff; margin-left: 10px; font-size: 18px;">${amount:.2f} AUD/month</span>
-            </td>
-        </tr>
-    </table>
-    <p style="color: #475569; line-height: 1.6;">
-        <a href="https://finmar.com.au/admin/subscriptions" style="color: #f59e0b; text-decoration: none;">View in Admin Portal →</a>
-    </p>
-    """
-    html = get_email_template("New Subscription Purchase 💰", content)
-    await send_admin_notification("New Subscription Purchase", html)
+    await dispatch_admin_notification(
+        "new_subscription", "New Subscription Purchase",
+        user_name=user_name, user_email=user_email, plan_type=plan_type, plan_tier=plan_tier, amount=amount
+    )
 
 async def notify_subscription_cancelled(user_name: str, user_email: str, plan_type: str, plan_tier: str):
     """Send notification for subscription cancellation"""
-    content = f"""
-    <p style="color: #475569; line-height: 1.6;">A subscription has been cancelled:</p>
-    <table style="width: 100%; margin: 20px 0; border-collapse: collapse;">
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">Customer:</strong>
-                <span style="color: #475569; margin-left: 10px;">{user_name} ({user_email})</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #fef2f2; border-radius: 8px;">
-                <strong style="color: #dc2626;">Cancelled Plan:</strong>
-                <span style="color: #dc2626; margin-left: 10px;">{plan_type.title()} - {plan_tier.title()}</span>
-            </td>
-        </tr>
-    </table>
-    <p style="color: #475569; line-height: 1.6;">Consider reaching out to understand why they cancelled.</p>
-    <p style="color: #475569; line-height: 1.6;">
-        <a href="https://finmar.com.au/admin/subscriptions" style="color: #f59e0b; text-decoration: none;">View in Admin Portal →</a>
-    </p>
-    """
-    html = get_email_template("Subscription Cancelled ⚠️", content)
-    await send_admin_notification("Subscription Cancelled", html)
+    await dispatch_admin_notification(
+        "subscription_cancelled", "Subscription Cancelled",
+        user_name=user_name, user_email=user_email, plan_type=plan_type, plan_tier=plan_tier
+    )
 
 async def notify_new_contact(name: str, email: str, service: str, message: str, business: str = None):
     """Send notification for new contact inquiry"""
-    content = f"""
-    <p style="color: #475569; line-height: 1.6;">A new contact inquiry has been submitted:</p>
-    <table style="width: 100%; margin: 20px 0; border-collapse: collapse;">
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">From:</strong>
-                <span style="color: #475569; margin-left: 10px;">{name} ({email})</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #f8fafc; border-radius: 8px;">
-                <strong style="color: #0f172a;">Business:</strong>
-                <span style="color: #475569; margin-left: 10px;">{business or 'Not provided'}</span>
-            </td>
-        </tr>
-        <tr>
-            <td style="padding: 12px; background-color: #fef3c7; border-radius: 8px;">
-                <strong style="color: #92400e;">Service Interest:</strong>
-                <span style="color: #92400e; margin-left: 10px;">{service.title()}</span>
-            </td>
-        </tr>
-    </table>
-    <div style="background-color: #f8fafc; padding: 20px; border-radius: 8px; margin: 20px 0;">
-        <strong style="color: #0f172a;">Message:</strong>
-        <p style="color: #475569; margin: 10px 0 0; line-height: 1.6;">{message}</p>
-    </div>
-    <p style="color: #475569; line-height: 1.6;">
-        <a href="https://finmar.com.au/admin/contacts" style="color: #f59e0b; text-decoration: none;">Respond in Admin Portal →</a>
-    </p>
-    """
-    html = get_email_template("New Contact Inquiry 📩", content)
-    await send_admin_notification("New Contact Inquiry", html)
+    await dispatch_admin_notification(
+        "new_contact", "New Contact Inquiry",
+        name=name, email=email, service=service, message=message, business=business
+    )
 
 async def get_current_user(request: Request) -> User:
     # Try cookie first
@@ -508,11 +732,14 @@ async def register(user_data: UserCreate):
         "role": "user",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+    user_doc["updated_at"] = user_doc["created_at"]
+    user_doc.update(user_search_keys(user_doc))
     
     await db.users.insert_one(user_doc)
+    await bump_metrics({"total_users": 1})
     
     # Send admin notification (non-blocking)
-    asyncio.create_task(notify_new_user(user_data.name, user_data.email, user_data.business_name))
+    task_supervisor.spawn("notify_new_user", notify_new_user(user_data.name, user_data.email, user_data.business_name))
     
     token = create_jwt_token(user_id, user_data.email)
     
@@ -572,8 +799,13 @@ async def process_google_session(request: Request):
         # Update user data
         await db.users.update_one(
             {"user_id": user_id},
-            {"$set": {"name": name, "picture": picture}}
+            {"$set": {
+                "name": name, "picture": picture, "updated_at": datetime.now(timezone.utc).isoformat(),
+                **user_search_keys({**existing, "name": name})
+            }}
         )
+        if name != existing.get("name"):
+            await sync_subscription_user_snapshot(user_id, name, existing["email"])
     else:
         user_id = f"user_{uuid.uuid4().hex[:12]}"
         user_doc = {
@@ -587,7 +819,10 @@ async def process_google_session(request: Request):
             "current_plan": None,
             "created_at": datetime.now(timezone.utc).isoformat()
         }
+        user_doc["updated_at"] = user_doc["created_at"]
+        user_doc.update(user_search_keys(user_doc))
         await db.users.insert_one(user_doc)
+        await bump_metrics({"total_users": 1})
     
     # Store session
     session_doc = {
@@ -648,11 +883,15 @@ async def update_profile(profile: ProfileUpdate, current_user: User = Depends(ge
     
     await db.users.update_one(
         {"user_id": current_user.user_id},
-        {"$set": update_data}
+        {"$set": {**update_data, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    if update_data.keys() & set(USER_SEARCH_FIELDS):
+        await refresh_user_search_keys(current_user.user_id)
+    if "name" in update_data:
+        await sync_subscription_user_snapshot(current_user.user_id, update_data["name"], current_user.email)
     
     # Get updated user
-    user_doc = await db.users.find_one({"user_id": current_user.user_id}, {"_id": 0, "password_hash": 0})
+    user_doc = await db.users.find_one({"user_id": current_user.user_id}, USER_PUBLIC_PROJECTION)
     if isinstance(user_doc.get('created_at'), str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
@@ -703,11 +942,13 @@ async def update_business_details(business: BusinessDetailsUpdate, current_user:
     
     await db.users.update_one(
         {"user_id": current_user.user_id},
-        {"$set": update_data}
+        {"$set": {**update_data, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    if update_data.keys() & set(USER_SEARCH_FIELDS):
+        await refresh_user_search_keys(current_user.user_id)
     
     # Get updated user
-    user_doc = await db.users.find_one({"user_id": current_user.user_id}, {"_id": 0, "password_hash": 0})
+    user_doc = await db.users.find_one({"user_id": current_user.user_id}, USER_PUBLIC_PROJECTION)
     if isinstance(user_doc.get('created_at'), str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
@@ -843,19 +1084,25 @@ async def cancel_subscription(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="No active subscription to cancel")
     
     # Update subscription status
-    await db.subscriptions.update_one(
-        {"subscription_id": current_sub["subscription_id"]},
-        {"$set": {"status": "cancelled", "cancelled_at": datetime.now(timezone.utc).isoformat()}}
+    now = datetime.now(timezone.utc).isoformat()
+    result = await db.subscriptions.update_one(
+        {"subscription_id": current_sub["subscription_id"], "status": "active"},
+        {"$set": {"status": "cancelled", "cancelled_at": now, "updated_at": now}}
     )
+    if result.modified_count:
+        await asyncio.gather(
+            bump_metrics(subscription_metric_deltas([current_sub], -1)),
+            record_mrr_movements(subscription_status_movements(current_sub, "cancelled"))
+        )
     
     # Update user status
     await db.users.update_one(
         {"user_id": current_user.user_id},
-        {"$set": {"subscription_status": "cancelled", "current_plan": None}}
+        {"$set": {"subscription_status": "cancelled", "current_plan": None, "updated_at": now}}
     )
     
     # Send admin notification (non-blocking)
-    asyncio.create_task(notify_subscription_cancelled(
+    task_supervisor.spawn("notify_subscription_cancelled", notify_subscription_cancelled(
         current_user.name, current_user.email,
         current_sub["plan_type"], current_sub["plan_tier"]
     ))
@@ -936,6 +1183,21 @@ async def create_checkout(checkout_data: CheckoutRequest, current_user: User = D
     
     return {"checkout_url": session.url, "session_id": session.session_id}
 
+async def complete_transaction(session_id: str) -> Optional[Dict[str, Any]]:
+    """Mark a transaction completed, returning it only if this call completed it"""
+    txn = await db.payment_transactions.find_one_and_update(
+        {"session_id": session_id, "status": {"$ne": "completed"}},
+        {"$set": {
+            "status": "completed",
+            "payment_status": "paid",
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }},
+        projection={"_id": 0}
+    )
+    if txn:
+        await asyncio.gather(bump_metrics({"total_revenue": txn.get("amount", 0)}), record_revenue(txn))
+    return txn
+
 @api_router.get("/payments/status/{session_id}")
 async def get_payment_status(session_id: str, current_user: User = Depends(get_current_user)):
     from emergentintegrations.payments.stripe.checkout import StripeCheckout
@@ -946,19 +1208,9 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
     
     # Update transaction in database
     if status.payment_status == "paid":
-        txn = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+        txn = await complete_transaction(session_id)
         
-        if txn and txn.get("status") != "completed":
-            # Update transaction
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {
-                    "status": "completed",
-                    "payment_status": "paid",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            
+        if txn:
             # Create/update subscription
             sub_id = f"sub_{uuid.uuid4().hex[:12]}"
             now = datetime.now(timezone.utc)
@@ -966,6 +1218,8 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
             sub_doc = {
                 "subscription_id": sub_id,
                 "user_id": current_user.user_id,
+                "user_name": current_user.name,
+                "user_email": current_user.email,
                 "plan_type": txn["plan_type"],
                 "plan_tier": txn["plan_tier"],
                 "add_ons": txn.get("add_ons", []),
@@ -974,28 +1228,43 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
                 "currency": "AUD",
                 "start_date": now.isoformat(),
                 "next_billing_date": (now + timedelta(days=30)).isoformat(),
-                "created_at": now.isoformat()
+                "created_at": now.isoformat(),
+                "updated_at": now.isoformat()
             }
             
             # Deactivate old subscriptions
+            old_active = await db.subscriptions.find(
+                {"user_id": current_user.user_id, "status": "active"},
+                SUBSCRIPTION_METRIC_PROJECTION
+            ).to_list(10)
             await db.subscriptions.update_many(
                 {"user_id": current_user.user_id, "status": "active"},
-                {"$set": {"status": "inactive"}}
+                {"$set": {"status": "inactive", "ended_at": now.isoformat(), "replaced_by": sub_id, "updated_at": now.isoformat()}}
             )
             
             await db.subscriptions.insert_one(sub_doc)
+            await asyncio.gather(
+                bump_metrics(merge_metric_deltas(
+                    subscription_metric_deltas(old_active, -1),
+                    subscription_metric_deltas([sub_doc], 1)
+                )),
+                record_mrr_movements(mrr_movement_deltas(
+                    sum(subscription_mrr(sub) for sub in old_active), subscription_mrr(sub_doc)
+                ))
+            )
             
             # Update user subscription status
             await db.users.update_one(
                 {"user_id": current_user.user_id},
                 {"$set": {
                     "subscription_status": "active",
-                    "current_plan": f"{txn['plan_type']}_{txn['plan_tier']}"
+                    "current_plan": f"{txn['plan_type']}_{txn['plan_tier']}",
+                    "updated_at": now.isoformat()
                 }}
             )
             
             # Send admin notification (non-blocking)
-            asyncio.create_task(notify_new_subscription(
+            task_supervisor.spawn("notify_new_subscription", notify_new_subscription(
                 current_user.name, current_user.email,
                 txn["plan_type"], txn["plan_tier"], txn["amount"]
             ))
@@ -1020,31 +1289,784 @@ async def stripe_webhook(request: Request):
         webhook_response = await stripe_checkout.handle_webhook(body, sig)
         
         if webhook_response.payment_status == "paid":
-            session_id = webhook_response.session_id
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {
-                    "status": "completed",
-                    "payment_status": "paid",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
+            await complete_transaction(webhook_response.session_id)
         
         return {"received": True}
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         return {"received": True}
 
-# ==================== AI ROUTES ====================
+# ==================== CACHING ====================
 
-@api_router.post("/ai/insights")
-async def get_ai_insights(insight_request: AIInsightRequest, current_user: User = Depends(get_current_user)):
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+class SnapshotCache:
+    """Short-TTL cache with single-flight refresh, so concurrent callers share one computation"""
     
-    chat = LlmChat(
-        api_key=EMERGENT_LLM_KEY,
-        session_id=f"insights_{current_user.user_id}_{uuid.uuid4().hex[:8]}",
-        system_message="""You are FINMAR AI Assistant, an expert in Australian business finance, marketing strategy, and business automation. 
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: Dict[str, Tuple[float, Any]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+    
+    async def get(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        future = self.inflight.get(key)
+        if future is None:
+            future = self.inflight[key] = asyncio.ensure_future(self._refresh(key, compute))
+        # Shielded so one client disconnecting does not cancel the shared refresh
+        return await asyncio.shield(future)
+    
+    async def _refresh(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            while len(self.entries) > self.max_entries:
+                # Oldest refresh first; dicts keep insertion order
+                self.entries.pop(next(iter(self.entries)))
+            return value
+        finally:
+            self.inflight.pop(key, None)
+    
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+# ==================== QUERY FAN-OUT ====================
+
+# Handlers that need several independent queries run them through fan_out so latency is
+# the slowest query rather than the sum. Each query gets its own timeout and is recorded
+# as a span that the middleware below reports in the Server-Timing response header.
+# The timeout is also sent to MongoDB as maxTimeMS (via pymongo.timeout), so the server
+# stops the work rather than finishing a query nobody is waiting for.
+QUERY_TIMEOUT_SECONDS = float(os.environ.get('QUERY_TIMEOUT_SECONDS', '10'))
+QUERY_TIMEOUT_BACKSTOP_SECONDS = 0.5
+query_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("query_spans", default=None)
+
+class QueryTimeoutError(TimeoutError):
+    """A fan_out query ran past its timeout; endpoints answer 504, jobs see a plain timeout"""
+    
+    def __init__(self, name: str):
+        super().__init__(f"Query '{name}' timed out")
+        self.name = name
+
+async def fan_out(queries: Dict[str, Callable[[], Awaitable[Any]]], timeout: float = QUERY_TIMEOUT_SECONDS) -> Dict[str, Any]:
+    """Run named query factories concurrently, each bounded by timeout; a failure cancels the rest.
+
+    Each factory is called inside pymongo.timeout: Motor hands an operation to its executor
+    with the context current when the operation is created, so only operations created
+    inside the block send maxTimeMS and are stopped by the server. wait_for is the
+    client-side backstop, allowed a little longer so the server's own limit normally fires
+    first and the query is not left running after the caller has given up.
+    """
+    spans = query_spans.get()
+    
+    async def run(name: str, query: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        try:
+            with pymongo.timeout(timeout):
+                return await asyncio.wait_for(query(), timeout + QUERY_TIMEOUT_BACKSTOP_SECONDS)
+        except asyncio.TimeoutError:
+            raise QueryTimeoutError(name)
+        except PyMongoError as e:
+            if e.timeout:
+                raise QueryTimeoutError(name) from e
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if spans is not None:
+                spans.append((name, elapsed_ms))
+            if elapsed_ms > SLOW_QUERY_LOG_MS:
+                logger.warning(f"Slow query '{name}': {elapsed_ms:.0f}ms")
+    
+    tasks = {name: asyncio.ensure_future(run(name, query)) for name, query in queries.items()}
+    try:
+        results = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return dict(zip(tasks, results))
+
+@app.exception_handler(QueryTimeoutError)
+async def query_timeout_response(request: Request, exc: QueryTimeoutError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.middleware("http")
+async def query_timing_header(request: Request, call_next):
+    spans: List[Tuple[str, float]] = []
+    token = query_spans.set(spans)
+    try:
+        response = await call_next(request)
+    finally:
+        query_spans.reset(token)
+    if spans:
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={ms:.1f}" for name, ms in spans)
+    return response
+
+# ==================== REQUEST METRICS ====================
+
+# In-process Prometheus metrics. RequestMetricsMiddleware is plain ASGI (not the
+# BaseHTTPMiddleware used above) so it adds a few microseconds per request. Routes are
+# labelled by their template, e.g. /api/admin/users/{user_id}; unmatched paths share one
+# label so scanners cannot blow up the series count. Each worker process exposes its
+# own series at /api/metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+UNMATCHED_ROUTE = "unmatched"
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class MetricFamily:
+    """One Prometheus metric with a value (or histogram) per combination of label values"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[Tuple[Any, ...], Any] = {}
+        metrics_registry.append(self)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in list(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+class Counter(MetricFamily):
+    kind = "counter"
+    
+    def inc(self, key: Tuple[Any, ...] = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(MetricFamily):
+    kind = "gauge"
+    
+    def inc(self, key: Tuple[Any, ...] = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+    
+    def dec(self, key: Tuple[Any, ...] = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) - amount
+
+class Histogram(MetricFamily):
+    kind = "histogram"
+    
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+    
+    def series(self, key: Tuple[Any, ...]) -> list:
+        series = self.values.get(key)
+        if series is None:
+            # Per-bucket (non-cumulative) counts with +Inf last, then sum and count
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return series
+    
+    def observe(self, key: Tuple[Any, ...], value: float):
+        series = self.series(key)
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in list(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+metrics_registry: List[MetricFamily] = []
+
+http_requests = Counter("http_requests_total", "HTTP requests by method, route template and status", ("method", "route", "status"))
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is complete",
+    ("method", "route"), LATENCY_BUCKETS
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS
+)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled", ("method",))
+
+class RequestMetricsMiddleware:
+    """Record latency, status, response size and in-flight count for every HTTP request"""
+    
+    def __init__(self, app):
+        self.app = app
+        # (method, route template) -> the series a request updates, resolved once per route
+        # so each request costs one dict lookup (see benchmarks/bench_request_metrics.py)
+        self.route_series: Dict[Tuple[str, str], Tuple[list, list, Dict[int, Tuple[str, str, int]]]] = {}
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        size = 0
+        
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+        
+        in_flight, flight_key = http_in_flight.values, (method,)
+        in_flight[flight_key] = in_flight.get(flight_key, 0) + 1
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_scope.reset(token)
+            in_flight[flight_key] -= 1
+            key = (method, route_template(scope))
+            latency, response_size, status_keys = self.route_series.get(key) or self.resolve_series(key)
+            latency[0][bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            latency[1] += elapsed
+            latency[2] += 1
+            response_size[0][bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+            response_size[1] += size
+            response_size[2] += 1
+            status_key = status_keys.get(status)
+            if status_key is None:
+                status_key = status_keys[status] = (*key, status)
+            http_requests.values[status_key] = http_requests.values.get(status_key, 0) + 1
+    
+    def resolve_series(self, key: Tuple[str, str]):
+        series = self.route_series[key] = (http_latency.series(key), http_response_size.series(key), {})
+        return series
+
+def route_template(scope: dict) -> str:
+    # The router stores the matched route in the (shared) scope
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE) if route else UNMATCHED_ROUTE
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for family in metrics_registry:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus text exposition of this process's metrics"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Metrics token required")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ==================== MRR ====================
+
+# Monthly recurring revenue is priced from the catalog: plan price plus recurring add-ons
+# (setup fees are one-off). Current MRR is a business metrics counter maintained with the
+# subscription counters, and each month's new/expansion/contraction/churn movements are
+# $inc'd into mrr_movements as subscriptions change. Those running totals are approximate:
+# the reconciler does not recount them, so a failed $inc stays lost, and admin status edits
+# and user deletions count as movements there but carry no dates analytics.py can see.
+# The authoritative history is the one analytics.py recomputes from the subscriptions for
+# the daily analytics snapshot (/admin/analytics/mrr).
+PLAN_PRICES = {
+    f"{plan_type}/{tier}": package["price"]
+    for plan_type, packages in (
+        ("accounting", ACCOUNTING_PACKAGES), ("marketing", MARKETING_PACKAGES), ("combined", COMBINED_PACKAGES)
+    )
+    for tier, package in packages.items()
+}
+ADD_ON_PRICES = {name: add_on["price"] for name, add_on in ADD_ONS.items()}
+MRR_MOVEMENTS = ("new", "expansion", "contraction", "churn")
+
+# Fields a subscription write path must read for the counter and MRR deltas
+SUBSCRIPTION_METRIC_PROJECTION = {"_id": 0, "status": 1, "plan_type": 1, "plan_tier": 1, "add_ons": 1, "amount": 1}
+
+def subscription_mrr(sub: Dict[str, Any]) -> float:
+    """Monthly value of a subscription: catalog plan price plus add-ons, else the charged amount"""
+    price = PLAN_PRICES.get(f"{sub.get('plan_type')}/{sub.get('plan_tier')}")
+    if price is None:
+        return float(sub.get("amount") or 0)
+    return price + sum(ADD_ON_PRICES.get(name, 0.0) for name in sub.get("add_ons") or [])
+
+def mrr_movement_deltas(before: float, after: float) -> Dict[str, float]:
+    """Classify one customer's MRR going from before to after; no movement when it is unchanged"""
+    if before <= 0:
+        return {"new": after} if after > 0 else {}
+    if after <= 0:
+        return {"churn": before}
+    change = after - before
+    if not change:
+        return {}
+    return {"expansion": change} if change > 0 else {"contraction": -change}
+
+def subscription_status_movements(before: Dict[str, Any], new_status: str) -> Dict[str, float]:
+    """MRR movement for a subscription changing status"""
+    mrr = subscription_mrr(before)
+    return mrr_movement_deltas(mrr if before.get("status") == "active" else 0, mrr if new_status == "active" else 0)
+
+async def record_mrr_movements(deltas: Dict[str, float]):
+    """Add movements to the current month's MRR movement totals"""
+    increments = {field: round(value, 2) for field, value in deltas.items() if value}
+    if not increments:
+        return
+    now = datetime.now(timezone.utc)
+    try:
+        await db.mrr_movements.update_one(
+            {"_id": now.strftime("%Y-%m")},
+            {"$inc": increments, "$set": {"updated_at": now.isoformat()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to record MRR movements {increments}: {e}")
+
+def grouped_mrr(groups: List[Dict[str, Any]]) -> float:
+    """Total MRR of subscriptions grouped by plan, tier and add-ons with count and summed amount"""
+    return round(sum(
+        subscription_mrr({**group["_id"], "amount": group["amount"] / group["count"]}) * group["count"]
+        for group in groups
+    ), 2)
+
+# ==================== BUSINESS METRICS ====================
+
+# Dashboard counters live in a single business_metrics document that the write paths
+# keep current with $inc; a periodic reconciler recounts from the collections and sets the
+# counters to the recount to correct drift from failed or racing updates. Every write also
+# bumps a version, and the recount is only applied if the version is unchanged since the
+# counters were read before it, so a write that races the recount is neither lost nor
+# counted twice. A write between its collection update and its $inc can still slip
+# through; the next reconcile corrects it.
+METRICS_DOC_ID = "global"
+METRICS_COUNTER_FIELDS = ("total_users", "active_subscriptions", "new_contacts", "total_contacts", "total_revenue", "mrr")
+# Subscriptions without a plan_type are counted under this key; a None key cannot be stored
+UNKNOWN_PLAN_TYPE = "unknown"
+METRICS_RECONCILE_SECONDS = int(os.environ.get('METRICS_RECONCILE_SECONDS', '3600'))
+METRICS_RECOUNT_TIMEOUT_SECONDS = 300
+METRICS_RECONCILE_ATTEMPTS = 3
+
+async def bump_metrics(increments: Dict[str, float]):
+    """Atomically apply counter deltas to the business metrics document"""
+    increments = {field: value for field, value in increments.items() if value}
+    if not increments:
+        return
+    try:
+        await db.business_metrics.update_one(
+            {"_id": METRICS_DOC_ID},
+            {"$inc": {**increments, "version": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to update business metrics {increments}: {e}")
+
+def subscription_metric_deltas(subscriptions: List[Dict[str, Any]], sign: int) -> Dict[str, float]:
+    """Counter deltas for active subscriptions entering (+1) or leaving (-1) the active set"""
+    deltas: Dict[str, float] = defaultdict(int)
+    for sub in subscriptions:
+        if sub.get("status") == "active":
+            deltas["active_subscriptions"] += sign
+            deltas[f"subscription_by_type.{sub.get('plan_type') or UNKNOWN_PLAN_TYPE}"] += sign
+            deltas["mrr"] += round(sign * subscription_mrr(sub), 2)
+    return deltas
+
+def merge_metric_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+    """Sum several counter delta maps into one"""
+    merged: Dict[str, float] = defaultdict(int)
+    for delta in deltas:
+        for field, value in delta.items():
+            merged[field] += value
+    return merged
+
+def subscription_status_deltas(before: Dict[str, Any], new_status: str) -> Dict[str, float]:
+    """Counter deltas for a subscription changing status"""
+    return merge_metric_deltas(
+        subscription_metric_deltas([before], -1),
+        subscription_metric_deltas([{**before, "status": new_status}], 1)
+    )
+
+def contact_metric_deltas(old_status: Optional[str], new_status: Optional[str]) -> Dict[str, float]:
+    """Counter deltas for a contact moving between statuses (None = not present)"""
+    deltas = {
+        "total_contacts": (new_status is not None) - (old_status is not None),
+        "new_contacts": (new_status == "new") - (old_status == "new")
+    }
+    return deltas
+
+async def count_business_metrics() -> Dict[str, Any]:
+    """Recount the dashboard counters from the collections"""
+    subscription_pipeline = [
+        {"$match": {"status": "active"}},
+        {"$group": {"_id": "$plan_type", "count": {"$sum": 1}}}
+    ]
+    revenue_pipeline = [
+        {"$match": {"status": "completed"}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]
+    mrr_pipeline = [
+        {"$match": {"status": "active"}},
+        {"$group": {
+            "_id": {"plan_type": "$plan_type", "plan_tier": "$plan_tier", "add_ons": "$add_ons"},
+            "count": {"$sum": 1},
+            "amount": {"$sum": "$amount"}
+        }}
+    ]
+    
+    counts = await fan_out({
+        "total_users": lambda: db.users.count_documents({}),
+        "subscription_breakdown": lambda: db.subscriptions.aggregate(subscription_pipeline).to_list(20),
+        # Separate counts rather than one $facet: a match inside $facet cannot use an index
+        "total_contacts": lambda: db.contacts.count_documents({}),
+        "new_contacts": lambda: db.contacts.count_documents({"status": "new"}),
+        "revenue": lambda: db.payment_transactions.aggregate(revenue_pipeline).to_list(1),
+        "mrr": lambda: db.subscriptions.aggregate(mrr_pipeline).to_list(None)
+    }, timeout=METRICS_RECOUNT_TIMEOUT_SECONDS)
+    subscription_by_type: Dict[str, int] = defaultdict(int)
+    for item in counts["subscription_breakdown"]:
+        subscription_by_type[item["_id"] or UNKNOWN_PLAN_TYPE] += item["count"]
+    revenue = counts["revenue"]
+    
+    return {
+        "total_users": counts["total_users"],
+        "active_subscriptions": sum(subscription_by_type.values()),
+        "new_contacts": counts["new_contacts"],
+        "total_contacts": counts["total_contacts"],
+        "total_revenue": revenue[0]["total"] if revenue else 0,
+        "mrr": grouped_mrr(counts["mrr"]),
+        "subscription_by_type": dict(subscription_by_type)
+    }
+
+def flatten_metrics(metrics: Dict[str, Any]) -> Dict[str, float]:
+    """Counters as dotted field paths, the form $inc takes"""
+    flat = {field: metrics.get(field) or 0 for field in METRICS_COUNTER_FIELDS}
+    for plan_type, count in (metrics.get("subscription_by_type") or {}).items():
+        flat[f"subscription_by_type.{plan_type}"] = count or 0
+    return flat
+
+async def reconcile_business_metrics() -> Dict[str, Any]:
+    """Correct the counters to an exact recount, logging any drift"""
+    for attempt in range(METRICS_RECONCILE_ATTEMPTS):
+        # Read before the recount: a write landing after this read bumps the version
+        current = await db.business_metrics.find_one({"_id": METRICS_DOC_ID}) or {}
+        exact = await count_business_metrics()
+        previous = flatten_metrics(current)
+        target = flatten_metrics(exact)
+        counters = {field: target.get(field, 0) for field in set(target) | set(previous)}
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            result = await db.business_metrics.update_one(
+                {"_id": METRICS_DOC_ID, "version": current.get("version")},
+                {"$set": {**counters, "updated_at": now, "reconciled_at": now}, "$inc": {"version": 1}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The document was created by a write during the recount
+            result = None
+        if result is not None and (result.matched_count or result.upserted_id is not None):
+            break
+        logger.info(f"Business metrics changed during recount (attempt {attempt + 1}); recounting")
+    else:
+        logger.warning(f"Business metrics kept changing during {METRICS_RECONCILE_ATTEMPTS} recounts; left to the next reconcile")
+        return exact
+    drift = {field: round(value - previous.get(field, 0), 2) for field, value in counters.items()}
+    drift = {field: value for field, value in drift.items() if value}
+    if drift and any(previous.values()):
+        logger.warning(f"Business metrics drift corrected: {drift}")
+    return exact
+
+async def get_business_metrics() -> Dict[str, Any]:
+    """Read the maintained counters, bootstrapping them on first use"""
+    metrics = await db.business_metrics.find_one({"_id": METRICS_DOC_ID}, {"_id": 0})
+    if not metrics or "reconciled_at" not in metrics:
+        await reconcile_business_metrics()
+        metrics = await db.business_metrics.find_one({"_id": METRICS_DOC_ID}, {"_id": 0})
+    metrics["subscription_by_type"] = {
+        plan_type: count for plan_type, count in (metrics.get("subscription_by_type") or {}).items() if count
+    }
+    return metrics
+
+async def business_metrics_reconciler():
+    """Periodically correct counter drift"""
+    while True:
+        await asyncio.sleep(METRICS_RECONCILE_SECONDS)
+        try:
+            await reconcile_business_metrics()
+        except Exception as e:
+            logger.error(f"Business metrics reconcile failed: {e}")
+
+# ==================== REVENUE ROLLUPS ====================
+
+# Completed revenue is pre-aggregated into one revenue_daily document per UTC day and
+# plan type, so charts read a bounded number of small documents however many payments
+# fall in the range. complete_transaction keeps the rollups current; the backfill job
+# rebuilds them from payment_transactions.
+REVENUE_CHART_MAX_DAYS = 366 * 10
+REVENUE_GRANULARITIES = ("day", "week", "month")
+REVENUE_BACKFILL_BATCH_SIZE = 500
+_revenue_backfill_lock = asyncio.Lock()
+
+def revenue_rollup_id(day: str, plan_type: str) -> str:
+    return f"{day}:{plan_type}"
+
+async def record_revenue(txn: Dict[str, Any]):
+    """Add a newly completed transaction to its daily rollup"""
+    day = txn["created_at"][:10]
+    plan_type = txn.get("plan_type") or "unknown"
+    try:
+        await db.revenue_daily.update_one(
+            {"_id": revenue_rollup_id(day, plan_type)},
+            {
+                "$inc": {"revenue": txn.get("amount", 0), "count": 1},
+                "$set": {"date": day, "plan_type": plan_type, "updated_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to record revenue for {txn.get('transaction_id')}: {e}")
+
+async def retract_revenue(txns: List[Dict[str, Any]]):
+    """Remove completed transactions that are being deleted from their daily rollups"""
+    totals: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0, 0])
+    for txn in txns:
+        key = (txn["created_at"][:10], txn.get("plan_type") or "unknown")
+        totals[key][0] += txn.get("amount", 0)
+        totals[key][1] += 1
+    if not totals:
+        return
+    try:
+        await db.revenue_daily.bulk_write([
+            UpdateOne({"_id": revenue_rollup_id(day, plan_type)}, {"$inc": {"revenue": -revenue, "count": -count}})
+            for (day, plan_type), (revenue, count) in totals.items()
+        ], ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to retract revenue for {len(txns)} transactions: {e}")
+
+async def run_revenue_backfill(job: Dict[str, Any]):
+    """Rebuild the daily rollups from completed transactions and drop stale ones"""
+    job_id = job["job_id"]
+    pipeline = [
+        {"$match": {"status": "completed"}},
+        {"$group": {
+            "_id": {"date": {"$substr": ["$created_at", 0, 10]}, "plan_type": {"$ifNull": ["$plan_type", "unknown"]}},
+            "revenue": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    async with _revenue_backfill_lock:
+        try:
+            now = datetime.now(timezone.utc).isoformat()
+            rollup_ids = []
+            batch = []
+            async for row in db.payment_transactions.aggregate(pipeline, allowDiskUse=True):
+                day, plan_type = row["_id"]["date"], row["_id"]["plan_type"]
+                rollup_id = revenue_rollup_id(day, plan_type)
+                rollup_ids.append(rollup_id)
+                batch.append(UpdateOne(
+                    {"_id": rollup_id},
+                    {"$set": {"date": day, "plan_type": plan_type, "revenue": row["revenue"],
+                              "count": row["count"], "updated_at": now}},
+                    upsert=True
+                ))
+                if len(batch) >= REVENUE_BACKFILL_BATCH_SIZE:
+                    await db.revenue_daily.bulk_write(batch, ordered=False)
+                    batch = []
+                    await update_job(job_id, progress={"rollups": len(rollup_ids)})
+            if batch:
+                await db.revenue_daily.bulk_write(batch, ordered=False)
+            stale = await db.revenue_daily.delete_many({"_id": {"$nin": rollup_ids}})
+            
+            report = {"rollups": len(rollup_ids), "removed": stale.deleted_count}
+            await update_job(job_id, status="completed", progress={"rollups": len(rollup_ids)}, report=report)
+        except Exception as e:
+            logger.error(f"Revenue backfill {job_id} failed: {e}")
+            await update_job(job_id, status="failed", error=str(e))
+
+async def ensure_revenue_rollups():
+    """Build the rollups once on a database that has never been backfilled"""
+    if await db.jobs.find_one({"kind": "revenue_backfill", "status": "completed"}, {"_id": 1}):
+        return
+    job = await create_job("revenue_backfill", {"trigger": "startup"})
+    task_supervisor.spawn("revenue_backfill", run_revenue_backfill(job))
+
+def revenue_bucket(day: str, granularity: str) -> str:
+    """Chart bucket for a YYYY-MM-DD day: the day, its ISO week's Monday, or YYYY-MM"""
+    if granularity == "month":
+        return day[:7]
+    if granularity == "week":
+        parsed = date.fromisoformat(day)
+        return (parsed - timedelta(days=parsed.weekday())).isoformat()
+    return day
+
+async def revenue_series(start: date, end: date, granularity: str, by_plan: bool) -> List[Dict[str, Any]]:
+    """Revenue per bucket between start and end (inclusive), with empty buckets filled"""
+    rollups = await db.revenue_daily.find(
+        {"date": {"$gte": start.isoformat(), "$lte": end.isoformat()}},
+        {"_id": 0, "date": 1, "plan_type": 1, "revenue": 1, "count": 1}
+    ).to_list(None)
+    
+    series: Dict[str, Dict[str, Any]] = OrderedDict()
+    day = start
+    while day <= end:
+        bucket = revenue_bucket(day.isoformat(), granularity)
+        if bucket not in series:
+            series[bucket] = {"_id": bucket, "revenue": 0, "count": 0}
+            if by_plan:
+                series[bucket]["by_plan"] = {}
+        day += timedelta(days=1)
+    
+    for rollup in rollups:
+        point = series[revenue_bucket(rollup["date"], granularity)]
+        point["revenue"] += rollup["revenue"]
+        point["count"] += rollup["count"]
+        if by_plan:
+            plans = point["by_plan"]
+            plans[rollup["plan_type"]] = plans.get(rollup["plan_type"], 0) + rollup["revenue"]
+    
+    for point in series.values():
+        point["revenue"] = round(point["revenue"], 2)
+        if by_plan:
+            point["by_plan"] = {plan: round(revenue, 2) for plan, revenue in point["by_plan"].items()}
+    return list(series.values())
+
+# ==================== BACKGROUND JOBS ====================
+
+# Long-running services (outbox workers, schedulers) started at startup, cancelled at shutdown
+background_services: List[asyncio.Task] = []
+
+TASK_SUPERVISOR_CONCURRENCY = int(os.environ.get('TASK_SUPERVISOR_CONCURRENCY', '20'))
+TASK_SUPERVISOR_MAX_PENDING = int(os.environ.get('TASK_SUPERVISOR_MAX_PENDING', '500'))
+TASK_DRAIN_TIMEOUT_SECONDS = float(os.environ.get('TASK_DRAIN_TIMEOUT_SECONDS', '10'))
+
+class TaskSupervisor:
+    """Owns fire-and-forget request work: keeps references, caps concurrency, drains on shutdown"""
+    
+    def __init__(self, concurrency: int, max_pending: int):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks: Set[asyncio.Task] = set()
+        self.accepting = True
+        self.running: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"started": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        )
+    
+    def spawn(self, kind: str, coro) -> Optional[asyncio.Task]:
+        """Schedule coro in the background, or drop it when the supervisor is full or draining"""
+        if not self.accepting or len(self.tasks) >= self.max_pending:
+            coro.close()
+            self.counters[kind]["rejected"] += 1
+            logger.warning(f"Background task rejected: {kind} ({len(self.tasks)} in flight)")
+            return None
+        task = asyncio.create_task(self._run(kind, coro), name=f"supervised:{kind}")
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        self.counters[kind]["started"] += 1
+        return task
+    
+    async def _run(self, kind: str, coro):
+        try:
+            async with self.semaphore:
+                self.running[kind] += 1
+                try:
+                    await coro
+                finally:
+                    self.running[kind] -= 1
+            self.counters[kind]["completed"] += 1
+        except asyncio.CancelledError:
+            coro.close()
+            self.counters[kind]["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.counters[kind]["failed"] += 1
+            logger.error(f"Background task {kind} failed: {str(e)}")
+    
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """Stop accepting work, wait up to timeout for in-flight tasks, then cancel the rest"""
+        self.accepting = False
+        pending = set(self.tasks)
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return {"cancelled": len(pending)}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self.tasks),
+            "running": sum(self.running.values()),
+            "concurrency": self.concurrency,
+            "max_pending": self.max_pending,
+            "accepting": self.accepting,
+            "by_kind": {
+                kind: {**counters, "running": self.running[kind]}
+                for kind, counters in self.counters.items()
+            }
+        }
+
+task_supervisor = TaskSupervisor(TASK_SUPERVISOR_CONCURRENCY, TASK_SUPERVISOR_MAX_PENDING)
+
+# Long-running admin jobs record their progress, checkpoint and final report in db.jobs
+
+async def create_job(kind: str, params: Optional[Dict[str, Any]] = None, **fields) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc).isoformat()
+    job_doc = {
+        "job_id": f"job_{uuid.uuid4().hex[:12]}",
+        "kind": kind,
+        "status": "running",
+        "params": params or {},
+        "progress": {},
+        "checkpoint": None,
+        "report": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        **fields
+    }
+    await db.jobs.insert_one(job_doc)
+    job_doc.pop("_id", None)
+    return job_doc
+
+async def update_job(job_id: str, **fields):
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.jobs.update_one({"job_id": job_id}, {"$set": fields})
+
+async def claim_scheduled_run(name: str, run_key: str) -> bool:
+    """Claim a scheduled run so only one API worker executes it"""
+    result = await db.scheduled_runs.update_one(
+        {"_id": f"{name}:{run_key}"},
+        {"$setOnInsert": {"claimed_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+def seconds_until_hour(hour: int) -> float:
+    """Seconds from now until the next occurrence of hour:00 UTC"""
+    now = datetime.now(timezone.utc)
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+# ==================== AI ROUTES ====================
+
+AI_SYSTEM_MESSAGE = """You are FINMAR AI Assistant, an expert in Australian business finance, marketing strategy, and business automation. 
         You help small and medium businesses with:
         - Financial insights and bookkeeping advice
         - BAS/GST compliance guidance
@@ -1053,17 +2075,30 @@ async def get_ai_insights(insight_request: AIInsightRequest, current_user: User
         - Automation opportunities
         
         Provide practical, actionable advice tailored to Australian SMBs. Keep responses concise and professional."""
+
+async def generate_ai_response(session_id: str, text: str) -> str:
+    """Send a single message to the FINMAR assistant model"""
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=AI_SYSTEM_MESSAGE
     )
     
     chat.with_model("openai", "gpt-5.2")
     
+    return await chat.send_message(UserMessage(text=text))
+
+@api_router.post("/ai/insights")
+async def get_ai_insights(insight_request: AIInsightRequest, current_user: User = Depends(get_current_user)):
     context = insight_request.context or ""
     full_query = f"{context}\n\nUser Query: {insight_request.query}" if context else insight_request.query
     
-    user_message = UserMessage(text=full_query)
-    
     try:
-        response = await chat.send_message(user_message)
+        response = await generate_ai_response(
+            f"insights_{current_user.user_id}_{uuid.uuid4().hex[:8]}", full_query
+        )
         
         # Store chat history
         chat_doc = {
@@ -1080,6 +2115,12 @@ async def get_ai_insights(insight_request: AIInsightRequest, current_user: User
         logger.error(f"AI Error: {e}")
         raise HTTPException(status_code=500, detail="AI service temporarily unavailable")
 
+@api_router.get("/ai/insights/precomputed")
+async def get_precomputed_insight(current_user: User = Depends(get_current_user)):
+    """Get the nightly precomputed business insight for the current user"""
+    insight = await db.precomputed_insights.find_one({"user_id": current_user.user_id}, {"_id": 0})
+    return {"insight": insight}
+
 @api_router.get("/ai/chat-history")
 async def get_chat_history(current_user: User = Depends(get_current_user)):
     chats = await db.ai_chats.find(
@@ -1088,58 +2129,645 @@ async def get_chat_history(current_user: User = Depends(get_current_user)):
     ).sort("created_at", -1).limit(20).to_list(20)
     return chats
 
-# ==================== PUSH NOTIFICATIONS ====================
+# ==================== AI CHAT SEARCH ====================
 
-class PushTokenRegister(BaseModel):
-    token: str
-    platform: str  # 'ios' or 'android'
+CHAT_SEARCH_MAX_LIMIT = 50
+CHAT_SNIPPET_RADIUS = 80
 
-@api_router.post("/notifications/register")
-async def register_push_token(token_data: PushTokenRegister, current_user: User = Depends(get_current_user)):
-    """Register device push notification token"""
-    await db.push_tokens.update_one(
-        {"user_id": current_user.user_id},
-        {"$set": {
-            "token": token_data.token,
-            "platform": token_data.platform,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
-    )
-    return {"message": "Push token registered successfully"}
+def _search_terms(query: str) -> List[str]:
+    """Split a search query into lowercase terms used for highlighting"""
+    return [term for term in re.findall(r"\w+", query.lower()) if len(term) > 1]
 
-@api_router.delete("/notifications/unregister")
-async def unregister_push_token(current_user: User = Depends(get_current_user)):
-    """Unregister device push notification token"""
-    await db.push_tokens.delete_one({"user_id": current_user.user_id})
-    return {"message": "Push token unregistered"}
+def _term_stem(term: str) -> str:
+    """Rough stem so highlighting lines up with Mongo's stemmed text matches"""
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
 
-# ==================== CONTACT ROUTES ====================
+def highlight_snippet(text: str, terms: List[str], radius: int = CHAT_SNIPPET_RADIUS) -> Optional[str]:
+    """Return an HTML-escaped excerpt around the first match with matches wrapped in <mark>"""
+    if not text or not terms:
+        return None
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(_term_stem(t)) for t in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    if not first:
+        return None
+    start = max(0, first.start() - radius)
+    end = min(len(text), first.end() + radius)
+    excerpt = text[start:end]
+    parts = []
+    last = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(excerpt[last:]))
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
 
-@api_router.post("/contact")
-async def submit_contact(contact: ContactRequest):
-    contact_doc = {
-        "contact_id": f"contact_{uuid.uuid4().hex[:12]}",
-        "name": contact.name,
-        "email": contact.email,
-        "phone": contact.phone,
-        "business_name": contact.business_name,
-        "service_interest": contact.service_interest,
-        "message": contact.message,
-        "status": "new",
+async def search_chats(q: str, user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked full-text search over ai_chats backed by the ai_chats_text index"""
+    terms = _search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query required")
+    limit = max(1, min(limit, CHAT_SEARCH_MAX_LIMIT))
+    
+    query: Dict[str, Any] = {"$text": {"$search": q}}
+    if user_id:
+        query["user_id"] = user_id
+    
+    chats = await db.ai_chats.find(
+        query,
+        {"_id": 0, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+    
+    for chat in chats:
+        chat["highlights"] = {
+            "query": highlight_snippet(chat.get("query", ""), terms),
+            "response": highlight_snippet(chat.get("response", ""), terms)
+        }
+    return chats
+
+@api_router.get("/ai/chat-history/search")
+async def search_chat_history(q: str, limit: int = 20, current_user: User = Depends(get_current_user)):
+    """Search the current user's AI chat history"""
+    results = await search_chats(q, user_id=current_user.user_id, limit=limit)
+    return {"results": results, "query": q}
+
+# ==================== PRECOMPUTED AI INSIGHTS ====================
+
+INSIGHTS_BATCH_CONCURRENCY = int(os.environ.get('INSIGHTS_BATCH_CONCURRENCY', '5'))
+INSIGHTS_BATCH_PAGE_SIZE = int(os.environ.get('INSIGHTS_BATCH_PAGE_SIZE', '50'))
+INSIGHTS_BATCH_HOUR_UTC = int(os.environ.get('INSIGHTS_BATCH_HOUR_UTC', '16'))  # 2-3am Australian Eastern time
+INSIGHTS_FRESH_HOURS = 20
+# A run holds a lease on its job document and renews it while working; a job whose lease
+# has expired belongs to a worker that died and may be resumed by any other. A unique
+# partial index allows one "running" insights job, so claims are settled by the database.
+INSIGHTS_LEASE_SECONDS = int(os.environ.get('INSIGHTS_LEASE_SECONDS', '120'))
+INSIGHTS_RESUMABLE = ["interrupted", "failed"]
+
+def build_insight_prompt(user: Dict[str, Any], subscription: Dict[str, Any]) -> str:
+    """Build the generic "how is my business going" prompt for a subscriber"""
+    details = [
+        f"Business: {user.get('business_name') or 'Not provided'}",
+        f"Industry: {user.get('industry') or 'Not provided'}",
+        f"State: {user.get('state') or 'Not provided'}",
+        f"ABN registered: {'Yes' if user.get('abn') else 'No'}",
+        f"FINMAR plan: {subscription['plan_type'].title()} - {subscription['plan_tier'].title()}",
+    ]
+    if subscription.get("add_ons"):
+        details.append(f"Add-ons: {', '.join(subscription['add_ons'])}")
+    return (
+        "\n".join(details)
+        + "\n\nUser Query: How is my business going? Give a short overview of the key financial, "
+        "compliance and marketing priorities for a business like mine this month, with three concrete next steps."
+    )
+
+def lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=INSIGHTS_LEASE_SECONDS)).isoformat()
+
+async def update_leased_job(job_id: str, owner: str, **fields) -> bool:
+    """update_job fenced on the lease, so a worker that lost it cannot overwrite the new owner"""
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    result = await db.jobs.update_one({"job_id": job_id, "lease_owner": owner}, {"$set": fields})
+    return result.matched_count == 1
+
+async def hold_job_lease(job_id: str, owner: str, lost: asyncio.Event):
+    """Renew the lease every third of its length until cancelled, flagging lost if it is taken over"""
+    while True:
+        await asyncio.sleep(INSIGHTS_LEASE_SECONDS / 3)
+        try:
+            renewed = await update_leased_job(job_id, owner, lease_expires_at=lease_expiry())
+        except Exception as e:
+            logger.warning(f"Lease renewal for job {job_id} failed: {e}")
+            continue
+        if not renewed:
+            lost.set()
+            return
+
+async def claim_insights_job(resume: bool, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Lease the latest unfinished insights job, or a new one; None while another run holds a lease"""
+    now = datetime.now(timezone.utc).isoformat()
+    # A run whose worker died stays "running" until its lease is seen to have run out
+    await db.jobs.update_many(
+        {"kind": "insights_batch", "status": "running", "lease_expires_at": {"$lte": now}},
+        {"$set": {"status": "interrupted", "lease_owner": None, "lease_expires_at": None, "updated_at": now}}
+    )
+    lease = {"lease_owner": f"insights_{uuid.uuid4().hex[:12]}", "lease_expires_at": lease_expiry()}
+    try:
+        if resume:
+            job = await db.jobs.find_one_and_update(
+                {"kind": "insights_batch", "status": {"$in": INSIGHTS_RESUMABLE}},
+                {"$set": {**lease, "status": "running", "error": None, "updated_at": now}},
+                projection={"_id": 0},
+                sort=[("created_at", -1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+        return await create_job("insights_batch", {"concurrency": INSIGHTS_BATCH_CONCURRENCY, **(params or {})}, **lease)
+    except DuplicateKeyError:
+        return None
+
+async def run_insights_batch(job: Dict[str, Any]):
+    """Generate insights for every active subscriber, resuming after the job checkpoint"""
+    job_id = job["job_id"]
+    owner = job["lease_owner"]
+    progress = {"processed": 0, "failed": 0, "skipped": 0, **(job.get("progress") or {})}
+    # progress accumulates across resumed runs; the rate is reported for this run alone
+    run_progress = {"processed": 0, "failed": 0, "skipped": 0}
+    checkpoint = job.get("checkpoint")
+    lease_lost = asyncio.Event()
+    heartbeat = asyncio.create_task(hold_job_lease(job_id, owner, lease_lost))
+    semaphore = asyncio.Semaphore(INSIGHTS_BATCH_CONCURRENCY)
+    started = datetime.now(timezone.utc)
+    fresh_after = (started - timedelta(hours=INSIGHTS_FRESH_HOURS)).isoformat()
+    
+    async def generate(subscription: Dict[str, Any], user: Dict[str, Any]) -> str:
+        async with semaphore:
+            try:
+                insight = await generate_ai_response(
+                    f"batch_insights_{user['user_id']}_{uuid.uuid4().hex[:8]}",
+                    build_insight_prompt(user, subscription)
+                )
+            except Exception as e:
+                logger.error(f"Insight generation failed for {user['user_id']}: {e}")
+                return "failed"
+            await db.precomputed_insights.update_one(
+                {"user_id": user["user_id"]},
+                {"$set": {
+                    "user_id": user["user_id"],
+                    "insight": insight,
+                    "plan_type": subscription["plan_type"],
+                    "plan_tier": subscription["plan_tier"],
+                    "industry": user.get("industry"),
+                    "state": user.get("state"),
+                    "job_id": job_id,
+                    "generated_at": datetime.now(timezone.utc).isoformat()
+                }},
+                upsert=True
+            )
+            return "processed"
+    
+    try:
+        while True:
+            if lease_lost.is_set():
+                logger.warning(f"Insights batch {job_id} lost its lease at {checkpoint}; stopping")
+                return
+            query: Dict[str, Any] = {"status": "active"}
+            if checkpoint:
+                query["subscription_id"] = {"$gt": checkpoint}
+            page = await db.subscriptions.find(
+                query,
+                {"_id": 0, "subscription_id": 1, "user_id": 1, "plan_type": 1, "plan_tier": 1, "add_ons": 1}
+            ).sort("subscription_id", 1).limit(INSIGHTS_BATCH_PAGE_SIZE).to_list(INSIGHTS_BATCH_PAGE_SIZE)
+            if not page:
+                break
+            
+            user_ids = [sub["user_id"] for sub in page]
+            users = await db.users.find(
+                {"user_id": {"$in": user_ids}},
+                {"_id": 0, "user_id": 1, "business_name": 1, "industry": 1, "state": 1, "abn": 1}
+            ).to_list(len(user_ids))
+            users_by_id = {user["user_id"]: user for user in users}
+            fresh = await db.precomputed_insights.distinct(
+                "user_id", {"user_id": {"$in": user_ids}, "generated_at": {"$gte": fresh_after}}
+            )
+            fresh_ids = set(fresh)
+            
+            work = []
+            for sub in page:
+                user = users_by_id.get(sub["user_id"])
+                if not user or sub["user_id"] in fresh_ids:
+                    progress["skipped"] += 1
+                    run_progress["skipped"] += 1
+                    continue
+                work.append(generate(sub, user))
+            for outcome in await asyncio.gather(*work):
+                progress[outcome] += 1
+                run_progress[outcome] += 1
+            
+            checkpoint = page[-1]["subscription_id"]
+            if not await update_leased_job(job_id, owner, checkpoint=checkpoint, progress=progress):
+                lease_lost.set()
+        
+        elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+        report = {
+            **progress,
+            "run": run_progress,
+            "elapsed_seconds": round(elapsed, 2),
+            "insights_per_minute": round(run_progress["processed"] / elapsed * 60, 2) if elapsed else 0.0,
+            "concurrency": INSIGHTS_BATCH_CONCURRENCY
+        }
+        await update_leased_job(job_id, owner, status="completed", progress=progress, report=report, lease_expires_at=None)
+        logger.info(f"Insights batch {job_id} completed: {report}")
+    except asyncio.CancelledError:
+        await update_leased_job(job_id, owner, status="interrupted", checkpoint=checkpoint, progress=progress, lease_expires_at=None)
+        raise
+    except Exception as e:
+        logger.error(f"Insights batch {job_id} failed: {e}")
+        await update_leased_job(job_id, owner, status="failed", checkpoint=checkpoint, progress=progress, error=str(e), lease_expires_at=None)
+    finally:
+        heartbeat.cancel()
+
+async def start_insights_batch(resume: bool = True, **params) -> Optional[Dict[str, Any]]:
+    """Run the insights batch, resuming the last unfinished run when asked"""
+    job = await claim_insights_job(resume, params)
+    if not job:
+        logger.info("Insights batch already running under another lease; not starting")
+        return None
+    await run_insights_batch(job)
+    return job
+
+async def nightly_insights_scheduler():
+    """Run the insights batch once a night"""
+    while True:
+        await asyncio.sleep(seconds_until_hour(INSIGHTS_BATCH_HOUR_UTC))
+        run_key = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        try:
+            # A fresh job each night: resuming an old one would skip everyone before its checkpoint
+            if await claim_scheduled_run("insights_batch", run_key):
+                await start_insights_batch(resume=False, run_key=run_key)
+        except Exception as e:
+            logger.error(f"Nightly insights batch failed: {e}")
+
+# ==================== CONTACT ROUTES ====================
+
+# The contact form is unauthenticated, so floods and resubmits are rejected in memory
+# before any Mongo write or email is queued
+CONTACT_RATE_LIMIT_PER_IP = int(os.environ.get('CONTACT_RATE_LIMIT_PER_IP', '5'))
+CONTACT_RATE_LIMIT_PER_EMAIL = int(os.environ.get('CONTACT_RATE_LIMIT_PER_EMAIL', '3'))
+CONTACT_RATE_WINDOW_SECONDS = int(os.environ.get('CONTACT_RATE_WINDOW_SECONDS', '3600'))
+# Reverse proxies in front of the API that append to X-Forwarded-For (0 = none, trust the peer)
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+CONTACT_DUPLICATE_TTL_SECONDS = int(os.environ.get('CONTACT_DUPLICATE_TTL_SECONDS', '600'))
+
+class SlidingWindowRateLimiter:
+    """In-memory sliding-window rate limiter keyed by an arbitrary string"""
+    
+    def __init__(self, limit: int, window_seconds: int, max_keys: int = 100000):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.hits: Dict[str, deque] = {}
+    
+    def hit(self, key: str) -> float:
+        """Record a hit and return 0, or return seconds until the key may retry"""
+        now = time.monotonic()
+        window_start = now - self.window_seconds
+        hits = self.hits.get(key)
+        if hits is None:
+            if len(self.hits) >= self.max_keys:
+                self.prune(now)
+            hits = self.hits[key] = deque()
+        while hits and hits[0] <= window_start:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return hits[0] - window_start
+        hits.append(now)
+        return 0.0
+    
+    def prune(self, now: float):
+        window_start = now - self.window_seconds
+        for key in [k for k, hits in self.hits.items() if not hits or hits[-1] <= window_start]:
+            del self.hits[key]
+
+class DuplicateDetector:
+    """Remembers content hashes for a short TTL so repeat submissions collapse onto the first"""
+    
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.seen: "OrderedDict[str, tuple]" = OrderedDict()
+    
+    def _expire(self, now: float):
+        # Entries share one TTL, so insertion order is expiry order
+        while self.seen:
+            key, (expires_at, _) = next(iter(self.seen.items()))
+            if expires_at > now:
+                break
+            self.seen.pop(key)
+    
+    def get(self, key: str) -> Optional[str]:
+        self._expire(time.monotonic())
+        entry = self.seen.get(key)
+        return entry[1] if entry else None
+    
+    def remember(self, key: str, value: str):
+        self.seen[key] = (time.monotonic() + self.ttl_seconds, value)
+    
+    def forget(self, key: str):
+        self.seen.pop(key, None)
+
+contact_ip_limiter = SlidingWindowRateLimiter(CONTACT_RATE_LIMIT_PER_IP, CONTACT_RATE_WINDOW_SECONDS)
+contact_email_limiter = SlidingWindowRateLimiter(CONTACT_RATE_LIMIT_PER_EMAIL, CONTACT_RATE_WINDOW_SECONDS)
+contact_duplicates = DuplicateDetector(CONTACT_DUPLICATE_TTL_SECONDS)
+contact_metrics = {"accepted": 0, "duplicate": 0, "rate_limited_ip": 0, "rate_limited_email": 0}
+
+def get_client_ip(request: Request) -> str:
+    """The hop the outermost trusted proxy recorded, or the socket peer with no proxy configured"""
+    if TRUSTED_PROXY_COUNT:
+        # Each trusted proxy appends the address it saw; anything further left is client-supplied
+        hops = [hop.strip() for header in request.headers.getlist("X-Forwarded-For") for hop in header.split(",")]
+        hops = [hop for hop in hops if hop]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return request.client.host if request.client else "unknown"
+
+def contact_fingerprint(contact: ContactRequest) -> str:
+    normalized = "|".join([
+        contact.email.lower(),
+        contact.name.strip().lower(),
+        contact.service_interest.strip().lower(),
+        " ".join(contact.message.lower().split())
+    ])
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+@api_router.post("/contact")
+async def submit_contact(contact: ContactRequest, request: Request):
+    fingerprint = contact_fingerprint(contact)
+    existing_id = contact_duplicates.get(fingerprint)
+    if existing_id:
+        contact_metrics["duplicate"] += 1
+        return {"message": "Thank you for contacting us. We'll be in touch soon!", "contact_id": existing_id}
+    
+    retry_after = contact_ip_limiter.hit(get_client_ip(request))
+    if retry_after:
+        contact_metrics["rate_limited_ip"] += 1
+    else:
+        retry_after = contact_email_limiter.hit(contact.email.lower())
+        if retry_after:
+            contact_metrics["rate_limited_email"] += 1
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many submissions. Please try again later.",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+    
+    contact_doc = {
+        "contact_id": f"contact_{uuid.uuid4().hex[:12]}",
+        "name": contact.name,
+        "email": contact.email,
+        "phone": contact.phone,
+        "business_name": contact.business_name,
+        "service_interest": contact.service_interest,
+        "message": contact.message,
+        "status": "new",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.contacts.insert_one(contact_doc)
+    # Reserve the fingerprint first so concurrent resubmits collapse too
+    contact_duplicates.remember(fingerprint, contact_doc["contact_id"])
+    try:
+        await db.contacts.insert_one(contact_doc)
+    except Exception:
+        contact_duplicates.forget(fingerprint)
+        raise
+    contact_metrics["accepted"] += 1
+    await bump_metrics(contact_metric_deltas(None, "new"))
     
     # Send admin notification (non-blocking)
-    asyncio.create_task(notify_new_contact(
+    task_supervisor.spawn("notify_new_contact", notify_new_contact(
         contact.name, contact.email, contact.service_interest, 
         contact.message, contact.business_name
     ))
     
     return {"message": "Thank you for contacting us. We'll be in touch soon!", "contact_id": contact_doc["contact_id"]}
 
+# ==================== USER SEARCH ====================
+
+# Admin user search runs on keys maintained on each user document instead of regexes
+# over the raw fields. search_tokens holds the casefolded, accent-stripped words (any
+# script) of the name, business name and email and is matched by anchored prefix;
+# search_fuzzy holds every token plus its single-character deletions, so a one-letter
+# typo in the query still shares an index key with the stored word. Bumping
+# USER_SEARCH_KEY_VERSION makes startup recompute the keys of every older user.
+USER_SEARCH_FIELDS = ("name", "email", "business_name")
+USER_SEARCH_KEY_VERSION = 2
+USER_SEARCH_MAX_TERMS = 5
+USER_SEARCH_FUZZY_MIN_LENGTH = 4
+USER_SEARCH_COUNT_CAP = 1000
+USER_SEARCH_BACKFILL_BATCH_SIZE = 500
+USER_PUBLIC_PROJECTION = {"_id": 0, "password_hash": 0, "search_tokens": 0, "search_fuzzy": 0, "search_version": 0}
+# A search with no searchable words (only punctuation, say) must match nobody, not everybody
+USER_SEARCH_NO_MATCH = {"search_tokens": {"$in": []}}
+_user_search_backfill_lock = asyncio.Lock()
+
+def search_words(text: Optional[str]) -> List[str]:
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    return re.findall(r"[^\W_]+", "".join(char for char in decomposed if not unicodedata.combining(char)))
+
+def deletion_variants(word: str) -> Set[str]:
+    """The word plus every string one deleted character away from it"""
+    variants = {word}
+    if len(word) >= USER_SEARCH_FUZZY_MIN_LENGTH:
+        variants.update(word[:i] + word[i + 1:] for i in range(len(word)))
+    return variants
+
+def user_search_keys(user: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Search keys for a user document's name, email and business name"""
+    tokens = sorted({word for field in USER_SEARCH_FIELDS for word in search_words(user.get(field))})
+    fuzzy = sorted({variant for token in tokens for variant in deletion_variants(token)})
+    return {"search_tokens": tokens, "search_fuzzy": fuzzy, "search_version": USER_SEARCH_KEY_VERSION}
+
+async def refresh_user_search_keys(user_id: str):
+    """Recompute a user's search keys after their searchable fields changed"""
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, **{field: 1 for field in USER_SEARCH_FIELDS}})
+    if user:
+        await db.users.update_one({"user_id": user_id}, {"$set": user_search_keys(user)})
+
+def user_search_query(search: str, fuzzy: bool) -> Dict[str, Any]:
+    """Match every query word by prefix, or within one typo when fuzzy"""
+    terms = search_words(search)[:USER_SEARCH_MAX_TERMS]
+    if fuzzy:
+        clauses = [{"search_fuzzy": {"$in": sorted(deletion_variants(term))}} for term in terms]
+    else:
+        clauses = [{"search_tokens": {"$regex": f"^{re.escape(term)}"}} for term in terms]
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else USER_SEARCH_NO_MATCH
+
+async def run_user_search_backfill(job: Dict[str, Any], only_missing: bool):
+    """Compute search keys for existing users in batches"""
+    job_id = job["job_id"]
+    query = {"search_version": {"$ne": USER_SEARCH_KEY_VERSION}} if only_missing else {}
+    async with _user_search_backfill_lock:
+        try:
+            updated = 0
+            batch = []
+            cursor = db.users.find(query, {"_id": 0, "user_id": 1, **{field: 1 for field in USER_SEARCH_FIELDS}})
+            async for user in cursor:
+                batch.append(UpdateOne({"user_id": user["user_id"]}, {"$set": user_search_keys(user)}))
+                if len(batch) >= USER_SEARCH_BACKFILL_BATCH_SIZE:
+                    await db.users.bulk_write(batch, ordered=False)
+                    updated += len(batch)
+                    batch = []
+                    await update_job(job_id, progress={"updated": updated})
+            if batch:
+                await db.users.bulk_write(batch, ordered=False)
+                updated += len(batch)
+            await update_job(job_id, status="completed", progress={"updated": updated}, report={"updated": updated})
+        except Exception as e:
+            logger.error(f"User search backfill {job_id} failed: {e}")
+            await update_job(job_id, status="failed", error=str(e))
+
+async def ensure_user_search_keys():
+    """Backfill search keys for users created before they were maintained, or under an older version"""
+    if not await db.users.find_one({"search_version": {"$ne": USER_SEARCH_KEY_VERSION}}, {"_id": 1}):
+        return
+    job = await create_job("user_search_backfill", {"trigger": "startup", "only_missing": True})
+    task_supervisor.spawn("user_search_backfill", run_user_search_backfill(job, only_missing=True))
+
+# ==================== SUBSCRIPTION USER SNAPSHOTS ====================
+
+# Subscriptions carry the owner's user_name and user_email so the admin list reads one
+# collection. The snapshot is written at activation and rewritten whenever the user's
+# name or email changes; the backfill fills it in for subscriptions that predate it.
+SNAPSHOT_BACKFILL_BATCH_SIZE = 500
+_snapshot_backfill_lock = asyncio.Lock()
+
+async def sync_subscription_user_snapshot(user_id: str, name: Optional[str], email: Optional[str]):
+    """Rewrite the user snapshot on all of a user's subscriptions"""
+    await db.subscriptions.update_many(
+        {"user_id": user_id},
+        {"$set": {"user_name": name, "user_email": email}}
+    )
+
+async def run_subscription_snapshot_backfill(job: Dict[str, Any]):
+    """Copy user name and email onto subscriptions that have no snapshot yet"""
+    job_id = job["job_id"]
+    pipeline = [
+        {"$match": {"user_email": {"$exists": False}}},
+        {"$project": {"_id": 0, "subscription_id": 1, "user_id": 1}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user_info"
+        }},
+        {"$unwind": {"path": "$user_info", "preserveNullAndEmptyArrays": True}}
+    ]
+    async with _snapshot_backfill_lock:
+        try:
+            updated = 0
+            batch = []
+            async for row in db.subscriptions.aggregate(pipeline, batchSize=SNAPSHOT_BACKFILL_BATCH_SIZE):
+                user = row.get("user_info") or {}
+                batch.append(UpdateOne(
+                    {"subscription_id": row["subscription_id"]},
+                    {"$set": {"user_name": user.get("name"), "user_email": user.get("email")}}
+                ))
+                if len(batch) >= SNAPSHOT_BACKFILL_BATCH_SIZE:
+                    await db.subscriptions.bulk_write(batch, ordered=False)
+                    updated += len(batch)
+                    batch = []
+                    await update_job(job_id, progress={"updated": updated})
+            if batch:
+                await db.subscriptions.bulk_write(batch, ordered=False)
+                updated += len(batch)
+            await update_job(job_id, status="completed", progress={"updated": updated}, report={"updated": updated})
+        except Exception as e:
+            logger.error(f"Subscription snapshot backfill {job_id} failed: {e}")
+            await update_job(job_id, status="failed", error=str(e))
+
+async def ensure_subscription_snapshots():
+    """Backfill user snapshots for subscriptions created before they were maintained"""
+    if not await db.subscriptions.find_one({"user_email": {"$exists": False}}, {"_id": 1}):
+        return
+    job = await create_job("subscription_snapshot_backfill", {"trigger": "startup"})
+    task_supervisor.spawn("subscription_snapshot_backfill", run_subscription_snapshot_backfill(job))
+
+async def ensure_updated_at():
+    """Backfill updated_at on users and subscriptions written before it was maintained"""
+    for collection in ("users", "subscriptions"):
+        result = await db[collection].update_many(
+            {"updated_at": {"$exists": False}}, [{"$set": {"updated_at": "$created_at"}}]
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled updated_at on {result.modified_count} {collection}")
+
+# ==================== USER DELETION ====================
+
+# Collections holding a user's data by user_id; contacts are matched by the user's email.
+# Deleting a user removes all of it, keeping the business metrics and revenue rollups in
+# step with what remains.
+USER_OWNED_COLLECTIONS = (
+    "user_sessions", "subscriptions", "ai_chats", "payment_transactions", "push_tokens", "precomputed_insights"
+)
+USER_DELETE_BATCH_SIZE = 500
+USER_DELETE_JOB_MAX_IDS = 100000
+
+# Contact emails are stored as typed, so a user's contacts are matched ignoring case under
+# this collation, which the contacts email index is built with
+EMAIL_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+async def cascade_delete_users(user_ids: List[str]) -> Dict[str, Any]:
+    """Delete users and everything they own, with the per-collection deletes issued concurrently"""
+    users = await db.users.find(
+        {"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "email": 1}
+    ).to_list(len(user_ids))
+    found = [user["user_id"] for user in users]
+    if not found:
+        return {"user_ids": [], "deleted": {}}
+    emails = list({user["email"].strip().lower() for user in users if user.get("email")})
+    
+    active_subs, completed_txns, contacts = await asyncio.gather(
+        db.subscriptions.find(
+            {"user_id": {"$in": found}, "status": "active"}, SUBSCRIPTION_METRIC_PROJECTION
+        ).to_list(None),
+        db.payment_transactions.find(
+            {"user_id": {"$in": found}, "status": "completed"}, {"_id": 0, "amount": 1, "plan_type": 1, "created_at": 1}
+        ).to_list(None),
+        db.contacts.find({"email": {"$in": emails}}, {"_id": 0, "status": 1}, collation=EMAIL_COLLATION).to_list(None)
+    )
+    
+    collections = ("users", *USER_OWNED_COLLECTIONS, "contacts")
+    results = await asyncio.gather(
+        db.users.delete_many({"user_id": {"$in": found}}),
+        *(db[collection].delete_many({"user_id": {"$in": found}}) for collection in USER_OWNED_COLLECTIONS),
+        db.contacts.delete_many({"email": {"$in": emails}}, collation=EMAIL_COLLATION)
+    )
+    deleted = {collection: result.deleted_count for collection, result in zip(collections, results)}
+    
+    deltas = merge_metric_deltas(
+        subscription_metric_deltas(active_subs, -1),
+        *(contact_metric_deltas(contact.get("status"), None) for contact in contacts)
+    )
+    deltas["total_users"] -= deleted["users"]
+    deltas["total_revenue"] -= sum(txn.get("amount", 0) for txn in completed_txns)
+    await asyncio.gather(
+        bump_metrics(deltas),
+        retract_revenue(completed_txns),
+        record_mrr_movements({"churn": sum(subscription_mrr(sub) for sub in active_subs)})
+    )
+    
+    return {"user_ids": found, "deleted": deleted}
+
+async def run_user_delete_job(job: Dict[str, Any], user_ids: List[str]):
+    """Cascade-delete many users in batches, recording progress on the job"""
+    job_id = job["job_id"]
+    started = time.monotonic()
+    try:
+        totals: Dict[str, int] = defaultdict(int)
+        processed = 0
+        for start in range(0, len(user_ids), USER_DELETE_BATCH_SIZE):
+            batch = user_ids[start:start + USER_DELETE_BATCH_SIZE]
+            result = await cascade_delete_users(batch)
+            for collection, count in result["deleted"].items():
+                totals[collection] += count
+            processed += len(batch)
+            await update_job(job_id, progress={"processed": processed, "total": len(user_ids), "deleted_users": totals["users"]})
+        report = {"deleted": dict(totals), "elapsed_seconds": round(time.monotonic() - started, 2)}
+        await update_job(job_id, status="completed", report=report)
+    except Exception as e:
+        logger.error(f"User delete job {job_id} failed: {e}")
+        await update_job(job_id, status="failed", error=str(e))
+
 # ==================== ADMIN ROUTES ====================
 
 # Admin credentials - loaded from environment variables
@@ -1257,95 +2885,176 @@ async def get_admin_me(admin: AdminUser = Depends(get_current_admin)):
     """Get current admin info"""
     return admin
 
-@api_router.get("/admin/dashboard/stats")
-async def get_admin_stats(admin: AdminUser = Depends(get_current_admin)):
-    """Get dashboard statistics"""
-    # Count users
-    total_users = await db.users.count_documents({})
-    active_subscriptions = await db.subscriptions.count_documents({"status": "active"})
-    new_contacts = await db.contacts.count_documents({"status": "new"})
-    total_contacts = await db.contacts.count_documents({})
-    
-    # Calculate revenue
-    pipeline = [
-        {"$match": {"status": "completed"}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    revenue_result = await db.payment_transactions.aggregate(pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total"] if revenue_result else 0
-    
-    # Monthly revenue
-    thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+ADMIN_STATS_TTL_SECONDS = float(os.environ.get('ADMIN_STATS_TTL_SECONDS', '15'))
+admin_stats_cache = SnapshotCache(ADMIN_STATS_TTL_SECONDS)
+
+async def compute_admin_stats() -> Dict[str, Any]:
+    """Dashboard statistics from the maintained counters and the 30-day revenue rollups"""
+    thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).date().isoformat()
     monthly_pipeline = [
-        {"$match": {"status": "completed", "created_at": {"$gte": thirty_days_ago}}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        {"$match": {"date": {"$gte": thirty_days_ago}}},
+        {"$group": {"_id": None, "total": {"$sum": "$revenue"}}}
     ]
-    monthly_result = await db.payment_transactions.aggregate(monthly_pipeline).to_list(1)
-    monthly_revenue = monthly_result[0]["total"] if monthly_result else 0
     
-    # Subscription breakdown
-    sub_pipeline = [
-        {"$match": {"status": "active"}},
-        {"$group": {"_id": "$plan_type", "count": {"$sum": 1}}}
-    ]
-    sub_breakdown = await db.subscriptions.aggregate(sub_pipeline).to_list(10)
-    subscription_by_type = {item["_id"]: item["count"] for item in sub_breakdown}
+    results = await fan_out({
+        "metrics": get_business_metrics,
+        "monthly_revenue": lambda: db.revenue_daily.aggregate(monthly_pipeline).to_list(1),
+        "mrr_movements": lambda: db.mrr_movements.find_one({"_id": datetime.now(timezone.utc).strftime("%Y-%m")})
+    })
+    metrics, monthly_result = results["metrics"], results["monthly_revenue"]
+    movements = results["mrr_movements"] or {}
     
     return {
-        "total_users": total_users,
-        "active_subscriptions": active_subscriptions,
-        "new_contacts": new_contacts,
-        "total_contacts": total_contacts,
-        "total_revenue": total_revenue,
-        "monthly_revenue": monthly_revenue,
-        "subscription_by_type": subscription_by_type
+        "total_users": metrics.get("total_users", 0),
+        "active_subscriptions": metrics.get("active_subscriptions", 0),
+        "new_contacts": metrics.get("new_contacts", 0),
+        "total_contacts": metrics.get("total_contacts", 0),
+        "total_revenue": metrics.get("total_revenue", 0),
+        "monthly_revenue": monthly_result[0]["total"] if monthly_result else 0,
+        "mrr": round(metrics.get("mrr", 0), 2),
+        # Approximate running totals for this month; see the MRR section
+        "mrr_movements": {field: round(movements.get(field, 0), 2) for field in MRR_MOVEMENTS},
+        "subscription_by_type": metrics["subscription_by_type"],
+        "generated_at": datetime.now(timezone.utc).isoformat()
     }
 
+@api_router.get("/admin/dashboard/stats")
+async def get_admin_stats(admin: AdminUser = Depends(get_current_admin)):
+    """Get dashboard statistics from a short-lived shared snapshot"""
+    return await admin_stats_cache.get("dashboard", compute_admin_stats)
+
+# List endpoints answer JSON pages capped at ADMIN_LIST_MAX_LIMIT, or stream NDJSON
+# straight from the cursor with ?format=ndjson so memory stays flat for any export size
+ADMIN_LIST_MAX_LIMIT = 200
+NDJSON_BATCH_SIZE = 500
+
+def check_list_format(response_format: str) -> bool:
+    """Validate the format parameter, returning True for NDJSON streaming"""
+    if response_format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    return response_format == "ndjson"
+
+async def stream_ndjson(cursor):
+    """Yield cursor documents as NDJSON chunks of up to NDJSON_BATCH_SIZE lines"""
+    lines = []
+    async for doc in cursor:
+        lines.append(json.dumps(doc, default=str))
+        if len(lines) >= NDJSON_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def ndjson_response(cursor) -> StreamingResponse:
+    return StreamingResponse(stream_ndjson(cursor), media_type="application/x-ndjson")
+
+def find_cursor(collection: str, query: Dict[str, Any], projection: Dict[str, Any], skip: int, limit: int, sort=None):
+    """Build a batched find cursor; limit <= 0 means no limit (NDJSON only)"""
+    cursor = db[collection].find(query, projection).batch_size(NDJSON_BATCH_SIZE)
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
+    if limit > 0:
+        cursor = cursor.limit(limit)
+    return cursor
+
+# Lists page newest first by (created_at, id) using opaque keyset cursors, so a deep
+# page is one index seek rather than a skip over everything before it. Totals come from
+# the collection metadata when unfiltered and from a briefly cached count otherwise.
+ADMIN_COUNT_TTL_SECONDS = float(os.environ.get('ADMIN_COUNT_TTL_SECONDS', '30'))
+admin_count_cache = SnapshotCache(ADMIN_COUNT_TTL_SECONDS)
+
+def list_sort(id_field: str) -> List[Tuple[str, int]]:
+    return [("created_at", -1), (id_field, -1)]
+
+def encode_list_cursor(doc: Dict[str, Any], id_field: str) -> str:
+    raw = json.dumps([doc.get("created_at"), doc.get(id_field)], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str], id_field: str) -> Dict[str, Any]:
+    """Restrict query to documents after the cursor in list_sort order"""
+    if not cursor:
+        return query
+    try:
+        created_at, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Both go into the filter verbatim, so anything but the stored string types (an operator
+    # document like {"$ne": null}, say) would change what the query matches
+    if not isinstance(created_at, str) or not isinstance(last_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, id_field: {"$lt": last_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+def next_list_cursor(docs: List[Dict[str, Any]], limit: int, id_field: str) -> Optional[str]:
+    return encode_list_cursor(docs[-1], id_field) if docs and len(docs) == limit else None
+
+async def list_total(collection: str, query: Dict[str, Any], cap: Optional[int] = None) -> int:
+    """Estimated total for an unfiltered list, otherwise a cached (optionally capped) count"""
+    if not query:
+        return await db[collection].estimated_document_count()
+    options = {"limit": cap + 1} if cap else {}
+    key = f"{collection}:{json.dumps(query, sort_keys=True, default=str)}"
+    return await admin_count_cache.get(key, lambda: db[collection].count_documents(query, **options))
+
 @api_router.get("/admin/users")
 async def get_all_users(
     skip: int = 0, 
     limit: int = 50,
     search: Optional[str] = None,
+    fuzzy: bool = True,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    response_format: str = Query("json", alias="format"),
     admin: AdminUser = Depends(get_current_admin)
 ):
-    """Get all users with pagination and search"""
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"email": {"$regex": search, "$options": "i"}},
-                {"name": {"$regex": search, "$options": "i"}},
-                {"business_name": {"$regex": search, "$options": "i"}}
-            ]
-        }
+    """Get all users with pagination and prefix search, falling back to typo-tolerant matches"""
+    stream = check_list_format(response_format)
+    query = user_search_query(search, fuzzy=False) if search else {}
+    match = "prefix" if query else None
+    if query and fuzzy and not await db.users.find_one(query, {"_id": 1}):
+        query = user_search_query(search, fuzzy=True)
+        match = "fuzzy"
     
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents(query)
+    page_query = keyset_query(query, cursor, "user_id")
+    if stream:
+        return ndjson_response(find_cursor("users", page_query, USER_PUBLIC_PROJECTION, skip, limit, sort=list_sort("user_id")))
     
-    return {"users": users, "total": total, "skip": skip, "limit": limit}
+    limit = max(1, min(limit, ADMIN_LIST_MAX_LIMIT))
+    queries = {"users": lambda: find_cursor("users", page_query, USER_PUBLIC_PROJECTION, skip, limit, sort=list_sort("user_id")).to_list(limit)}
+    if with_total:
+        # Search totals stop counting at the cap so broad terms stay cheap
+        queries["total"] = lambda: list_total("users", query, cap=USER_SEARCH_COUNT_CAP if query else None)
+    results = await fan_out(queries)
+    users, total, total_capped = results["users"], results.get("total"), False
+    if query and total is not None:
+        total_capped = total > USER_SEARCH_COUNT_CAP
+        total = min(total, USER_SEARCH_COUNT_CAP)
+    
+    return {
+        "users": users, "total": total, "total_capped": total_capped, "match": match,
+        "skip": skip, "limit": limit, "next_cursor": next_list_cursor(users, limit, "user_id")
+    }
 
 @api_router.get("/admin/users/{user_id}")
 async def get_user_detail(user_id: str, admin: AdminUser = Depends(get_current_admin)):
     """Get user details including subscription"""
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
-    if not user:
+    results = await fan_out({
+        "user": lambda: db.users.find_one({"user_id": user_id}, USER_PUBLIC_PROJECTION),
+        "subscription": lambda: db.subscriptions.find_one({"user_id": user_id, "status": "active"}, {"_id": 0}),
+        "transactions": lambda: db.payment_transactions.find(
+            {"user_id": user_id},
+            {"_id": 0}
+        ).sort("created_at", -1).limit(10).to_list(10)
+    })
+    if not results["user"]:
         raise HTTPException(status_code=404, detail="User not found")
     
-    subscription = await db.subscriptions.find_one(
-        {"user_id": user_id, "status": "active"}, 
-        {"_id": 0}
-    )
-    
-    transactions = await db.payment_transactions.find(
-        {"user_id": user_id}, 
-        {"_id": 0}
-    ).sort("created_at", -1).limit(10).to_list(10)
-    
-    return {
-        "user": user,
-        "subscription": subscription,
-        "transactions": transactions
-    }
+    return results
 
 @api_router.put("/admin/users/{user_id}")
 async def update_user(user_id: str, update: UserUpdate, admin: AdminUser = Depends(get_current_admin)):
@@ -1354,173 +3063,1404 @@ async def update_user(user_id: str, update: UserUpdate, admin: AdminUser = Depen
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.users.update_one({"user_id": user_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    user = await db.users.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {**update_data, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "name": 1, "email": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    if update_data.keys() & set(USER_SEARCH_FIELDS):
+        await refresh_user_search_keys(user_id)
+    if "name" in update_data:
+        await sync_subscription_user_snapshot(user_id, user.get("name"), user.get("email"))
     
     return {"message": "User updated successfully"}
 
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, admin: AdminUser = Depends(get_current_admin)):
-    """Delete a user"""
-    result = await db.users.delete_one({"user_id": user_id})
-    if result.deleted_count == 0:
+    """Delete a user and all of their data"""
+    result = await cascade_delete_users([user_id])
+    if not result["user_ids"]:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Also delete related data
-    await db.subscriptions.delete_many({"user_id": user_id})
-    await db.user_sessions.delete_many({"user_id": user_id})
-    await db.ai_chats.delete_many({"user_id": user_id})
+    return {"message": "User deleted successfully", "deleted": result["deleted"]}
+
+BULK_MAX_IDS = 1000
+# Documents changed by another writer between the read and a bulk write are re-read and
+# retried this many times in total
+BULK_WRITE_PASSES = 3
+
+def unique_bulk_ids(ids: List[str]) -> List[str]:
+    """De-duplicate ids preserving order and enforce the bulk size cap"""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids provided")
+    if len(ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} ids per request")
+    return ids
+
+async def find_existing(collection: str, field: str, ids: List[str], fields: Tuple[str, ...] = ()) -> Dict[str, Dict[str, Any]]:
+    """Map each id that exists to its document (projected to fields)"""
+    projection = {"_id": 0, field: 1, **{name: 1 for name in fields}}
+    docs = await db[collection].find({field: {"$in": ids}}, projection).to_list(len(ids))
+    return {doc[field]: doc for doc in docs}
+
+async def write_by_observed_state(
+    collection: str,
+    field: str,
+    existing: Dict[str, Dict[str, Any]],
+    state_fields: Tuple[str, ...],
+    write: Callable[[Dict[str, Any]], Awaitable[int]],
+    target: Optional[Dict[str, Any]]
+) -> List[Tuple[Dict[str, Any], int]]:
+    """Write documents grouped by their state_fields, each write filtered on that state.
+
+    write(query) returns how many documents it matched, so every (state, matched) pair says
+    exactly how many documents left that state and counter deltas never come from a stale
+    read. Documents that changed in between are re-read and, unless they are already in
+    the target state the write leaves them in (None for deletes), written again.
+    """
+    applied = []
+    pending = existing
+    for _ in range(BULK_WRITE_PASSES):
+        groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+        for item_id, doc in pending.items():
+            state = {name: doc.get(name) for name in state_fields}
+            key = json.dumps(state, sort_keys=True, default=str)
+            groups.setdefault(key, (state, []))[1].append(item_id)
+        matched = await asyncio.gather(*(
+            write({field: {"$in": group_ids}, **state}) for state, group_ids in groups.values()
+        ))
+        retry = []
+        for (state, group_ids), count in zip(groups.values(), matched):
+            applied.append((state, count))
+            if count < len(group_ids):
+                retry.extend(group_ids)
+        if not retry:
+            break
+        pending = {
+            item_id: doc for item_id, doc in (await find_existing(collection, field, retry, state_fields)).items()
+            if target is None or any(doc.get(name) != value for name, value in target.items())
+        }
+        if not pending:
+            break
+    return applied
+
+def scale_deltas(deltas: Dict[str, float], count: int) -> Dict[str, float]:
+    return {field: value * count for field, value in deltas.items()}
+
+def bulk_results(ids: List[str], existing, outcome: str) -> List[Dict[str, str]]:
+    return [{"id": item_id, "result": outcome if item_id in existing else "not_found"} for item_id in ids]
+
+@api_router.post("/admin/users/bulk")
+async def bulk_user_action(bulk: BulkUserAction, admin: AdminUser = Depends(get_current_admin)):
+    """Apply an action to many users in one request"""
+    if bulk.action != "delete":
+        raise HTTPException(status_code=400, detail="Invalid action")
+    user_ids = unique_bulk_ids(bulk.user_ids)
+    result = await cascade_delete_users(user_ids)
+    existing = set(result["user_ids"])
     
-    return {"message": "User deleted successfully"}
+    return {"results": bulk_results(user_ids, existing, "deleted"), "matched": len(existing), "deleted": result["deleted"]}
+
+@api_router.post("/admin/jobs/user-delete")
+async def start_user_delete_job(request: UserDeleteJobRequest, admin: AdminUser = Depends(get_current_admin)):
+    """Cascade-delete up to USER_DELETE_JOB_MAX_IDS users in the background"""
+    user_ids = list(dict.fromkeys(request.user_ids))
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="No ids provided")
+    if len(user_ids) > USER_DELETE_JOB_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {USER_DELETE_JOB_MAX_IDS} ids per job")
+    
+    job = await create_job("user_delete", {"count": len(user_ids)})
+    if not task_supervisor.spawn("user_delete", run_user_delete_job(job, user_ids)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
 
 @api_router.get("/admin/subscriptions")
 async def get_all_subscriptions(
     skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    response_format: str = Query("json", alias="format"),
     admin: AdminUser = Depends(get_current_admin)
 ):
-    """Get all subscriptions with user info using aggregation (optimized)"""
+    """Get all subscriptions with the owner's name and email from the denormalized snapshot"""
+    stream = check_list_format(response_format)
+    if not stream:
+        limit = max(1, min(limit, ADMIN_LIST_MAX_LIMIT))
     match_stage = {}
     if status:
         match_stage["status"] = status
     
+    page_stages = [{"$sort": dict(list_sort("subscription_id"))}]
+    if skip:
+        page_stages.append({"$skip": skip})
+    if limit > 0:
+        page_stages.append({"$limit": limit})
     pipeline = [
-        {"$match": match_stage},
-        {"$skip": skip},
-        {"$limit": limit},
-        {"$lookup": {
-            "from": "users",
-            "localField": "user_id",
-            "foreignField": "user_id",
-            "as": "user_info"
-        }},
-        {"$unwind": {"path": "$user_info", "preserveNullAndEmptyArrays": True}},
+        {"$match": keyset_query(match_stage, cursor, "subscription_id")},
+        *page_stages,
+        {"$project": {"_id": 0}},
         {"$addFields": {
-            "user_name": {"$ifNull": ["$user_info.name", "Unknown"]},
-            "user_email": {"$ifNull": ["$user_info.email", "Unknown"]}
-        }},
-        {"$project": {"user_info": 0, "_id": 0}}
+            "user_name": {"$ifNull": ["$user_name", "Unknown"]},
+            "user_email": {"$ifNull": ["$user_email", "Unknown"]}
+        }}
     ]
     
-    subscriptions = await db.subscriptions.aggregate(pipeline).to_list(limit)
-    total = await db.subscriptions.count_documents(match_stage)
+    if stream:
+        return ndjson_response(db.subscriptions.aggregate(pipeline, batchSize=NDJSON_BATCH_SIZE))
     
-    return {"subscriptions": subscriptions, "total": total}
+    queries = {"subscriptions": lambda: db.subscriptions.aggregate(pipeline).to_list(limit)}
+    if with_total:
+        queries["total"] = lambda: list_total("subscriptions", match_stage)
+    results = await fan_out(queries)
+    subscriptions, total = results["subscriptions"], results.get("total")
+    
+    return {
+        "subscriptions": subscriptions, "total": total,
+        "next_cursor": next_list_cursor(subscriptions, limit, "subscription_id")
+    }
 
 @api_router.put("/admin/subscriptions/{subscription_id}")
 async def update_subscription(subscription_id: str, status: str, admin: AdminUser = Depends(get_current_admin)):
     """Update subscription status"""
-    result = await db.subscriptions.update_one(
+    before = await db.subscriptions.find_one_and_update(
         {"subscription_id": subscription_id},
-        {"$set": {"status": status}}
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection=SUBSCRIPTION_METRIC_PROJECTION
     )
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
+    await asyncio.gather(
+        bump_metrics(subscription_status_deltas(before, status)),
+        record_mrr_movements(subscription_status_movements(before, status))
+    )
     
     return {"message": "Subscription updated"}
 
+@api_router.post("/admin/subscriptions/bulk")
+async def bulk_update_subscriptions(bulk: BulkSubscriptionUpdate, admin: AdminUser = Depends(get_current_admin)):
+    """Update the status of many subscriptions in one request"""
+    subscription_ids = unique_bulk_ids(bulk.subscription_ids)
+    existing = await find_existing(
+        "subscriptions", "subscription_id", subscription_ids, ("status", "plan_type", "plan_tier", "add_ons", "amount")
+    )
+    
+    if existing:
+        async def write(query: Dict[str, Any]) -> int:
+            result = await db.subscriptions.update_many(
+                query, {"$set": {"status": bulk.status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+            )
+            return result.matched_count
+        
+        applied = await write_by_observed_state(
+            "subscriptions", "subscription_id", existing,
+            ("status", "plan_type", "plan_tier", "add_ons", "amount"), write, {"status": bulk.status}
+        )
+        await asyncio.gather(
+            bump_metrics(merge_metric_deltas(
+                *(scale_deltas(subscription_status_deltas(state, bulk.status), count) for state, count in applied)
+            )),
+            record_mrr_movements(merge_metric_deltas(
+                *(scale_deltas(subscription_status_movements(state, bulk.status), count) for state, count in applied)
+            ))
+        )
+    
+    return {"results": bulk_results(subscription_ids, existing, "updated"), "matched": len(existing)}
+
 @api_router.get("/admin/contacts")
 async def get_all_contacts(
     skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    response_format: str = Query("json", alias="format"),
     admin: AdminUser = Depends(get_current_admin)
 ):
     """Get all contact inquiries"""
+    stream = check_list_format(response_format)
     query = {}
     if status:
         query["status"] = status
     
-    contacts = await db.contacts.find(query, {"_id": 0}).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
-    total = await db.contacts.count_documents(query)
+    page_query = keyset_query(query, cursor, "contact_id")
+    if stream:
+        return ndjson_response(find_cursor("contacts", page_query, {"_id": 0}, skip, limit, sort=list_sort("contact_id")))
     
-    return {"contacts": contacts, "total": total}
+    limit = max(1, min(limit, ADMIN_LIST_MAX_LIMIT))
+    queries = {"contacts": lambda: find_cursor("contacts", page_query, {"_id": 0}, skip, limit, sort=list_sort("contact_id")).to_list(limit)}
+    if with_total:
+        queries["total"] = lambda: list_total("contacts", query)
+    results = await fan_out(queries)
+    contacts, total = results["contacts"], results.get("total")
+    
+    return {"contacts": contacts, "total": total, "next_cursor": next_list_cursor(contacts, limit, "contact_id")}
 
 @api_router.put("/admin/contacts/{contact_id}")
 async def update_contact(contact_id: str, update: ContactUpdate, admin: AdminUser = Depends(get_current_admin)):
     """Update contact status"""
-    result = await db.contacts.update_one(
+    before = await db.contacts.find_one_and_update(
         {"contact_id": contact_id},
-        {"$set": {"status": update.status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": update.status, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "status": 1}
     )
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    await bump_metrics(contact_metric_deltas(before.get("status"), update.status))
     
     return {"message": "Contact updated"}
 
 @api_router.delete("/admin/contacts/{contact_id}")
 async def delete_contact(contact_id: str, admin: AdminUser = Depends(get_current_admin)):
     """Delete a contact inquiry"""
-    result = await db.contacts.delete_one({"contact_id": contact_id})
-    if result.deleted_count == 0:
+    before = await db.contacts.find_one_and_delete({"contact_id": contact_id}, projection={"_id": 0, "status": 1})
+    if before is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    await bump_metrics(contact_metric_deltas(before.get("status"), None))
     
     return {"message": "Contact deleted"}
 
+@api_router.post("/admin/contacts/bulk")
+async def bulk_contact_action(bulk: BulkContactAction, admin: AdminUser = Depends(get_current_admin)):
+    """Update the status of, or delete, many contact inquiries in one request"""
+    contact_ids = unique_bulk_ids(bulk.contact_ids)
+    if bulk.action not in ("update", "delete"):
+        raise HTTPException(status_code=400, detail="Invalid action")
+    if bulk.action == "update" and not bulk.status:
+        raise HTTPException(status_code=400, detail="status required for update")
+    
+    existing = await find_existing("contacts", "contact_id", contact_ids, ("status",))
+    if existing:
+        new_status = bulk.status if bulk.action == "update" else None
+        now = datetime.now(timezone.utc).isoformat()
+        
+        async def write(query: Dict[str, Any]) -> int:
+            if bulk.action == "update":
+                result = await db.contacts.update_many(query, {"$set": {"status": bulk.status, "updated_at": now}})
+                return result.matched_count
+            result = await db.contacts.delete_many(query)
+            return result.deleted_count
+        
+        applied = await write_by_observed_state(
+            "contacts", "contact_id", existing, ("status",), write,
+            {"status": bulk.status} if bulk.action == "update" else None
+        )
+        await bump_metrics(merge_metric_deltas(
+            *(scale_deltas(contact_metric_deltas(state["status"], new_status), count) for state, count in applied)
+        ))
+    
+    outcome = "updated" if bulk.action == "update" else "deleted"
+    return {"results": bulk_results(contact_ids, existing, outcome), "matched": len(existing)}
+
 @api_router.get("/admin/transactions")
 async def get_all_transactions(
     skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    response_format: str = Query("json", alias="format"),
     admin: AdminUser = Depends(get_current_admin)
 ):
     """Get all payment transactions"""
+    stream = check_list_format(response_format)
     query = {}
     if status:
         query["status"] = status
     
-    transactions = await db.payment_transactions.find(query, {"_id": 0}).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
-    total = await db.payment_transactions.count_documents(query)
+    page_query = keyset_query(query, cursor, "transaction_id")
+    if stream:
+        return ndjson_response(find_cursor("payment_transactions", page_query, {"_id": 0}, skip, limit, sort=list_sort("transaction_id")))
     
-    return {"transactions": transactions, "total": total}
+    limit = max(1, min(limit, ADMIN_LIST_MAX_LIMIT))
+    queries = {"transactions": lambda: find_cursor("payment_transactions", page_query, {"_id": 0}, skip, limit, sort=list_sort("transaction_id")).to_list(limit)}
+    if with_total:
+        queries["total"] = lambda: list_total("payment_transactions", query)
+    results = await fan_out(queries)
+    transactions, total = results["transactions"], results.get("total")
+    
+    return {"transactions": transactions, "total": total, "next_cursor": next_list_cursor(transactions, limit, "transaction_id")}
 
 @api_router.get("/admin/revenue/chart")
-async def get_revenue_chart(days: int = 30, admin: AdminUser = Depends(get_current_admin)):
-    """Get revenue data for chart"""
-    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+async def get_revenue_chart(
+    days: int = 30,
+    granularity: str = "day",
+    by_plan: bool = False,
+    admin: AdminUser = Depends(get_current_admin)
+):
+    """Get revenue data for chart from the daily rollups, one point per day, week or month"""
+    if granularity not in REVENUE_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(REVENUE_GRANULARITIES)}")
+    days = max(1, min(days, REVENUE_CHART_MAX_DAYS))
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days - 1)
     
-    pipeline = [
-        {"$match": {"status": "completed", "created_at": {"$gte": start_date}}},
-        {"$addFields": {"date": {"$substr": ["$created_at", 0, 10]}}},
-        {"$group": {"_id": "$date", "revenue": {"$sum": "$amount"}, "count": {"$sum": 1}}},
-        {"$sort": {"_id": 1}}
+    data = await revenue_series(start, end, granularity, by_plan)
+    
+    return {"data": data, "period_days": days, "granularity": granularity}
+
+@api_router.post("/admin/jobs/user-search-backfill")
+async def start_user_search_backfill(only_missing: bool = False, admin: AdminUser = Depends(get_current_admin)):
+    """Recompute the search keys of every user, or only of users without them"""
+    if _user_search_backfill_lock.locked():
+        raise HTTPException(status_code=409, detail="A user search backfill is already running")
+    
+    job = await create_job("user_search_backfill", {"trigger": "admin", "only_missing": only_missing})
+    if not task_supervisor.spawn("user_search_backfill", run_user_search_backfill(job, only_missing)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+@api_router.post("/admin/jobs/subscription-snapshot-backfill")
+async def start_subscription_snapshot_backfill(admin: AdminUser = Depends(get_current_admin)):
+    """Copy user name and email onto subscriptions missing the snapshot"""
+    if _snapshot_backfill_lock.locked():
+        raise HTTPException(status_code=409, detail="A subscription snapshot backfill is already running")
+    
+    job = await create_job("subscription_snapshot_backfill", {"trigger": "admin"})
+    if not task_supervisor.spawn("subscription_snapshot_backfill", run_subscription_snapshot_backfill(job)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+@api_router.post("/admin/jobs/revenue-backfill")
+async def start_revenue_backfill(admin: AdminUser = Depends(get_current_admin)):
+    """Rebuild the daily revenue rollups from completed transactions"""
+    if _revenue_backfill_lock.locked():
+        raise HTTPException(status_code=409, detail="A revenue backfill is already running")
+    
+    job = await create_job("revenue_backfill", {"trigger": "admin"})
+    if not task_supervisor.spawn("revenue_backfill", run_revenue_backfill(job)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+@api_router.get("/admin/ai-chats/search")
+async def admin_search_chats(
+    q: str,
+    user_id: Optional[str] = None,
+    limit: int = 20,
+    admin: AdminUser = Depends(get_current_admin)
+):
+    """Search AI chat history across all users, optionally scoped to one user"""
+    results = await search_chats(q, user_id=user_id, limit=limit)
+    return {"results": results, "query": q}
+
+@api_router.get("/admin/jobs")
+async def get_jobs(kind: Optional[str] = None, limit: int = 20, admin: AdminUser = Depends(get_current_admin)):
+    """List recent background jobs"""
+    query = {"kind": kind} if kind else {}
+    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    return {"jobs": jobs}
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str, admin: AdminUser = Depends(get_current_admin)):
+    """Get a background job with its progress and report"""
+    job = await db.jobs.find_one({"job_id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/admin/email-outbox/stats")
+async def get_email_outbox_stats(admin: AdminUser = Depends(get_current_admin)):
+    """Get email outbox counts by delivery status"""
+    pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    results = await db.email_outbox.aggregate(pipeline).to_list(10)
+    return {
+        "by_status": {item["_id"]: item["count"] for item in results},
+        "digest": {
+            **notification_digest.stats,
+            "pending": await db.notification_digest.count_documents({}),
+            "window_seconds": NOTIFY_DIGEST_WINDOW_SECONDS,
+            "threshold": NOTIFY_DIGEST_THRESHOLD
+        }
+    }
+
+@api_router.get("/admin/contact/metrics")
+async def get_contact_metrics(admin: AdminUser = Depends(get_current_admin)):
+    """Get contact form acceptance and rejection counters"""
+    return {
+        **contact_metrics,
+        "tracked_ips": len(contact_ip_limiter.hits),
+        "tracked_emails": len(contact_email_limiter.hits),
+        "tracked_fingerprints": len(contact_duplicates.seen)
+    }
+
+@api_router.get("/admin/tasks")
+async def get_background_tasks(admin: AdminUser = Depends(get_current_admin)):
+    """Get background task supervisor counters"""
+    return task_supervisor.stats()
+
+@api_router.post("/admin/jobs/insights-batch")
+async def trigger_insights_batch(resume: bool = True, admin: AdminUser = Depends(get_current_admin)):
+    """Start (or resume) the precomputed insights batch in the background"""
+    job = await claim_insights_job(resume)
+    if not job:
+        raise HTTPException(status_code=409, detail="Insights batch already running")
+    if not task_supervisor.spawn("insights_batch", run_insights_batch(job)):
+        await update_leased_job(job["job_id"], job["lease_owner"], status="interrupted", lease_owner=None, lease_expires_at=None)
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return {"message": "Insights batch started", "job_id": job["job_id"]}
+
+# ==================== MONGO COMMAND MONITORING ====================
+
+# command_monitor (attached to the client at the top of this file) reports every collection
+# command here from Motor's executor threads. Latency by collection and command, and time
+# spent per originating route, go to /api/metrics; query shapes would be unbounded as labels,
+# so per-shape statistics and the slow-command log (each slow shape explained once per
+# MONGO_EXPLAIN_TTL_SECONDS) are served at /api/admin/db/queries instead.
+# mongodb_commands_total's outcome label is "ok" or "error", from pymongo's succeeded and
+# failed events, so failing commands can be rated by route without a separate family.
+MONGO_EXPLAIN_TTL_SECONDS = int(os.environ.get('MONGO_EXPLAIN_TTL_SECONDS', '600'))
+MONGO_QUERY_SORTS = ("total_ms", "avg_ms", "max_ms", "count", "slow", "failures")
+MONGO_QUERY_MAX_LIMIT = 500
+
+mongo_command_latency = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and command",
+    ("collection", "command"), LATENCY_BUCKETS
+)
+mongo_commands = Counter(
+    "mongodb_commands_total", "MongoDB commands by originating route, collection, command and outcome",
+    ("route", "collection", "command", "outcome")
+)
+mongo_command_seconds = Counter(
+    "mongodb_command_seconds_total", "Time spent in MongoDB commands by originating route",
+    ("route", "collection", "command")
+)
+mongo_slow_commands = Counter(
+    "mongodb_slow_commands_total", "MongoDB commands slower than SLOW_QUERY_LOG_MS", ("collection", "command")
+)
+
+def current_route() -> Optional[str]:
+    """Route template of the request being handled, or None outside a request"""
+    scope = request_scope.get()
+    return route_template(scope) if scope is not None else None
+
+def record_mongo_command(collection: str, command: str, route: str, seconds: float, succeeded: bool):
+    """on_command callback: metric updates only, as it runs with the monitor lock held"""
+    mongo_command_latency.observe((collection, command), seconds)
+    mongo_commands.inc((route, collection, command, "ok" if succeeded else "error"))
+    mongo_command_seconds.inc((route, collection, command), seconds)
+    if seconds * 1000 >= command_monitor.slow_ms:
+        mongo_slow_commands.inc((collection, command))
+
+async def explain_slow_command(entry: Dict[str, Any], command: Dict[str, Any]):
+    """Explain a slow command's plan and attach the summary to its slow-log entry"""
+    try:
+        explain = await asyncio.wait_for(
+            client[entry["database"]].command(explain_command(command)), QUERY_TIMEOUT_SECONDS
+        )
+        summary = summarize_plan(explain)
+    except Exception as e:
+        logger.warning(f"Explain of slow {entry['command']} on {entry['collection']} failed: {e}")
+        summary = {"error": str(e)}
+    command_monitor.record_explain(entry, summary)
+    if summary.get("collection_scan"):
+        logger.warning(f"Slow {entry['command']} on {entry['collection']} scans the collection: {entry['shape']}")
+
+def explain_scheduler(loop: asyncio.AbstractEventLoop) -> Callable[[Dict[str, Any], Dict[str, Any]], None]:
+    """on_slow callback that hands explains from executor threads to the event loop"""
+    def schedule(entry: Dict[str, Any], command: Dict[str, Any]):
+        asyncio.run_coroutine_threadsafe(explain_slow_command(entry, command), loop)
+    return schedule
+
+command_monitor.explain_ttl_seconds = MONGO_EXPLAIN_TTL_SECONDS
+command_monitor.route_of = current_route
+command_monitor.on_command = record_mongo_command
+
+@api_router.get("/admin/db/queries")
+async def get_db_query_stats(sort: str = "total_ms", limit: int = 50, admin: AdminUser = Depends(get_current_admin)):
+    """MongoDB query shapes ranked by a statistic, with recent slow commands and their plans"""
+    if sort not in MONGO_QUERY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(MONGO_QUERY_SORTS)}")
+    return command_monitor.snapshot(sort, max(1, min(limit, MONGO_QUERY_MAX_LIMIT)))
+
+# ==================== ADMIN LIVE FEED ====================
+
+# Connected admins receive inserts, updates and deletes on the watched collections over
+# Server-Sent Events. Each process opens a single database change stream, only while at
+# least one admin is listening, and fans every change out to per-connection queues.
+# Change streams need a replica set; on a standalone server the feed logs and retries.
+# Deletes carry no document, so the public id comes from the pre-image, which
+# ensure_live_pre_images enables where the server supports it (MongoDB 6.0+).
+LIVE_COLLECTIONS = {
+    "contacts": "contact_id",
+    "subscriptions": "subscription_id",
+    "payment_transactions": "transaction_id",
+    "users": "user_id"
+}
+LIVE_HIDDEN_FIELDS = ("password_hash", "search_tokens", "search_fuzzy", "search_version")
+LIVE_QUEUE_SIZE = 256
+LIVE_HEARTBEAT_SECONDS = 15
+CHANGE_STREAM_HISTORY_LOST = 286
+NAMESPACE_NOT_FOUND = 26
+
+def live_change_event(change: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a change stream document to the delta sent to admins"""
+    collection = change["ns"]["coll"]
+    document = change.get("fullDocument") or {}
+    document.pop("_id", None)
+    before = change.get("fullDocumentBeforeChange") or {}
+    public_id = LIVE_COLLECTIONS[collection]
+    event = {
+        "collection": collection,
+        "operation": change["operationType"],
+        "id": document.get(public_id, before.get(public_id)),
+        "document_key": str(change["documentKey"]["_id"])
+    }
+    if change["operationType"] == "update":
+        description = change.get("updateDescription") or {}
+        event["fields"] = description.get("updatedFields") or {}
+        event["removed"] = description.get("removedFields") or []
+    if document:
+        event["document"] = document
+    return event
+
+class ChangeFeed:
+    """One shared change stream per process, fanned out to subscriber queues"""
+    
+    def __init__(self, collections: Dict[str, str], queue_size: int):
+        self.collections = collections
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.resume_token = None
+        self.published = 0
+        self.resyncs = 0
+        self.stats_invalidated_at = 0.0
+    
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.resume_token = None
+            self.task = asyncio.create_task(self._run())
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task:
+            self.task.cancel()
+            self.task = None
+    
+    def publish(self, event: Dict[str, Any]):
+        self.published += 1
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A connection that cannot keep up is told to refetch instead of stalling the stream
+                self.resyncs += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"operation": "resync"})
+    
+    def invalidate_stats(self):
+        # At most once per snapshot TTL, so a burst of writes costs one recompute rather than
+        # one per change; the dashboard refetches again after the TTL to catch the tail
+        now = time.monotonic()
+        if now - self.stats_invalidated_at >= admin_stats_cache.ttl_seconds:
+            self.stats_invalidated_at = now
+            admin_stats_cache.invalidate("dashboard")
+    
+    def pipeline(self) -> List[Dict[str, Any]]:
+        hidden = {
+            f"{prefix}.{field}": 0
+            for prefix in ("fullDocument", "fullDocumentBeforeChange", "updateDescription.updatedFields")
+            for field in LIVE_HIDDEN_FIELDS
+        }
+        return [
+            {"$match": {
+                "ns.coll": {"$in": list(self.collections)},
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+            }},
+            {"$project": hidden}
+        ]
+    
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                async with db.watch(
+                    self.pipeline(), full_document="updateLookup",
+                    full_document_before_change="whenAvailable", resume_after=self.resume_token
+                ) as stream:
+                    delay = 1
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        self.invalidate_stats()
+                        self.publish(live_change_event(change))
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self.resume_token = None
+                    self.publish({"operation": "resync"})
+                logger.error(f"Admin change feed failed: {e}")
+            except Exception as e:
+                logger.error(f"Admin change feed failed: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "running": self.task is not None and not self.task.done(),
+            "published": self.published,
+            "resyncs": self.resyncs
+        }
+
+admin_change_feed = ChangeFeed(LIVE_COLLECTIONS, LIVE_QUEUE_SIZE)
+
+async def ensure_live_pre_images():
+    """Record pre-images on the live collections so delete events can name the deleted record"""
+    for collection in LIVE_COLLECTIONS:
+        try:
+            try:
+                await db.command("collMod", collection, changeStreamPreAndPostImages={"enabled": True})
+            except OperationFailure as e:
+                if e.code != NAMESPACE_NOT_FOUND:
+                    raise
+                await db.create_collection(collection, changeStreamPreAndPostImages={"enabled": True})
+        except Exception as e:
+            # Standalone servers and MongoDB < 6.0: deletes still arrive, with id None
+            logger.warning(f"Change stream pre-images unavailable for {collection}: {e}")
+
+async def stream_live_events(request: Request, collections: Set[str]):
+    """Yield SSE frames for one admin connection until it disconnects"""
+    queue = admin_change_feed.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event.get("collection", "") in collections or event["operation"] == "resync":
+                yield f"event: change\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        admin_change_feed.unsubscribe(queue)
+
+@api_router.get("/admin/live")
+async def admin_live_feed(
+    request: Request,
+    collections: Optional[str] = None,
+    admin: AdminUser = Depends(get_current_admin)
+):
+    """Server-Sent Events stream of changes to contacts, subscriptions, transactions and users"""
+    wanted = set(collections.split(",")) if collections else set(LIVE_COLLECTIONS)
+    unknown = wanted - set(LIVE_COLLECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Live collections: {', '.join(LIVE_COLLECTIONS)}")
+    return StreamingResponse(
+        stream_live_events(request, wanted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/admin/live/stats")
+async def admin_live_feed_stats(admin: AdminUser = Depends(get_current_admin)):
+    """Shared change feed state for this process"""
+    return admin_change_feed.stats()
+
+# ==================== SUBSCRIPTION ANALYTICS ====================
+
+# Cohorts, retention, churn by plan, plan-change flows and the MRR history and projection
+# over every subscription. MongoDB
+# projects each subscription down to flat, clean fields, parsing each timestamp once into
+# epoch seconds, so building the NumPy columns needs no per-document Python logic and no
+# date parsing; the computation itself (analytics.py) runs in a worker thread.
+# Results are stored per UTC day in analytics_snapshots and held in memory for the day.
+SUBSCRIPTION_ANALYTICS_FIELDS = ("user_id", "plan_tier", "status", "amount", "started", "ended", "add_ons", "next_billing")
+
+def epoch_seconds_expression(value: Any) -> Dict[str, Any]:
+    """Epoch seconds of an ISO timestamp field to the second, NO_TIMESTAMP when absent or unparseable"""
+    parsed = {"$dateFromString": {
+        "dateString": {"$substrBytes": [{"$ifNull": [value, ""]}, 0, 19]},
+        "timezone": "UTC", "onError": None, "onNull": None
+    }}
+    return {"$ifNull": [{"$toLong": {"$divide": [{"$toLong": parsed}, 1000]}}, NO_TIMESTAMP]}
+
+SUBSCRIPTION_ANALYTICS_PIPELINE = [
+    {"$project": {
+        "_id": 0,
+        "user_id": {"$ifNull": ["$user_id", ""]},
+        "plan_tier": {"$concat": [{"$ifNull": ["$plan_type", "unknown"]}, "/", {"$ifNull": ["$plan_tier", "unknown"]}]},
+        "status": {"$ifNull": ["$status", ""]},
+        "amount": {"$convert": {"input": "$amount", "to": "double", "onError": 0.0, "onNull": 0.0}},
+        "started": epoch_seconds_expression({"$ifNull": ["$start_date", "$created_at"]}),
+        "ended": epoch_seconds_expression({"$ifNull": ["$cancelled_at", "$ended_at"]}),
+        "add_ons": {"$reduce": {
+            "input": {"$ifNull": ["$add_ons", []]},
+            "initialValue": "",
+            "in": {"$concat": ["$$value", {"$cond": [{"$eq": ["$$value", ""]}, "", ","]}, "$$this"]}
+        }},
+        "next_billing": epoch_seconds_expression("$next_billing_date")
+    }}
+]
+ANALYTICS_CHURN_MONTHS = int(os.environ.get('ANALYTICS_CHURN_MONTHS', '12'))
+ANALYTICS_RETENTION_MONTHS = int(os.environ.get('ANALYTICS_RETENTION_MONTHS', '24'))
+MRR_PROJECTION_MONTHS = int(os.environ.get('MRR_PROJECTION_MONTHS', '12'))
+ANALYTICS_BATCH_SIZE = 50000
+
+subscription_analytics_cache = SnapshotCache(24 * 3600, max_entries=2)
+
+def compute_subscription_analytics(rows: List[Dict[str, Any]], as_of: str) -> Dict[str, Any]:
+    """Columnar build and analytics over projected subscription rows (runs in a worker thread)"""
+    columns = SubscriptionColumns(*(list(map(itemgetter(field), rows)) for field in SUBSCRIPTION_ANALYTICS_FIELDS))
+    result = subscription_analytics(columns, as_of, ANALYTICS_CHURN_MONTHS, ANALYTICS_RETENTION_MONTHS)
+    result["mrr"] = mrr_analytics(
+        columns, PLAN_PRICES, ADD_ON_PRICES, as_of, ANALYTICS_CHURN_MONTHS, MRR_PROJECTION_MONTHS
+    )
+    return result
+
+async def load_subscription_analytics(as_of: str, recompute: bool) -> Dict[str, Any]:
+    """Today's stored snapshot, or a fresh computation that replaces it"""
+    snapshot_id = f"subscription_analytics:{as_of}"
+    if not recompute:
+        stored = await db.analytics_snapshots.find_one({"_id": snapshot_id})
+        if stored:
+            return stored["result"]
+    
+    started = time.perf_counter()
+    rows = await db.subscriptions.aggregate(SUBSCRIPTION_ANALYTICS_PIPELINE, batchSize=ANALYTICS_BATCH_SIZE).to_list(None)
+    loaded = time.perf_counter()
+    result = await asyncio.to_thread(compute_subscription_analytics, rows, as_of)
+    logger.info(
+        f"Subscription analytics for {as_of}: {len(rows)} subscriptions, "
+        f"load {loaded - started:.2f}s, compute {time.perf_counter() - loaded:.2f}s"
+    )
+    
+    await db.analytics_snapshots.replace_one(
+        {"_id": snapshot_id},
+        {"kind": "subscription_analytics", "as_of": as_of, "result": result,
+         "computed_at": datetime.now(timezone.utc).isoformat()},
+        upsert=True
+    )
+    return result
+
+async def get_subscription_analytics(refresh: bool = False) -> Dict[str, Any]:
+    as_of = datetime.now(timezone.utc).date().isoformat()
+    key = f"subscription_analytics:{as_of}"
+    if refresh:
+        subscription_analytics_cache.invalidate(key)
+    return await subscription_analytics_cache.get(key, lambda: load_subscription_analytics(as_of, refresh))
+
+@api_router.get("/admin/analytics/cohorts")
+async def get_cohort_analytics(refresh: bool = False, admin: AdminUser = Depends(get_current_admin)):
+    """Monthly signup cohorts with their retention curves"""
+    result = await get_subscription_analytics(refresh)
+    return {"as_of": result["as_of"], "subscriptions": result["subscriptions"], "cohorts": result["cohorts"]}
+
+@api_router.get("/admin/analytics/churn")
+async def get_churn_analytics(refresh: bool = False, admin: AdminUser = Depends(get_current_admin)):
+    """Monthly churn rates by plan type and by plan tier"""
+    result = await get_subscription_analytics(refresh)
+    return {
+        "as_of": result["as_of"],
+        "by_plan_type": result["churn_by_plan_type"],
+        "by_plan_tier": result["churn_by_plan_tier"]
+    }
+
+@api_router.get("/admin/analytics/mrr")
+async def get_mrr_analytics(refresh: bool = False, admin: AdminUser = Depends(get_current_admin)):
+    """MRR history by movement type and the forward revenue projection, with today's live MRR"""
+    result, metrics = await asyncio.gather(get_subscription_analytics(refresh), get_business_metrics())
+    return {**result["mrr"], "live_mrr": round(metrics.get("mrr", 0), 2)}
+
+@api_router.get("/admin/analytics/plan-changes")
+async def get_plan_change_analytics(refresh: bool = False, admin: AdminUser = Depends(get_current_admin)):
+    """Upgrade, downgrade and lateral plan-change flows"""
+    result = await get_subscription_analytics(refresh)
+    return {"as_of": result["as_of"], **result["plan_changes"]}
+
+# ==================== ANALYTICS EXPORTS ====================
+
+# Columnar exports for the finance team: each collection is streamed from a cursor in
+# batches and appended to Parquet files partitioned by created month,
+#   EXPORT_DIR/<collection>/created_month=YYYY-MM/<job_id>.parquet
+# Incremental runs only read documents past the collection's stored watermark, a
+# (timestamp, id) pair so rows sharing the last exported timestamp are neither skipped
+# nor exported twice. Watermarks are on updated_at, which every write path maintains,
+# so a row changed after it was exported is exported again with its new state.
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', str(ROOT_DIR / 'exports')))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '10000'))
+
+EXPORT_COLLECTIONS = {
+    "payment_transactions": {
+        "watermark": "updated_at",
+        "id": "transaction_id",
+        "fields": {
+            "transaction_id": "string", "user_id": "string", "session_id": "string",
+            "amount": "float", "currency": "string", "status": "string", "payment_status": "string",
+            "plan_type": "string", "plan_tier": "string", "add_ons": "list",
+            "created_at": "timestamp", "updated_at": "timestamp"
+        }
+    },
+    "subscriptions": {
+        "watermark": "updated_at",
+        "id": "subscription_id",
+        "fields": {
+            "subscription_id": "string", "user_id": "string", "plan_type": "string", "plan_tier": "string",
+            "add_ons": "list", "status": "string", "amount": "float", "currency": "string",
+            "start_date": "timestamp", "next_billing_date": "timestamp", "cancelled_at": "timestamp",
+            "ended_at": "timestamp", "created_at": "timestamp", "updated_at": "timestamp"
+        }
+    },
+    "users": {
+        "watermark": "updated_at",
+        "id": "user_id",
+        "fields": {
+            "user_id": "string", "email": "string", "name": "string", "business_name": "string",
+            "industry": "string", "state": "string", "postcode": "string", "subscription_status": "string",
+            "current_plan": "string", "role": "string", "created_at": "timestamp", "updated_at": "timestamp"
+        }
+    }
+}
+
+_export_lock = asyncio.Lock()
+
+def export_schema(fields: Dict[str, str]):
+    import pyarrow as pa
+    
+    types = {
+        "string": pa.string(),
+        "float": pa.float64(),
+        "list": pa.list_(pa.string()),
+        "timestamp": pa.timestamp("us", tz="UTC")
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields.items()])
+
+def export_value(value: Any, kind: str) -> Any:
+    """Coerce a Mongo value to the export column type, dropping values that do not fit"""
+    if value is None:
+        return None
+    try:
+        if kind == "timestamp":
+            parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        if kind == "float":
+            return float(value)
+        if kind == "list":
+            return [str(item) for item in value]
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+def write_export_batch(writers: Dict[str, Any], collection: str, job_id: str, schema, rows: List[Dict[str, Any]]) -> int:
+    """Append a batch of documents to the per-month Parquet writers (runs in a worker thread)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    fields = EXPORT_COLLECTIONS[collection]["fields"]
+    by_month: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_month[str(row.get("created_at") or "unknown")[:7]].append(
+            {name: export_value(row.get(name), kind) for name, kind in fields.items()}
+        )
+    for month, month_rows in by_month.items():
+        writer = writers.get(month)
+        if writer is None:
+            path = EXPORT_DIR / collection / f"created_month={month}" / f"{job_id}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = writers[month] = pq.ParquetWriter(str(path), schema, compression="zstd")
+        writer.write_table(pa.Table.from_pylist(month_rows, schema=schema))
+    return len(rows)
+
+async def export_collection(job_id: str, collection: str, incremental: bool) -> Dict[str, Any]:
+    """Stream one collection into Parquet and advance its watermark"""
+    spec = EXPORT_COLLECTIONS[collection]
+    watermark_field, id_field = spec["watermark"], spec["id"]
+    schema = export_schema(spec["fields"])
+    
+    query: Dict[str, Any] = {}
+    previous = await db.export_watermarks.find_one({"_id": collection}) if incremental else None
+    if previous and previous.get("field", watermark_field) != watermark_field:
+        # A watermark on a different field does not bound this one; start over with a full export
+        previous = None
+    if previous and previous.get("last_id") is not None:
+        query["$or"] = [
+            {watermark_field: {"$gt": previous["value"]}},
+            {watermark_field: previous["value"], id_field: {"$gt": previous["last_id"]}}
+        ]
+    elif previous:
+        # Watermarks stored before the id was tracked covered every row at their timestamp
+        query[watermark_field] = {"$gt": previous["value"]}
+    
+    projection = {"_id": 0, **{name: 1 for name in spec["fields"]}, watermark_field: 1}
+    cursor = db[collection].find(query, projection).sort(
+        [(watermark_field, 1), (id_field, 1)]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    
+    writers: Dict[str, Any] = {}
+    rows_written = 0
+    high_watermark = previous["value"] if previous else None
+    last_id = previous.get("last_id") if previous else None
+    batch: List[Dict[str, Any]] = []
+    try:
+        async for doc in cursor:
+            batch.append(doc)
+            if doc.get(watermark_field):
+                high_watermark, last_id = doc[watermark_field], doc.get(id_field)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                rows_written += await asyncio.to_thread(write_export_batch, writers, collection, job_id, schema, batch)
+                batch = []
+                await update_job(job_id, **{f"progress.{collection}": rows_written})
+        if batch:
+            rows_written += await asyncio.to_thread(write_export_batch, writers, collection, job_id, schema, batch)
+    finally:
+        for writer in writers.values():
+            await asyncio.to_thread(writer.close)
+    
+    if high_watermark is not None:
+        await db.export_watermarks.update_one(
+            {"_id": collection},
+            {"$set": {"value": high_watermark, "last_id": last_id, "field": watermark_field, "job_id": job_id,
+                      "updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+    files = [
+        str((EXPORT_DIR / collection / f"created_month={month}" / f"{job_id}.parquet").relative_to(EXPORT_DIR))
+        for month in sorted(writers)
     ]
+    return {"rows": rows_written, "files": files, "watermark": high_watermark}
+
+async def run_analytics_export(job: Dict[str, Any], collections: List[str], incremental: bool):
+    job_id = job["job_id"]
+    started = time.monotonic()
+    async with _export_lock:
+        try:
+            results = {}
+            for collection in collections:
+                results[collection] = await export_collection(job_id, collection, incremental)
+            elapsed = time.monotonic() - started
+            total_rows = sum(result["rows"] for result in results.values())
+            report = {
+                "collections": results,
+                "files": [path for result in results.values() for path in result["files"]],
+                "rows": total_rows,
+                "elapsed_seconds": round(elapsed, 2),
+                "rows_per_second": round(total_rows / elapsed, 1) if elapsed else 0.0
+            }
+            await update_job(job_id, status="completed", report=report)
+        except Exception as e:
+            logger.error(f"Analytics export {job_id} failed: {e}")
+            await update_job(job_id, status="failed", error=str(e))
+
+@api_router.post("/admin/exports")
+async def create_analytics_export(export: ExportRequest, admin: AdminUser = Depends(get_current_admin)):
+    """Start a background Parquet export of the analytics collections"""
+    unknown = [c for c in export.collections if c not in EXPORT_COLLECTIONS]
+    if unknown or not export.collections:
+        raise HTTPException(status_code=400, detail=f"Exportable collections: {', '.join(EXPORT_COLLECTIONS)}")
+    if _export_lock.locked():
+        raise HTTPException(status_code=409, detail="An export is already running")
     
-    results = await db.payment_transactions.aggregate(pipeline).to_list(days)
+    job = await create_job("analytics_export", {"collections": export.collections, "incremental": export.incremental})
+    if not task_supervisor.spawn("analytics_export", run_analytics_export(job, export.collections, export.incremental)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+@api_router.get("/admin/exports/{job_id}/download")
+async def download_analytics_export(job_id: str, path: str, admin: AdminUser = Depends(get_current_admin)):
+    """Download one Parquet file produced by an export job"""
+    job = await db.jobs.find_one({"job_id": job_id, "kind": "analytics_export"}, {"_id": 0})
+    if not job or job.get("status") != "completed":
+        raise HTTPException(status_code=404, detail="Export not found")
+    if path not in job["report"]["files"]:
+        raise HTTPException(status_code=404, detail="File not found")
     
-    return {"data": results, "period_days": days}
+    file_path = EXPORT_DIR / path
+    if not file_path.is_file():
+        raise HTTPException(status_code=410, detail="Export file no longer available")
+    return FileResponse(str(file_path), media_type="application/vnd.apache.parquet", filename=path.replace("/", "_"))
 
 # ==================== PUSH NOTIFICATIONS ====================
 
+# Device tokens live in push_tokens, one document per token (unique index): a token that
+# registers under another user moves to that user, and every registration refreshes
+# last_seen. Tokens not seen for PUSH_TOKEN_STALE_DAYS are pruned daily in batches and
+# are never sent to. The dispatcher streams live tokens in batches, groups each batch by platform and sends every notification as its
+# own request over a pooled HTTP/2 client per service (APNs for iOS, FCM for Android and
+# web), bounded by a per-service semaphore so requests multiplex over a few connections.
+# Tokens the service reports as unregistered or invalid are pruned after each batch.
+PUSH_PLATFORMS = ("ios", "android", "web")
+PUSH_BATCH_SIZE = int(os.environ.get('PUSH_BATCH_SIZE', '1000'))
+PUSH_CONCURRENCY = int(os.environ.get('PUSH_CONCURRENCY', '200'))
+PUSH_MAX_CONNECTIONS = int(os.environ.get('PUSH_MAX_CONNECTIONS', '4'))
+PUSH_MAX_ATTEMPTS = 3
+PUSH_RETRY_BASE_SECONDS = 0.5
+PUSH_TIMEOUT_SECONDS = 10
+PUSH_TOKEN_STALE_DAYS = int(os.environ.get('PUSH_TOKEN_STALE_DAYS', '90'))
+PUSH_PRUNE_BATCH_SIZE = 1000
+PUSH_PRUNE_HOUR_UTC = int(os.environ.get('PUSH_PRUNE_HOUR_UTC', '4'))
+
+APNS_URL = os.environ.get('APNS_URL', 'https://api.push.apple.com')
+APNS_TOPIC = os.environ.get('APNS_TOPIC', '')
+APNS_KEY_ID = os.environ.get('APNS_KEY_ID', '')
+APNS_TEAM_ID = os.environ.get('APNS_TEAM_ID', '')
+APNS_AUTH_KEY_PATH = os.environ.get('APNS_AUTH_KEY_PATH', '')
+APNS_TOKEN_TTL_SECONDS = 50 * 60  # Apple rejects provider tokens older than an hour
+
+FCM_URL = os.environ.get('FCM_URL', 'https://fcm.googleapis.com')
+FCM_PROJECT_ID = os.environ.get('FCM_PROJECT_ID', '')
+FCM_SERVICE_ACCOUNT_FILE = os.environ.get('FCM_SERVICE_ACCOUNT_FILE', '')
+
 class PushTokenRequest(BaseModel):
     token: str
     platform: str  # ios, android, web
 
+class PushBroadcastRequest(BaseModel):
+    title: str
+    body: str
+    data: Dict[str, str] = {}
+    user_ids: Optional[List[str]] = None  # None sends to every registered device
+
+class PushSender:
+    """One push service: a pooled HTTP/2 client, its credentials and how to read its replies"""
+    
+    def __init__(self, base_url: str, concurrency: int = PUSH_CONCURRENCY):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+    
+    def get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Both services speak HTTP/2; APNs accepts nothing else
+                http1=False,
+                http2=True,
+                timeout=PUSH_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=PUSH_MAX_CONNECTIONS, max_keepalive_connections=PUSH_MAX_CONNECTIONS)
+            )
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.client
+    
+    async def authorization(self) -> Dict[str, str]:
+        return {}
+    
+    def build_request(self, token: str, message: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        raise NotImplementedError
+    
+    def outcome(self, response: httpx.Response) -> str:
+        """sent, invalid (prune the token), retry or failed"""
+        raise NotImplementedError
+    
+    def error_body(self, response: httpx.Response) -> Dict[str, Any]:
+        # Proxies and load balancers in front of the services can answer with HTML or nothing
+        try:
+            body = response.json()
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+    
+    async def deliver(self, token: str, message: Dict[str, Any]) -> str:
+        client = self.get_client()
+        path, headers, payload = self.build_request(token, message)
+        for attempt in range(PUSH_MAX_ATTEMPTS):
+            try:
+                async with self.semaphore:
+                    response = await client.post(path, headers={**headers, **await self.authorization()}, json=payload)
+                outcome = self.outcome(response)
+            except httpx.HTTPError as e:
+                logger.warning(f"Push request to {self.base_url} failed: {e}")
+                outcome = "retry"
+            if outcome != "retry":
+                return outcome
+            await asyncio.sleep(PUSH_RETRY_BASE_SECONDS * 2 ** attempt)
+        return "failed"
+    
+    async def send(self, tokens: List[str], message: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Deliver message to every token concurrently, grouping the tokens by outcome"""
+        outcomes = await asyncio.gather(*(self.deliver(token, message) for token in tokens))
+        results: Dict[str, List[str]] = defaultdict(list)
+        for token, outcome in zip(tokens, outcomes):
+            results[outcome].append(token)
+        return results
+    
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class ApnsSender(PushSender):
+    """Apple Push Notification service, authenticated with an ES256 provider token"""
+    
+    INVALID_REASONS = {"BadDeviceToken", "DeviceTokenNotForTopic", "Unregistered"}
+    
+    def __init__(self, base_url: str, topic: str, concurrency: int = PUSH_CONCURRENCY):
+        super().__init__(base_url, concurrency)
+        self.topic = topic
+        self.provider_token: Optional[Tuple[float, str]] = None
+    
+    async def authorization(self) -> Dict[str, str]:
+        if not APNS_AUTH_KEY_PATH:
+            return {}
+        if self.provider_token is None or self.provider_token[0] < time.monotonic():
+            signing_key = Path(APNS_AUTH_KEY_PATH).read_text()
+            token = jwt.encode(
+                {"iss": APNS_TEAM_ID, "iat": int(time.time())}, signing_key,
+                algorithm="ES256", headers={"kid": APNS_KEY_ID}
+            )
+            self.provider_token = (time.monotonic() + APNS_TOKEN_TTL_SECONDS, token)
+        return {"authorization": f"bearer {self.provider_token[1]}"}
+    
+    def build_request(self, token: str, message: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        headers = {"apns-topic": self.topic, "apns-push-type": "alert", "apns-priority": "10"}
+        payload = {"aps": {"alert": {"title": message["title"], "body": message["body"]}, "sound": "default"}, **message["data"]}
+        return f"/3/device/{token}", headers, payload
+    
+    def outcome(self, response: httpx.Response) -> str:
+        if response.status_code == 200:
+            return "sent"
+        reason = self.error_body(response).get("reason", "")
+        if response.status_code == 410 or reason in self.INVALID_REASONS:
+            return "invalid"
+        if reason == "ExpiredProviderToken":
+            self.provider_token = None
+            return "retry"
+        if response.status_code == 429 or response.status_code >= 500:
+            return "retry"
+        logger.warning(f"APNs rejected a notification: {response.status_code} {reason}")
+        return "failed"
+
+class FcmSender(PushSender):
+    """Firebase Cloud Messaging HTTP v1, authenticated with a service account"""
+    
+    def __init__(self, base_url: str, project_id: str, concurrency: int = PUSH_CONCURRENCY):
+        super().__init__(base_url, concurrency)
+        self.project_id = project_id
+        self.credentials = None
+    
+    async def authorization(self) -> Dict[str, str]:
+        if not FCM_SERVICE_ACCOUNT_FILE:
+            return {}
+        if self.credentials is None:
+            from google.oauth2 import service_account
+            self.credentials = service_account.Credentials.from_service_account_file(
+                FCM_SERVICE_ACCOUNT_FILE, scopes=["https://www.googleapis.com/auth/firebase.messaging"]
+            )
+        if not self.credentials.valid:
+            from google.auth.transport.requests import Request as GoogleAuthRequest
+            await asyncio.to_thread(self.credentials.refresh, GoogleAuthRequest())
+        return {"authorization": f"Bearer {self.credentials.token}"}
+    
+    def build_request(self, token: str, message: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        payload = {"message": {
+            "token": token,
+            "notification": {"title": message["title"], "body": message["body"]},
+            "data": message["data"]
+        }}
+        return f"/v1/projects/{self.project_id}/messages:send", {}, payload
+    
+    def outcome(self, response: httpx.Response) -> str:
+        if response.status_code == 200:
+            return "sent"
+        error = self.error_body(response).get("error") or {}
+        details = error.get("details") or []
+        codes = {detail.get("errorCode") for detail in details}
+        # A malformed token is INVALID_ARGUMENT with a field violation on message.token; other
+        # INVALID_ARGUMENT errors are about the payload and must not prune the device
+        bad_token = "INVALID_ARGUMENT" in codes and any(
+            violation.get("field") == "message.token"
+            for detail in details for violation in detail.get("fieldViolations") or []
+        )
+        if response.status_code == 404 or "UNREGISTERED" in codes or bad_token:
+            return "invalid"
+        if response.status_code == 401:
+            self.credentials = None
+            return "retry"
+        if response.status_code == 429 or response.status_code >= 500:
+            return "retry"
+        logger.warning(f"FCM rejected a notification: {response.status_code} {error.get('status')}")
+        return "failed"
+
+push_senders: Dict[str, PushSender] = {}
+if APNS_TOPIC:
+    push_senders["ios"] = ApnsSender(APNS_URL, APNS_TOPIC)
+if FCM_PROJECT_ID:
+    push_senders["android"] = push_senders["web"] = FcmSender(FCM_URL, FCM_PROJECT_ID)
+
+async def dispatch_push_batch(tokens: List[Dict[str, Any]], message: Dict[str, Any]) -> Dict[str, int]:
+    """Send one batch of token documents, grouped per platform, and prune the invalid ones"""
+    by_sender: Dict[int, Tuple[PushSender, List[str]]] = {}
+    skipped = 0
+    for doc in tokens:
+        sender = push_senders.get(doc.get("platform"))
+        if sender is None:
+            skipped += 1
+            continue
+        by_sender.setdefault(id(sender), (sender, []))[1].append(doc["token"])
+    
+    results = await asyncio.gather(*(sender.send(batch, message) for sender, batch in by_sender.values()))
+    counts = {"sent": 0, "failed": 0, "pruned": 0, "skipped": skipped}
+    invalid = []
+    for result in results:
+        counts["sent"] += len(result["sent"])
+        counts["failed"] += len(result["failed"])
+        invalid.extend(result["invalid"])
+    if invalid:
+        pruned = await db.push_tokens.delete_many({"token": {"$in": invalid}})
+        counts["pruned"] = pruned.deleted_count
+    return counts
+
+async def send_push(
+    title: str, body: str, data: Optional[Dict[str, str]] = None,
+    user_ids: Optional[List[str]] = None, job_id: Optional[str] = None
+) -> Dict[str, int]:
+    """Fan a notification out to the devices of user_ids (or every device)"""
+    message = {"title": title, "body": body, "data": data or {}}
+    query: Dict[str, Any] = {"last_seen": {"$gte": push_token_cutoff()}}
+    if user_ids is not None:
+        query["user_id"] = {"$in": user_ids}
+    cursor = db.push_tokens.find(query, {"_id": 0, "token": 1, "platform": 1}).batch_size(PUSH_BATCH_SIZE)
+    
+    totals: Dict[str, int] = defaultdict(int)
+    batch: List[Dict[str, Any]] = []
+    
+    async def flush():
+        for field, count in (await dispatch_push_batch(batch, message)).items():
+            totals[field] += count
+        if job_id:
+            await update_job(job_id, progress=dict(totals))
+    
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= PUSH_BATCH_SIZE:
+            await flush()
+            batch = []
+    if batch:
+        await flush()
+    return dict(totals)
+
+def push_token_cutoff() -> str:
+    """last_seen before this means the device is stale"""
+    return (datetime.now(timezone.utc) - timedelta(days=PUSH_TOKEN_STALE_DAYS)).isoformat()
+
+async def prune_stale_push_tokens(job_id: Optional[str] = None) -> int:
+    """Delete tokens not seen since the cutoff, a batch of ids at a time"""
+    cutoff = push_token_cutoff()
+    removed = 0
+    while True:
+        stale = await db.push_tokens.find(
+            {"last_seen": {"$lt": cutoff}}, {"_id": 1}
+        ).limit(PUSH_PRUNE_BATCH_SIZE).to_list(PUSH_PRUNE_BATCH_SIZE)
+        if not stale:
+            return removed
+        # Re-check last_seen so a device that registered meanwhile is kept
+        result = await db.push_tokens.delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in stale]}, "last_seen": {"$lt": cutoff}}
+        )
+        removed += result.deleted_count
+        if job_id:
+            await update_job(job_id, progress={"removed": removed})
+
+async def run_push_prune_job(job: Dict[str, Any]):
+    job_id = job["job_id"]
+    try:
+        removed = await prune_stale_push_tokens(job_id)
+        await update_job(job_id, status="completed", report={"removed": removed})
+    except Exception as e:
+        logger.error(f"Push token prune job {job_id} failed: {e}")
+        await update_job(job_id, status="failed", error=str(e))
+
+async def push_token_pruner():
+    """Prune stale push tokens once a day"""
+    while True:
+        await asyncio.sleep(seconds_until_hour(PUSH_PRUNE_HOUR_UTC))
+        run_key = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        try:
+            if await claim_scheduled_run("push_token_prune", run_key):
+                job = await create_job("push_token_prune", {"trigger": "schedule"})
+                await run_push_prune_job(job)
+        except Exception as e:
+            logger.error(f"Push token prune failed: {e}")
+
+async def ensure_push_token_registry():
+    """Collapse duplicate tokens and backfill last_seen before the unique index is built"""
+    indexes = await db.push_tokens.index_information()
+    if any(spec.get("unique") and spec["key"] == [("token", 1)] for spec in indexes.values()):
+        return
+    pipeline = [
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": "$token", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    duplicates: List[Any] = []
+    async for group in db.push_tokens.aggregate(pipeline, allowDiskUse=True):
+        # The most recently registered owner keeps the token
+        duplicates.extend(group["ids"][1:])
+    for start in range(0, len(duplicates), PUSH_PRUNE_BATCH_SIZE):
+        await db.push_tokens.delete_many({"_id": {"$in": duplicates[start:start + PUSH_PRUNE_BATCH_SIZE]}})
+    now = datetime.now(timezone.utc).isoformat()
+    await db.push_tokens.update_many(
+        {"last_seen": None},
+        [{"$set": {"last_seen": {"$ifNull": ["$updated_at", now]}}}]
+    )
+    if duplicates:
+        logger.info(f"Removed {len(duplicates)} duplicate push tokens")
+
+async def run_push_job(job: Dict[str, Any], request: PushBroadcastRequest):
+    job_id = job["job_id"]
+    started = time.monotonic()
+    try:
+        totals = await send_push(request.title, request.body, request.data, request.user_ids, job_id)
+        report = {**totals, "elapsed_seconds": round(time.monotonic() - started, 2)}
+        await update_job(job_id, status="completed", report=report)
+    except Exception as e:
+        logger.error(f"Push job {job_id} failed: {e}")
+        await update_job(job_id, status="failed", error=str(e))
+
 @api_router.post("/notifications/register")
 async def register_push_token(request: PushTokenRequest, current_user: User = Depends(get_current_user)):
-    """Register push notification token for user"""
-    await db.push_tokens.update_one(
-        {"user_id": current_user.user_id, "platform": request.platform},
-        {"$set": {
-            "user_id": current_user.user_id,
-            "token": request.token,
-            "platform": request.platform,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
+    """Register or refresh a device's push token; apps call this on every launch"""
+    if request.platform not in PUSH_PLATFORMS:
+        raise HTTPException(status_code=400, detail=f"platform must be one of: {', '.join(PUSH_PLATFORMS)}")
+    now = datetime.now(timezone.utc).isoformat()
+    before = await db.push_tokens.find_one_and_update(
+        {"token": request.token},
+        {
+            "$set": {
+                "user_id": current_user.user_id,
+                "platform": request.platform,
+                "last_seen": now,
+                "updated_at": now
+            },
+            "$setOnInsert": {"created_at": now}
+        },
+        projection={"_id": 0, "user_id": 1},
         upsert=True
     )
+    # A device changes hands when someone else signs in on it; it stops notifying the old user
+    if before and before.get("user_id") != current_user.user_id:
+        logger.info(f"Push token reassigned from {before.get('user_id')} to {current_user.user_id}")
     return {"message": "Push token registered successfully"}
 
 @api_router.delete("/notifications/unregister")
-async def unregister_push_token(platform: str, current_user: User = Depends(get_current_user)):
-    """Unregister push notification token"""
-    await db.push_tokens.delete_one({
-        "user_id": current_user.user_id,
-        "platform": platform
-    })
-    return {"message": "Push token unregistered"}
+async def unregister_push_token(
+    platform: Optional[str] = None,
+    token: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Unregister the user's push tokens, optionally only one token or one platform"""
+    query: Dict[str, Any] = {"user_id": current_user.user_id}
+    if platform:
+        query["platform"] = platform
+    if token:
+        query["token"] = token
+    result = await db.push_tokens.delete_many(query)
+    return {"message": "Push token unregistered", "removed": result.deleted_count}
 
 @api_router.get("/notifications/tokens")
 async def get_push_tokens(current_user: User = Depends(get_current_user)):
@@ -1531,6 +4471,83 @@ async def get_push_tokens(current_user: User = Depends(get_current_user)):
     ).to_list(10)
     return {"tokens": tokens}
 
+@api_router.post("/admin/jobs/push-token-prune")
+async def start_push_prune_job(admin: AdminUser = Depends(get_current_admin)):
+    """Delete push tokens not seen for PUSH_TOKEN_STALE_DAYS in the background"""
+    job = await create_job("push_token_prune", {"trigger": "admin", "stale_days": PUSH_TOKEN_STALE_DAYS})
+    if not task_supervisor.spawn("push_token_prune", run_push_prune_job(job)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+@api_router.post("/admin/notifications/push")
+async def start_push_job(request: PushBroadcastRequest, admin: AdminUser = Depends(get_current_admin)):
+    """Send a push notification to some or all users' devices in the background"""
+    if not push_senders:
+        raise HTTPException(status_code=503, detail="No push service is configured")
+    job = await create_job("push", {"title": request.title, "users": len(request.user_ids) if request.user_ids is not None else "all"})
+    if not task_supervisor.spawn("push", run_push_job(job, request)):
+        await update_job(job["job_id"], status="failed", error="Background task capacity exhausted")
+        raise HTTPException(status_code=503, detail="Background task capacity exhausted")
+    return job
+
+# ==================== DATABASE INDEXES ====================
+
+# (collection, keys, options) - created at startup, existing indexes are left untouched
+INDEX_SPECS = [
+    ("ai_chats", [("user_id", 1), ("created_at", -1)], {}),
+    ("ai_chats", [("query", "text"), ("response", "text")], {
+        "name": "ai_chats_text",
+        "weights": {"query": 3, "response": 1},
+        "default_language": "english"
+    }),
+    ("jobs", [("job_id", 1)], {"unique": True}),
+    ("jobs", [("kind", 1), ("created_at", -1)], {}),
+    ("jobs", [("kind", 1)], {
+        "name": "jobs_one_running_insights_batch",
+        "unique": True,
+        "partialFilterExpression": {"kind": "insights_batch", "status": "running"}
+    }),
+    ("subscriptions", [("status", 1), ("subscription_id", 1)], {}),
+    ("precomputed_insights", [("user_id", 1)], {"unique": True}),
+    ("email_outbox", [("email_id", 1)], {"unique": True}),
+    ("email_outbox", [("status", 1), ("next_attempt_at", 1)], {}),
+    ("email_outbox", [("claim_id", 1)], {}),
+    ("email_outbox", [("expire_at", 1)], {"expireAfterSeconds": 0}),
+    ("notification_digest", [("claim_id", 1)], {}),
+    ("payment_transactions", [("updated_at", 1), ("transaction_id", 1)], {}),
+    ("subscriptions", [("updated_at", 1), ("subscription_id", 1)], {}),
+    ("users", [("updated_at", 1), ("user_id", 1)], {}),
+    ("payment_transactions", [("status", 1), ("created_at", 1)], {}),
+    ("revenue_daily", [("date", 1)], {}),
+    ("users", [("search_tokens", 1)], {}),
+    ("users", [("search_fuzzy", 1)], {}),
+    ("users", [("created_at", -1), ("user_id", -1)], {}),
+    ("subscriptions", [("created_at", -1), ("subscription_id", -1)], {}),
+    ("subscriptions", [("user_id", 1)], {}),
+    ("user_sessions", [("user_id", 1)], {}),
+    ("payment_transactions", [("user_id", 1)], {}),
+    ("push_tokens", [("token", 1)], {"unique": True}),
+    ("push_tokens", [("user_id", 1), ("platform", 1)], {}),
+    ("push_tokens", [("last_seen", 1)], {}),
+    ("contacts", [("email", 1)], {"name": "contacts_email_ci", "collation": EMAIL_COLLATION}),
+    ("subscriptions", [("status", 1), ("created_at", -1), ("subscription_id", -1)], {}),
+    ("contacts", [("created_at", -1), ("contact_id", -1)], {}),
+    ("contacts", [("status", 1), ("created_at", -1), ("contact_id", -1)], {}),
+    ("payment_transactions", [("created_at", -1), ("transaction_id", -1)], {}),
+    ("payment_transactions", [("status", 1), ("created_at", -1), ("transaction_id", -1)], {}),
+]
+
+async def ensure_indexes():
+    """Create the indexes the API relies on"""
+    async def create(collection: str, keys, options: Dict[str, Any]):
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Failed to create index on {collection} {keys}: {e}")
+    
+    await asyncio.gather(*(create(c, k, o) for c, k, o in INDEX_SPECS))
+
 # ==================== GENERAL ROUTES ====================
 
 @api_router.get("/")
@@ -1553,6 +4570,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
+# Added last so it is outermost and times the whole middleware stack
+app.add_middleware(RequestMetricsMiddleware)
+
+async def startup_tasks():
+    command_monitor.on_slow = explain_scheduler(asyncio.get_running_loop())
+    await ensure_push_token_registry()
+    await ensure_indexes()
+    await ensure_revenue_rollups()
+    await ensure_user_search_keys()
+    await ensure_subscription_snapshots()
+    await ensure_updated_at()
+    await ensure_live_pre_images()
+    if RESEND_API_KEY:
+        for i in range(EMAIL_OUTBOX_WORKERS):
+            background_services.append(asyncio.create_task(email_outbox_worker(f"email_worker_{i}")))
+        background_services.append(asyncio.create_task(notification_digest_flusher()))
+    if EMERGENT_LLM_KEY:
+        background_services.append(asyncio.create_task(nightly_insights_scheduler()))
+    background_services.append(asyncio.create_task(business_metrics_reconciler()))
+    background_services.append(asyncio.create_task(push_token_pruner()))
+
 async def shutdown_db_client():
+    # Drain supervised tasks while the database client is still open, then close it last
+    drained = await task_supervisor.drain(TASK_DRAIN_TIMEOUT_SECONDS)
+    if drained["cancelled"]:
+        logger.warning(f"Cancelled {drained['cancelled']} background tasks still running at shutdown")
+    for task in background_services:
+        task.cancel()
+    if admin_change_feed.task:
+        admin_change_feed.task.cancel()
+    await asyncio.gather(*background_services, return_exceptions=True)
+    if RESEND_API_KEY:
+        await flush_notification_digest()
+    await asyncio.gather(*(sender.close() for sender in set(push_senders.values())))
+    email_executor.shutdown(wait=False)
+    command_monitor.on_slow = lambda entry, command: None
     client.close()
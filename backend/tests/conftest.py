@@ -0,0 +1,61 @@
+"""
+Shared fixtures for the MongoDB-backed test suites.
+Reachability is checked with synchronous pymongo; each test body then runs on its own
+event loop with a Motor client created inside that loop, so nothing is bound to a
+loop that has already closed.
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+import uuid
+
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MongoTestDatabase:
+    """A throwaway database that run() points the server at for the duration of a coroutine"""
+
+    def __init__(self, url, name, hello, monkeypatch):
+        self.url = url
+        self.name = name
+        self.hello = hello
+        self.monkeypatch = monkeypatch
+
+    def run(self, body):
+        """Run body(db) on a fresh event loop with server.db pointing at this database"""
+        from motor.motor_asyncio import AsyncIOMotorClient
+        import server
+
+        async def main():
+            client = AsyncIOMotorClient(self.url, serverSelectionTimeoutMS=5000)
+            db = client[self.name]
+            self.monkeypatch.setattr(server, "db", db)
+            try:
+                return await body(db)
+            finally:
+                client.close()
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """A uniquely named database on MONGO_URL, dropped afterwards; skips only when no server answers"""
+    url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    sync_client = MongoClient(url, serverSelectionTimeoutMS=1000)
+    try:
+        hello = sync_client.admin.command("hello")
+    except ServerSelectionTimeoutError as e:
+        sync_client.close()
+        pytest.skip(f"MongoDB not reachable: {e}")
+    name = f"finmar_test_{uuid.uuid4().hex[:12]}"
+    try:
+        yield MongoTestDatabase(url, name, hello, monkeypatch)
+    finally:
+        sync_client.drop_database(name)
+        sync_client.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Admin Bulk Actions
+Checks that bulk writes derive counter deltas from the state each write replaced
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+
+def stale_first_read(monkeypatch, stale):
+    """Make the first find_existing return stale documents, as if a writer raced the bulk action"""
+    real = server.find_existing
+    calls = []
+
+    async def find_existing(collection, field, ids, fields=()):
+        calls.append(ids)
+        if len(calls) == 1:
+            return stale
+        return await real(collection, field, ids, fields)
+
+    monkeypatch.setattr(server, "find_existing", find_existing)
+
+
+class TestBulkSubscriptions:
+    """Tests for bulk subscription status updates"""
+
+    def test_deltas_follow_the_state_actually_replaced(self, mongo_db, monkeypatch):
+        """Test that a subscription activated after the bulk read is still counted as leaving active"""
+        stale_first_read(monkeypatch, {
+            "sub_1": {"subscription_id": "sub_1", "status": "pending", "plan_type": "accounting", "plan_tier": "starter"},
+            "sub_2": {"subscription_id": "sub_2", "status": "active", "plan_type": "accounting", "plan_tier": "starter"},
+        })
+
+        async def run(db):
+            await db.subscriptions.insert_many([
+                {"subscription_id": "sub_1", "status": "active", "plan_type": "accounting", "plan_tier": "starter"},
+                {"subscription_id": "sub_2", "status": "active", "plan_type": "accounting", "plan_tier": "starter"},
+            ])
+            response = await server.bulk_update_subscriptions(
+                server.BulkSubscriptionUpdate(subscription_ids=["sub_1", "sub_2", "sub_9"], status="cancelled"), None
+            )
+            metrics = await db.business_metrics.find_one({"_id": server.METRICS_DOC_ID})
+            statuses = await db.subscriptions.distinct("status")
+            return response, metrics, statuses
+
+        response, metrics, statuses = mongo_db.run(run)
+
+        assert [result["result"] for result in response["results"]] == ["updated", "updated", "not_found"]
+        assert statuses == ["cancelled"]
+        assert metrics["active_subscriptions"] == -2
+        assert metrics["subscription_by_type"]["accounting"] == -2
+
+
+class TestBulkContacts:
+    """Tests for bulk contact actions"""
+
+    def test_delete_counts_each_contact_once(self, mongo_db):
+        """Test that bulk deletes adjust counters by what was actually deleted"""
+        async def run(db):
+            await db.contacts.insert_many([
+                {"contact_id": "c1", "status": "new"}, {"contact_id": "c2", "status": "new"},
+                {"contact_id": "c3", "status": "replied"},
+            ])
+            await server.bulk_contact_action(
+                server.BulkContactAction(contact_ids=["c1", "c2", "c3"], action="delete"), None
+            )
+            return await db.business_metrics.find_one({"_id": server.METRICS_DOC_ID}), await db.contacts.count_documents({})
+
+        metrics, remaining = mongo_db.run(run)
+
+        assert remaining == 0
+        assert (metrics["new_contacts"], metrics["total_contacts"]) == (-2, -3)
+
+
+
+class TestBulkUsers:
+    """Tests for cascading user deletes"""
+
+    def test_contacts_match_email_ignoring_case(self, mongo_db):
+        """Test that a user's contacts are deleted whatever case the email was typed in"""
+        async def run(db):
+            await db.users.insert_one({"user_id": "user_1", "email": "Ann@Example.com"})
+            await db.contacts.insert_many([
+                {"contact_id": "c1", "email": "ann@example.com", "status": "new"},
+                {"contact_id": "c2", "email": "ANN@EXAMPLE.COM", "status": "replied"},
+                {"contact_id": "c3", "email": "bob@example.com", "status": "new"},
+            ])
+            result = await server.cascade_delete_users(["user_1"])
+            return result, await db.contacts.distinct("contact_id")
+
+        result, remaining = mongo_db.run(run)
+
+        assert result["deleted"]["contacts"] == 2
+        assert remaining == ["c3"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Admin List Cursors
+Checks that keyset cursors round-trip and that crafted cursors are rejected
+"""
+
+import pytest
+import base64
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from fastapi import HTTPException
+
+import server
+
+
+def crafted_cursor(created_at, last_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, last_id]).encode()).decode()
+
+
+class TestListCursor:
+    """Tests for keyset_query"""
+
+    def test_cursor_round_trip(self):
+        """Test that a cursor from the last row restricts to rows after it"""
+        cursor = server.encode_list_cursor({"created_at": "2026-05-01T00:00:00+00:00", "user_id": "user_9"}, "user_id")
+
+        query = server.keyset_query({"status": "active"}, cursor, "user_id")
+
+        assert query["$and"][0] == {"status": "active"}
+        assert {"created_at": "2026-05-01T00:00:00+00:00", "user_id": {"$lt": "user_9"}} in query["$and"][1]["$or"]
+
+    def test_operator_injection_is_rejected(self):
+        """Test that cursor values which are not plain strings return 400"""
+        for cursor in (
+            crafted_cursor({"$ne": None}, "user_9"),
+            crafted_cursor("2026-05-01T00:00:00+00:00", {"$gt": ""}),
+            crafted_cursor(None, None),
+            "not-base64-json",
+        ):
+            with pytest.raises(HTTPException) as error:
+                server.keyset_query({}, cursor, "user_id")
+            assert error.value.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
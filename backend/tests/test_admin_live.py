@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Admin Live Feed
+Runs the shared change feed against a local single-node replica set
+(e.g. mongod --replSet rs0 followed by rs.initiate()). Requires MONGO_URL.
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017/?directConnection=true')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+
+@pytest.fixture
+def live_db(mongo_db):
+    """The shared throwaway database, skipping unless Mongo is a replica set"""
+    if not mongo_db.hello.get("setName"):
+        pytest.skip("Change streams need a replica set")
+    return mongo_db
+
+
+async def next_change(queue, write, timeout=10):
+    """Wait for the stream to open, perform write, and return the first event"""
+    await asyncio.sleep(1)
+    await write()
+    return await asyncio.wait_for(queue.get(), timeout)
+
+
+class TestLiveChangeEvent:
+    """Tests for turning change stream documents into admin deltas"""
+
+    def test_insert_carries_document_and_id(self):
+        """Test that an insert event exposes the public id and the document"""
+        change = {
+            "operationType": "insert",
+            "ns": {"db": "finmar", "coll": "contacts"},
+            "documentKey": {"_id": "abc"},
+            "fullDocument": {"_id": "abc", "contact_id": "contact_1", "status": "new"}
+        }
+
+        event = server.live_change_event(change)
+
+        assert event["collection"] == "contacts"
+        assert event["id"] == "contact_1"
+        assert event["document"] == {"contact_id": "contact_1", "status": "new"}
+
+    def test_update_carries_changed_fields(self):
+        """Test that an update event lists only what changed"""
+        change = {
+            "operationType": "update",
+            "ns": {"db": "finmar", "coll": "subscriptions"},
+            "documentKey": {"_id": "abc"},
+            "updateDescription": {"updatedFields": {"status": "cancelled"}, "removedFields": []},
+            "fullDocument": {"_id": "abc", "subscription_id": "sub_1", "status": "cancelled"}
+        }
+
+        event = server.live_change_event(change)
+
+        assert event["id"] == "sub_1"
+        assert event["fields"] == {"status": "cancelled"}
+
+    def test_delete_takes_id_from_pre_image(self):
+        """Test that a delete names the record from its pre-image, or falls back to None"""
+        change = {
+            "operationType": "delete",
+            "ns": {"db": "finmar", "coll": "contacts"},
+            "documentKey": {"_id": "abc"},
+            "fullDocumentBeforeChange": {"_id": "abc", "contact_id": "contact_gone"}
+        }
+
+        assert server.live_change_event(change)["id"] == "contact_gone"
+        del change["fullDocumentBeforeChange"]
+        event = server.live_change_event(change)
+        assert event["id"] is None
+        assert event["document_key"] == "abc"
+
+    def test_stats_invalidated_once_per_ttl(self, monkeypatch):
+        """Test that a burst of changes drops the dashboard snapshot only once"""
+        feed = server.ChangeFeed(server.LIVE_COLLECTIONS, 16)
+        dropped = []
+        monkeypatch.setattr(server.admin_stats_cache, "invalidate", dropped.append)
+
+        for _ in range(50):
+            feed.invalidate_stats()
+
+        assert dropped == ["dashboard"]
+
+
+class TestChangeFeed:
+    """Tests for the shared change stream against a replica set"""
+
+    def test_insert_reaches_subscriber(self, live_db):
+        """Test that a new contact is pushed to a connected admin"""
+        async def run(db):
+            feed = server.ChangeFeed(server.LIVE_COLLECTIONS, 16)
+            queue = feed.subscribe()
+            try:
+                return await next_change(queue, lambda: db.contacts.insert_one(
+                    {"contact_id": "contact_live", "status": "new"}
+                ))
+            finally:
+                feed.unsubscribe(queue)
+
+        event = live_db.run(run)
+
+        assert event["collection"] == "contacts"
+        assert event["operation"] == "insert"
+        assert event["id"] == "contact_live"
+
+    def test_user_secrets_are_not_pushed(self, live_db):
+        """Test that password hashes and search keys never leave the server"""
+        async def run(db):
+            feed = server.ChangeFeed(server.LIVE_COLLECTIONS, 16)
+            queue = feed.subscribe()
+            try:
+                return await next_change(queue, lambda: db.users.insert_one(
+                    {"user_id": "user_live", "password_hash": "x", "search_tokens": ["live"]}
+                ))
+            finally:
+                feed.unsubscribe(queue)
+
+        event = live_db.run(run)
+
+        assert event["id"] == "user_live"
+        assert "password_hash" not in event["document"]
+        assert "search_tokens" not in event["document"]
+
+    def test_one_stream_shared_by_subscribers(self, live_db):
+        """Test that several connections share one change stream task"""
+        async def run(db):
+            feed = server.ChangeFeed(server.LIVE_COLLECTIONS, 16)
+            first, second = feed.subscribe(), feed.subscribe()
+            task = feed.task
+            try:
+                await next_change(first, lambda: db.contacts.insert_one({"contact_id": "contact_shared"}))
+                event = await asyncio.wait_for(second.get(), 10)
+                return task, feed.task, event
+            finally:
+                feed.unsubscribe(first)
+                feed.unsubscribe(second)
+
+        task_before, task_after, event = live_db.run(run)
+
+        assert task_before is task_after
+        assert event["id"] == "contact_shared"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Subscription Analytics
+Runs the vectorized cohort, churn and plan-change computations on small hand-built histories,
+and checks that the MongoDB projection builds the same columns as the documents themselves
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import numpy as np
+
+import analytics
+import server
+
+
+def subscription(user_id, plan_type, plan_tier, amount, start, status="active", cancelled_at=None, ended_at=None):
+    return {
+        "user_id": user_id, "plan_type": plan_type, "plan_tier": plan_tier, "amount": amount,
+        "status": status, "start_date": f"{start}T00:00:00+00:00",
+        "cancelled_at": cancelled_at and f"{cancelled_at}T00:00:00+00:00",
+        "ended_at": ended_at and f"{ended_at}T00:00:00+00:00"
+    }
+
+
+HISTORY = [
+    # Signs up in January, upgrades in March, still active
+    subscription("u1", "business", "basic", 99.0, "2026-01-05", status="inactive", ended_at="2026-03-10"),
+    subscription("u1", "business", "premium", 199.0, "2026-03-10"),
+    # Signs up in January, cancels in February
+    subscription("u2", "business", "basic", 99.0, "2026-01-20", status="cancelled", cancelled_at="2026-02-15"),
+    # Signs up in February, downgrades in April (older row without ended_at), still active
+    subscription("u3", "personal", "premium", 59.0, "2026-02-01", status="inactive"),
+    subscription("u3", "personal", "basic", 29.0, "2026-04-02"),
+]
+
+
+PLAN_PRICES = {"business/basic": 99.0, "business/premium": 199.0, "personal/basic": 29.0, "personal/premium": 59.0}
+
+
+@pytest.fixture
+def columns():
+    return analytics.SubscriptionColumns.from_records(HISTORY)
+
+
+class TestSubscriptionAnalytics:
+    """Tests for the columnar analytics engine"""
+
+    def test_factorize_labels_are_sorted(self):
+        """Test that labels come out sorted, whatever the per-process string hash salt"""
+        values = ["u3", "u1", "u2", "u1", "u3"]
+
+        codes, labels = analytics.factorize(values)
+
+        assert list(labels) == ["u1", "u2", "u3"]
+        assert list(labels[codes]) == values
+
+    def test_factorize_keeps_distinct_values_apart(self):
+        """Test that every distinct value gets its own code, in first-seen order when unsorted"""
+        values = [f"user_{index:012x}" for index in range(50000)] * 2
+
+        codes, labels = analytics.factorize(values, sort=False)
+
+        assert len(labels) == 50000
+        assert labels[0] == "user_000000000000"
+        assert list(labels[codes]) == values
+
+    def test_missing_end_inferred_from_successor(self, columns):
+        """Test that a superseded subscription without ended_at ends when its successor starts"""
+        replaced = columns.reason == analytics.END_REPLACED
+
+        assert replaced.sum() == 2
+        assert analytics.month_label(columns.end[3]) == "2026-04"
+
+    def test_cohort_retention(self, columns):
+        """Test that each signup cohort's retention counts users, not subscriptions"""
+        cohorts = analytics.cohort_retention(columns, analytics.month_index("2026-05-01"), max_offset=6)
+
+        assert [c["cohort"] for c in cohorts] == ["2026-01", "2026-02"]
+        assert cohorts[0]["size"] == 2
+        assert cohorts[0]["retention"] == [1.0, 0.5, 0.5, 0.5, 0.5]
+        assert cohorts[1]["retention"] == [1.0, 1.0, 1.0, 1.0]
+
+    def test_churn_by_plan_type(self, columns):
+        """Test that only cancellations count as churn, not plan changes"""
+        churn = analytics.churn_by_group(
+            columns, columns.plan, columns.plan_labels, analytics.month_index("2026-05-01"), months=5
+        )
+
+        business = churn["business"]
+        assert business["months"] == ["2026-01", "2026-02", "2026-03", "2026-04", "2026-05"]
+        assert business["churned"] == [0, 1, 0, 0, 0]
+        assert business["active"][1] == 2
+        assert business["churn_rate"][1] == 0.5
+        assert sum(churn["personal"]["churned"]) == 0
+
+    def test_plan_change_flows(self, columns):
+        """Test that upgrades and downgrades follow the price difference"""
+        flows = analytics.plan_change_flows(columns)
+
+        assert flows["upgrades"] == 1
+        assert flows["downgrades"] == 1
+        pairs = {(f["from"], f["to"]): f["direction"] for f in flows["flows"]}
+        assert pairs[("business/basic", "business/premium")] == "upgrade"
+        assert pairs[("personal/premium", "personal/basic")] == "downgrade"
+
+    def test_empty_input(self):
+        """Test that no subscriptions gives empty results rather than errors"""
+        result = analytics.subscription_analytics(analytics.SubscriptionColumns.from_records([]), "2026-05-01")
+
+        assert result["subscriptions"] == 0
+        assert result["cohorts"] == []
+        assert result["plan_changes"]["flows"] == []
+
+    def test_mrr_movements(self, columns):
+        """Test that monthly MRR movements reconcile opening to closing MRR"""
+        mrr = analytics.monthly_recurring_revenue(columns, PLAN_PRICES, {})
+        history = analytics.mrr_movements(columns, mrr, analytics.month_index("2026-05-01"), months=5)
+
+        assert [m["new"] for m in history] == [198.0, 59.0, 0.0, 0.0, 0.0]
+        assert [m["expansion"] for m in history] == [0.0, 0.0, 100.0, 0.0, 0.0]
+        assert [m["contraction"] for m in history] == [0.0, 0.0, 0.0, 30.0, 0.0]
+        assert [m["churn"] for m in history] == [0.0, 99.0, 0.0, 0.0, 0.0]
+        for month in history:
+            assert month["opening_mrr"] + month["net_new"] == month["closing_mrr"]
+        assert history[-1]["closing_mrr"] == 228.0
+
+    def test_mrr_prices_add_ons_from_catalog(self):
+        """Test that add-ons recur and plans missing from the catalog use the charged amount"""
+        records = [
+            dict(subscription("u1", "business", "basic", 120.0, "2026-01-05"), add_ons=["crm", "unknown"]),
+            subscription("u2", "legacy", "gold", 45.0, "2026-01-05"),
+        ]
+        columns = analytics.SubscriptionColumns.from_records(records)
+
+        mrr = analytics.monthly_recurring_revenue(columns, PLAN_PRICES, {"crm": 20.0})
+
+        assert mrr.tolist() == [119.0, 45.0]
+
+    def test_mrr_projection_follows_billing_cycle(self):
+        """Test that renewals land on 30-day cycles from the next billing date, overdue ones included"""
+        records = [
+            dict(subscription("u1", "business", "basic", 99.0, "2026-01-05"), next_billing_date="2026-05-20T00:00:00+00:00"),
+            dict(subscription("u2", "business", "basic", 99.0, "2026-01-05"), next_billing_date="2026-04-10T00:00:00+00:00"),
+        ]
+        columns = analytics.SubscriptionColumns.from_records(records)
+        mrr = analytics.monthly_recurring_revenue(columns, PLAN_PRICES, {})
+
+        projection = analytics.mrr_projection(
+            columns, mrr, "2026-05-01", {"churn_rate": 0.1, "growth_rate": 0.0}, months=2
+        )
+
+        # u2 was due 2026-04-10 and next renews 2026-05-10, then 2026-06-09; u1 on 05-20 and 06-19
+        assert [month["renewals"] for month in projection] == [2, 2]
+        assert projection[0]["scheduled_revenue"] == 198.0
+        assert projection[1]["expected_revenue"] == 178.2
+        assert projection[1]["projected_mrr"] == 178.2
+
+
+class TestAnalyticsPipeline:
+    """Tests for the MongoDB projection feeding the columns"""
+
+    def test_projection_matches_records(self, mongo_db):
+        """Test that projected rows, timestamps as epoch seconds, build the same columns as from_records"""
+        records = [
+            dict(HISTORY[0], next_billing_date="2026-04-09T12:30:00.123456+00:00"),
+            *HISTORY[1:],
+            {"user_id": "u4", "plan_type": "business", "status": "active", "created_at": "2026-03-01T08:00:00+00:00"},
+        ]
+
+        async def run(db):
+            await db.subscriptions.insert_many([dict(record) for record in records])
+            return await db.subscriptions.aggregate(server.SUBSCRIPTION_ANALYTICS_PIPELINE).to_list(None)
+
+        rows = mongo_db.run(run)
+        projected = analytics.SubscriptionColumns(
+            *([row[field] for row in rows] for field in server.SUBSCRIPTION_ANALYTICS_FIELDS)
+        )
+        expected = analytics.SubscriptionColumns.from_records(records)
+
+        for name in ("start_second", "start", "end", "reason", "amount", "next_billing", "successor"):
+            assert np.array_equal(getattr(projected, name), getattr(expected, name)), name
+        assert list(projected.tier_labels) == list(expected.tier_labels)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
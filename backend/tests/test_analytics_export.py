@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Analytics Parquet Exports
+Checks that incremental exports resume exactly after the stored watermark
+and pick up rows changed since they were last exported
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def transaction(transaction_id, updated_at):
+    return {
+        "transaction_id": transaction_id, "amount": 99.0, "status": "completed",
+        "created_at": "2026-05-01T00:00:00+00:00", "updated_at": updated_at
+    }
+
+
+class TestIncrementalExport:
+    """Tests for export watermarks"""
+
+    def test_rows_sharing_the_watermark_timestamp_are_not_skipped(self, mongo_db, monkeypatch, tmp_path):
+        """Test that a row with the last exported timestamp but a later id is picked up next run"""
+        monkeypatch.setattr(server, "EXPORT_DIR", tmp_path)
+        same = "2026-05-01T10:00:00+00:00"
+
+        async def run(db):
+            await db.payment_transactions.insert_many([transaction("txn_a", same), transaction("txn_b", same)])
+            first = await server.export_collection("job_1", "payment_transactions", incremental=True)
+            await db.payment_transactions.insert_many([
+                transaction("txn_c", same), transaction("txn_d", "2026-05-01T11:00:00+00:00")
+            ])
+            second = await server.export_collection("job_2", "payment_transactions", incremental=True)
+            third = await server.export_collection("job_3", "payment_transactions", incremental=True)
+            return first, second, third
+
+        first, second, third = mongo_db.run(run)
+
+        assert first["rows"] == 2
+        assert second["rows"] == 2
+        assert third["rows"] == 0
+        exported = pq.read_table(tmp_path / second["files"][0]).column("transaction_id").to_pylist()
+        assert exported == ["txn_c", "txn_d"]
+
+    def test_changed_subscription_is_exported_again(self, mongo_db, monkeypatch, tmp_path):
+        """Test that cancelling an already exported subscription exports it again with its new status"""
+        monkeypatch.setattr(server, "EXPORT_DIR", tmp_path)
+
+        async def run(db):
+            await db.subscriptions.insert_one({
+                "subscription_id": "sub_1", "status": "active", "plan_type": "accounting", "plan_tier": "starter",
+                "amount": 99.0, "created_at": "2026-05-01T00:00:00+00:00", "updated_at": "2026-05-01T00:00:00+00:00"
+            })
+            first = await server.export_collection("job_1", "subscriptions", incremental=True)
+            await server.update_subscription("sub_1", "cancelled", None)
+            second = await server.export_collection("job_2", "subscriptions", incremental=True)
+            return first, second
+
+        first, second = mongo_db.run(run)
+
+        assert first["rows"] == 1
+        assert second["rows"] == 1
+        exported = pq.read_table(tmp_path / second["files"][0]).to_pylist()
+        assert [(row["subscription_id"], row["status"]) for row in exported] == [("sub_1", "cancelled")]
+
+    def test_watermark_on_another_field_triggers_a_full_export(self, mongo_db, monkeypatch, tmp_path):
+        """Test that a watermark stored for created_at does not bound the updated_at export"""
+        monkeypatch.setattr(server, "EXPORT_DIR", tmp_path)
+
+        async def run(db):
+            await db.users.insert_one({
+                "user_id": "user_1", "email": "a@example.com",
+                "created_at": "2026-04-01T00:00:00+00:00", "updated_at": "2026-05-01T00:00:00+00:00"
+            })
+            await db.export_watermarks.insert_one({
+                "_id": "users", "value": "2026-06-01T00:00:00+00:00", "last_id": "user_9", "field": "created_at"
+            })
+            return await server.export_collection("job_1", "users", incremental=True)
+
+        assert mongo_db.run(run)["rows"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Business Metrics Counters
+Checks the counter deltas and that reconciliation corrects drift without overwriting
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+
+class TestMetricDeltas:
+    """Tests for subscription counter deltas"""
+
+    def test_missing_plan_type_counts_as_unknown(self):
+        """Test that a subscription without a plan_type never produces a None key"""
+        deltas = server.subscription_metric_deltas([
+            {"status": "active", "plan_type": None, "amount": 0},
+            {"status": "active", "amount": 0},
+        ], 1)
+
+        assert deltas["subscription_by_type.unknown"] == 2
+        assert not any(field.endswith(".None") for field in deltas)
+
+
+class TestMrrMovements:
+    """Tests for MRR movement classification"""
+
+    def test_unchanged_mrr_is_no_movement(self):
+        """Test that no movement is recorded when MRR does not change"""
+        assert server.mrr_movement_deltas(0, 0) == {}
+        assert server.mrr_movement_deltas(99.0, 99.0) == {}
+        assert server.mrr_movement_deltas(0, 99.0) == {"new": 99.0}
+        assert server.mrr_movement_deltas(99.0, 49.0) == {"contraction": 50.0}
+        assert server.mrr_movement_deltas(99.0, 0) == {"churn": 99.0}
+
+
+class TestReconcile:
+    """Tests for reconcile_business_metrics"""
+
+    def test_drift_is_corrected_to_the_recount(self, mongo_db):
+        """Test that reconcile sets the stored counters to the recount"""
+        async def run(db):
+            await db.users.insert_many([{"user_id": "user_1"}, {"user_id": "user_2"}])
+            await db.subscriptions.insert_one({"status": "active", "plan_type": None, "amount": 0})
+            await db.contacts.insert_many([{"status": "new"}, {"status": "new"}, {"status": "replied"}])
+            await db.business_metrics.insert_one({
+                "_id": server.METRICS_DOC_ID,
+                "total_users": 5,
+                "subscription_by_type": {"starter": 1},
+            })
+
+            exact = await server.reconcile_business_metrics()
+            stored = await db.business_metrics.find_one({"_id": server.METRICS_DOC_ID})
+            return exact, stored
+
+        exact, stored = mongo_db.run(run)
+
+        assert exact["subscription_by_type"] == {"unknown": 1}
+        assert stored["total_users"] == 2
+        assert stored["active_subscriptions"] == 1
+        assert (stored["new_contacts"], stored["total_contacts"]) == (2, 3)
+        assert stored["subscription_by_type"] == {"starter": 0, "unknown": 1}
+        assert "reconciled_at" in stored
+
+    def test_write_during_recount_is_not_lost(self, mongo_db, monkeypatch):
+        """Test that a counter bump racing the recount forces a fresh recount instead of being undone"""
+        count_business_metrics = server.count_business_metrics
+        recounts = []
+
+        async def racing_count():
+            exact = await count_business_metrics()
+            if not recounts:
+                # A registration lands after the recount read the users collection
+                await server.db.users.insert_one({"user_id": "user_3"})
+                await server.bump_metrics({"total_users": 1})
+            recounts.append(exact["total_users"])
+            return exact
+
+        monkeypatch.setattr(server, "count_business_metrics", racing_count)
+
+        async def run(db):
+            await db.users.insert_many([{"user_id": "user_1"}, {"user_id": "user_2"}])
+            await db.business_metrics.insert_one({"_id": server.METRICS_DOC_ID, "total_users": 2, "version": 7})
+            await server.reconcile_business_metrics()
+            return await db.business_metrics.find_one({"_id": server.METRICS_DOC_ID})
+
+        stored = mongo_db.run(run)
+
+        assert recounts == [2, 3]
+        assert stored["total_users"] == 3
+        assert stored["version"] == 9
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test Suite for AI Chat History Search
+Tests GET /api/ai/chat-history/search and GET /api/admin/ai-chats/search on a deployed
+backend, and the highlighting helpers and search scoping locally
+"""
+
+import pytest
+import requests
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://biz-finmar.preview.emergentagent.com')
+
+class TestChatSearchAPI:
+    """Tests for the user-scoped chat search endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Setup test user and get auth token"""
+        self.base_url = f"{BASE_URL}/api"
+        self.test_email = f"test_search_{datetime.now().strftime('%H%M%S%f')}@example.com"
+
+        register_data = {
+            "email": self.test_email,
+            "password": "Test123!",
+            "name": "Search Test User"
+        }
+
+        response = requests.post(f"{self.base_url}/auth/register", json=register_data)
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+        else:
+            pytest.skip(f"Could not register test user: {response.text}")
+
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+
+    def test_search_without_auth(self):
+        """Test that search requires authentication"""
+        response = requests.get(f"{self.base_url}/ai/chat-history/search", params={"q": "gst"})
+
+        assert response.status_code == 401, f"Expected 401 without auth, got {response.status_code}"
+
+    def test_search_requires_query(self):
+        """Test that an empty query is rejected"""
+        response = requests.get(
+            f"{self.base_url}/ai/chat-history/search",
+            params={"q": " "},
+            headers=self.headers
+        )
+
+        assert response.status_code == 400, f"Expected 400 for empty query, got {response.status_code}"
+
+    def test_search_new_user_has_no_results(self):
+        """Test that a new user's search is scoped to their own (empty) history"""
+        response = requests.get(
+            f"{self.base_url}/ai/chat-history/search",
+            params={"q": "cash flow"},
+            headers=self.headers
+        )
+
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        assert data["results"] == []
+        assert data["query"] == "cash flow"
+
+    def test_admin_search_rejects_user_token(self):
+        """Test that the admin-wide search is not available to regular users"""
+        response = requests.get(
+            f"{self.base_url}/admin/ai-chats/search",
+            params={"q": "gst"},
+            headers=self.headers
+        )
+
+        assert response.status_code in [401, 403], f"Expected 401/403, got {response.status_code}"
+
+
+class TestHighlightSnippet:
+    """Tests for the search term helpers and highlight_snippet"""
+
+    def test_search_terms_drop_punctuation_and_single_letters(self):
+        """Test that a query splits into lowercase words of two or more characters"""
+        assert server._search_terms("GST & BAS: a quarterly-report?") == ["gst", "bas", "quarterly", "report"]
+
+    def test_term_stem_strips_common_suffixes(self):
+        """Test that suffixes are removed only when at least three characters remain"""
+        assert server._term_stem("invoicing") == "invoic"
+        assert server._term_stem("companies") == "compan"
+        assert server._term_stem("taxes") == "tax"
+        assert server._term_stem("lodged") == "lodg"
+        assert server._term_stem("reports") == "report"
+        assert server._term_stem("bas") == "bas"
+        assert server._term_stem("gst") == "gst"
+
+    def test_stemmed_matches_are_marked(self):
+        """Test that other forms of a query word are highlighted as Mongo's stemmed search matches them"""
+        snippet = server.highlight_snippet("Two invoices were invoiced late.", ["invoicing"])
+
+        assert snippet == "Two <mark>invoices</mark> were <mark>invoiced</mark> late."
+
+    def test_text_around_matches_is_escaped(self):
+        """Test that markup in stored chats is escaped and only <mark> tags are emitted"""
+        snippet = server.highlight_snippet('<script>alert("gst")</script> & GST due', ["gst"])
+
+        assert "<script>" not in snippet
+        assert snippet == (
+            '&lt;script&gt;alert(&quot;<mark>gst</mark>&quot;)&lt;/script&gt; &amp; <mark>GST</mark> due'
+        )
+
+    def test_markup_attached_to_a_match_is_escaped(self):
+        """Test that an XSS payload glued to a matching word cannot ride inside the <mark>"""
+        snippet = server.highlight_snippet("gst<img src=x onerror=alert(1)>", ["gst"])
+
+        assert snippet == "<mark>gst</mark>&lt;img src=x onerror=alert(1)&gt;"
+
+    def test_long_text_is_trimmed_around_the_first_match(self):
+        """Test that the excerpt keeps radius characters either side with ellipses"""
+        text = "a" * 50 + " cash flow " + "b" * 50
+
+        snippet = server.highlight_snippet(text, ["cash"], radius=5)
+
+        assert snippet == "…aaaa <mark>cash</mark> flow…"
+
+    def test_no_match_or_no_terms_gives_no_snippet(self):
+        """Test that fields without a match are left without a highlight"""
+        assert server.highlight_snippet("Nothing relevant here", ["gst"]) is None
+        assert server.highlight_snippet("GST is due", []) is None
+        assert server.highlight_snippet("", ["gst"]) is None
+
+
+class TestSearchChatsScoping:
+    """Tests for search_chats against MongoDB's text index"""
+
+    def test_user_search_is_scoped_and_admin_search_is_not(self, mongo_db):
+        """Test that a user only finds their own chats while the admin variant finds everyone's"""
+        async def run(db):
+            _, keys, options = next(spec for spec in server.INDEX_SPECS if spec[2].get("name") == "ai_chats_text")
+            await db.ai_chats.create_index(keys, **options)
+            await db.ai_chats.insert_many([
+                {"chat_id": "chat_a", "user_id": "user_a", "query": "When is GST due?", "response": "Lodge GST quarterly.", "created_at": "2026-01-01T00:00:00+00:00"},
+                {"chat_id": "chat_b", "user_id": "user_b", "query": "GST registration", "response": "Register for GST at $75k.", "created_at": "2026-01-02T00:00:00+00:00"},
+                {"chat_id": "chat_c", "user_id": "user_a", "query": "Cash flow tips", "response": "Invoice promptly.", "created_at": "2026-01-03T00:00:00+00:00"}
+            ])
+            own = await server.search_chats("gst", user_id="user_a")
+            everyone = await server.search_chats("gst")
+            return own, everyone
+
+        own, everyone = mongo_db.run(run)
+
+        assert [chat["chat_id"] for chat in own] == ["chat_a"]
+        assert own[0]["highlights"]["query"] == "When is <mark>GST</mark> due?"
+        assert sorted(chat["chat_id"] for chat in everyone) == ["chat_a", "chat_b"]
+
+    def test_query_without_terms_is_rejected(self):
+        """Test that a query with no searchable words is a 400 before any database call"""
+        with pytest.raises(server.HTTPException) as error:
+            asyncio.run(server.search_chats(" ? "))
+
+        assert error.value.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Client IP Resolution
+Checks which X-Forwarded-For hop the contact rate limiter keys on
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from starlette.requests import Request
+
+import server
+
+
+def request_from(peer, *forwarded):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+class TestClientIp:
+    """Tests for get_client_ip"""
+
+    def test_without_proxy_forwarded_header_is_ignored(self, monkeypatch):
+        """Test that a client cannot pick its own rate-limit key when no proxy is configured"""
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 0)
+
+        assert server.get_client_ip(request_from("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+
+    def test_uses_hop_added_by_trusted_proxy(self, monkeypatch):
+        """Test that spoofed hops to the left of the proxy's entry are ignored"""
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 1)
+
+        request = request_from("10.0.0.2", "1.2.3.4, 5.6.7.8", "198.51.100.9")
+
+        assert server.get_client_ip(request) == "198.51.100.9"
+
+    def test_counts_proxies_from_the_right(self, monkeypatch):
+        """Test that with two proxies the client is the second hop from the right"""
+        monkeypatch.setattr(server, "TRUSTED_PROXY_COUNT", 2)
+
+        assert server.get_client_ip(request_from("10.0.0.3", "9.9.9.9, 198.51.100.9, 10.0.0.2")) == "198.51.100.9"
+        # Fewer hops than proxies means the request skipped a proxy; fall back to the peer
+        assert server.get_client_ip(request_from("10.0.0.3", "198.51.100.9")) == "10.0.0.3"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
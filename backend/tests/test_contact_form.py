@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Contact Form Abuse Protection
+Tests duplicate suppression and rate limiting on POST /api/contact on a deployed backend,
+and the fingerprint, limiter and duplicate detector locally
+"""
+
+import pytest
+import requests
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from starlette.requests import Request
+
+import server
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://biz-finmar.preview.emergentagent.com')
+
+class TestContactFormProtection:
+    """Tests for the contact form duplicate detector and rate limiter"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Build a contact payload with a unique sender"""
+        self.base_url = f"{BASE_URL}/api"
+        self.contact_data = {
+            "name": "Contact Test",
+            "email": f"test_contact_{datetime.now().strftime('%H%M%S%f')}@example.com",
+            "service_interest": "accounting",
+            "message": "Please call me about BAS lodgement."
+        }
+
+    def test_duplicate_submission_collapses(self):
+        """Test that resubmitting the same content returns the original contact_id"""
+        first = requests.post(f"{self.base_url}/contact", json=self.contact_data)
+        if first.status_code == 429:
+            pytest.skip("Rate limited for this client IP")
+        assert first.status_code == 200, f"Expected 200, got {first.status_code}: {first.text}"
+
+        resubmit = dict(self.contact_data, message="  please call me about BAS   lodgement. ")
+        second = requests.post(f"{self.base_url}/contact", json=resubmit)
+
+        assert second.status_code == 200
+        assert second.json()["contact_id"] == first.json()["contact_id"]
+
+    def test_rate_limit_per_email(self):
+        """Test that one sender cannot flood the form with distinct messages"""
+        statuses = []
+        for i in range(6):
+            data = dict(self.contact_data, message=f"Distinct message number {i}")
+            statuses.append(requests.post(f"{self.base_url}/contact", json=data).status_code)
+
+        assert 429 in statuses, f"Expected a 429 after repeated submissions, got {statuses}"
+        assert statuses[-1] == 429
+
+    def test_rate_limited_response_has_retry_after(self):
+        """Test that rejected submissions tell the client when to retry"""
+        response = None
+        for i in range(6):
+            data = dict(self.contact_data, message=f"Retry header message {i}")
+            response = requests.post(f"{self.base_url}/contact", json=data)
+            if response.status_code == 429:
+                break
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+
+    def test_contact_metrics_requires_admin(self):
+        """Test that contact rejection metrics are admin-only"""
+        response = requests.get(f"{self.base_url}/admin/contact/metrics")
+
+        assert response.status_code == 401, f"Expected 401 without auth, got {response.status_code}"
+
+
+def contact(**fields):
+    return server.ContactRequest(**{
+        "name": "Contact Test",
+        "email": "contact@example.com",
+        "service_interest": "accounting",
+        "message": "Please call me about BAS lodgement.",
+        **fields
+    })
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+class TestContactFormHelpers:
+    """Tests for the fingerprint, rate limiter and duplicate detector"""
+
+    def test_fingerprint_ignores_case_and_whitespace(self):
+        """Test that trivially edited resubmits share a fingerprint and real edits do not"""
+        original = server.contact_fingerprint(contact())
+
+        assert server.contact_fingerprint(contact(
+            name="  contact TEST ", email="Contact@Example.com", message="  please call me about BAS   lodgement. "
+        )) == original
+        assert server.contact_fingerprint(contact(message="Please call me about payroll.")) != original
+
+    def test_limiter_rejects_past_the_limit_until_the_window_slides(self, clock):
+        """Test that a key gets limit hits per window and a retry-after for the oldest hit"""
+        limiter = server.SlidingWindowRateLimiter(limit=2, window_seconds=60)
+
+        assert limiter.hit("1.2.3.4") == 0
+        clock.now += 10
+        assert limiter.hit("1.2.3.4") == 0
+        assert limiter.hit("1.2.3.4") == 50
+        assert limiter.hit("5.6.7.8") == 0
+        clock.now += 50
+        assert limiter.hit("1.2.3.4") == 0
+
+    def test_limiter_prunes_idle_keys_when_full(self, clock):
+        """Test that the key table stays bounded by dropping keys with no hits in the window"""
+        limiter = server.SlidingWindowRateLimiter(limit=1, window_seconds=60, max_keys=2)
+        limiter.hit("a")
+        limiter.hit("b")
+        clock.now += 61
+
+        limiter.hit("c")
+
+        assert set(limiter.hits) == {"c"}
+
+    def test_duplicates_expire_after_the_ttl(self, clock):
+        """Test that a remembered fingerprint maps to its contact until the TTL passes"""
+        detector = server.DuplicateDetector(ttl_seconds=600)
+        detector.remember("fingerprint", "contact_1")
+
+        clock.now += 599
+        assert detector.get("fingerprint") == "contact_1"
+        clock.now += 1
+        assert detector.get("fingerprint") is None
+        assert len(detector.seen) == 0
+
+
+class TestSubmitContact:
+    """Tests for submit_contact against MongoDB"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_limits(self, monkeypatch):
+        monkeypatch.setattr(server, "contact_ip_limiter", server.SlidingWindowRateLimiter(5, 3600))
+        monkeypatch.setattr(server, "contact_email_limiter", server.SlidingWindowRateLimiter(3, 3600))
+        monkeypatch.setattr(server, "contact_duplicates", server.DuplicateDetector(600))
+        # The admin notification is not under test; close it instead of leaving it to the loop
+        monkeypatch.setattr(server.task_supervisor, "spawn", lambda kind, coro: coro.close())
+
+    @staticmethod
+    def request(ip="203.0.113.7"):
+        return Request({"type": "http", "headers": [], "client": (ip, 50000)})
+
+    def test_resubmit_returns_the_original_contact(self, mongo_db):
+        """Test that a duplicate collapses onto the first contact without a second write"""
+        async def run(db):
+            first = await server.submit_contact(contact(), self.request())
+            second = await server.submit_contact(contact(message="please call me about  BAS lodgement."), self.request())
+            return first, second, await db.contacts.count_documents({})
+
+        first, second, stored = mongo_db.run(run)
+
+        assert second["contact_id"] == first["contact_id"]
+        assert stored == 1
+
+    def test_sender_past_the_email_limit_gets_retry_after(self, mongo_db):
+        """Test that distinct messages from one sender are rate limited with a Retry-After"""
+        async def run(db):
+            for i in range(3):
+                await server.submit_contact(contact(message=f"Distinct message {i}"), self.request(f"203.0.113.{i}"))
+            with pytest.raises(server.HTTPException) as error:
+                await server.submit_contact(contact(message="One too many"), self.request("203.0.113.9"))
+            return error.value, await db.contacts.count_documents({})
+
+        error, stored = mongo_db.run(run)
+
+        assert error.status_code == 429
+        assert int(error.headers["Retry-After"]) > 0
+        assert stored == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Email Outbox
+Runs the outbox workers' claim/deliver cycle against a local fake mail sink
+that stands in for the Resend batch API. The outbox tests also need a reachable MONGO_URL.
+"""
+
+import pytest
+import asyncio
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import resend
+import server
+
+
+class FakeMailSink:
+    """Minimal stand-in for POST /emails/batch"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail_next = 0
+        self.missing_ids = 0
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if sink.fail_next:
+                    sink.fail_next -= 1
+                    payload = {"statusCode": 500, "name": "application_error", "message": "Sink unavailable"}
+                    self.send_response(500)
+                else:
+                    sink.batches.append(body)
+                    payload = {"data": [{"id": f"fake_{len(sink.batches)}_{i}"} for i in range(len(body) - sink.missing_ids)]}
+                    self.send_response(200)
+                data = json.dumps(payload).encode()
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    fake = FakeMailSink()
+    monkeypatch.setattr(resend, "api_url", fake.url)
+    monkeypatch.setattr(resend, "api_key", "re_test_key")
+    yield fake
+    fake.close()
+
+
+class TestEmailOutbox:
+    """Tests for outbox delivery, batching and retry"""
+
+    def test_batch_send_reaches_sink(self, sink):
+        """Test that a batch is sent in one provider call through the dedicated executor"""
+        params = [
+            {"from": "a@example.com", "to": ["admin@example.com"], "subject": f"Test {i}", "html": "<p>Hi</p>"}
+            for i in range(3)
+        ]
+
+        provider_ids = asyncio.run(server.send_email_batch(params))
+
+        assert len(sink.batches) == 1
+        assert [email["subject"] for email in sink.batches[0]] == ["Test 0", "Test 1", "Test 2"]
+        assert provider_ids == ["fake_1_0", "fake_1_1", "fake_1_2"]
+
+    def test_outbox_delivers_queued_emails(self, sink, mongo_db):
+        """Test that queued emails are claimed and sent as a single batch"""
+        async def run(db):
+            for i in range(5):
+                await server.enqueue_email(["admin@example.com"], f"Queued {i}", "<p>Body</p>")
+            handled = await server.process_outbox_once("test_worker")
+            statuses = await db.email_outbox.distinct("status")
+            return handled, statuses
+
+        handled, statuses = mongo_db.run(run)
+
+        assert handled == 5
+        assert len(sink.batches) == 1
+        assert len(sink.batches[0]) == 5
+        assert statuses == ["sent"]
+
+    def test_outbox_retries_with_backoff(self, sink, mongo_db):
+        """Test that a failed batch is rescheduled instead of lost"""
+        sink.fail_next = 1
+
+        async def run(db):
+            email_id = await server.enqueue_email(["admin@example.com"], "Retry me", "<p>Body</p>")
+            await server.process_outbox_once("test_worker")
+            return await db.email_outbox.find_one({"email_id": email_id})
+
+        email = mongo_db.run(run)
+
+        assert email["status"] == "pending"
+        assert email["attempts"] == 1
+        assert email["next_attempt_at"] > datetime.now(timezone.utc).isoformat()
+        assert sink.batches == []
+
+    def test_outbox_gives_up_after_max_attempts(self, sink, mongo_db, monkeypatch):
+        """Test that an email is marked failed once it runs out of attempts"""
+        monkeypatch.setattr(server, "EMAIL_MAX_ATTEMPTS", 1)
+        sink.fail_next = 1
+
+        async def run(db):
+            email_id = await server.enqueue_email(["admin@example.com"], "Give up", "<p>Body</p>")
+            await server.process_outbox_once("test_worker")
+            return await db.email_outbox.find_one({"email_id": email_id})
+
+        email = mongo_db.run(run)
+
+        assert email["status"] == "failed"
+        assert "Sink unavailable" in email["last_error"]
+
+    def test_outcome_is_not_written_over_a_newer_claim(self, sink, mongo_db):
+        """Test that a worker whose claim went stale does not overwrite the new owner's status"""
+        async def run(db):
+            email_id = await server.enqueue_email(["admin@example.com"], "Reclaimed", "<p>Body</p>")
+            batch = await server.claim_outbox_batch("slow_worker")
+            await db.email_outbox.update_one({"email_id": email_id}, {"$set": {"claim_id": "other_worker_claim"}})
+            await server.deliver_outbox_batch(batch)
+            return await db.email_outbox.find_one({"email_id": email_id})
+
+        email = mongo_db.run(run)
+
+        assert len(sink.batches) == 1
+        assert email["status"] == "sending"
+        assert email["claim_id"] == "other_worker_claim"
+
+    def test_short_provider_response_still_settles_the_batch(self, sink, mongo_db):
+        """Test that a response with fewer ids than emails leaves nothing in sending"""
+        sink.missing_ids = 1
+
+        async def run(db):
+            for i in range(3):
+                await server.enqueue_email(["admin@example.com"], f"Short {i}", "<p>Body</p>")
+            await server.process_outbox_once("test_worker")
+            return await db.email_outbox.find({}, {"_id": 0, "status": 1, "provider_id": 1}).to_list(None)
+
+        emails = mongo_db.run(run)
+
+        assert [email["status"] for email in emails] == ["sent"] * 3
+        assert [email["provider_id"] for email in emails] == [None] * 3
+
+
+
+class TestEmailTemplates:
+    """Tests for the shared email layout"""
+
+    def test_footer_year_is_current_at_render(self, monkeypatch):
+        """Test that a long-running process stamps each email with the year it is sent in"""
+        class NewYear(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(2031, 1, 1, tzinfo=tz)
+
+        monkeypatch.setattr(server, "datetime", NewYear)
+
+        assert "© 2031 FINMAR" in server.render_email("new_user", name="Ann", email="ann@example.com")
+
+
+class TestNotificationDigest:
+    """Tests for digest admission and the persisted digest buffer"""
+
+    def test_sends_immediately_without_flusher(self):
+        """Test that nothing is buffered when no flusher would ever drain it"""
+        digest = server.NotificationDigest(300, threshold=1, max_events=10)
+
+        assert [digest.admit("new_user") for _ in range(5)] == ["send"] * 5
+
+    def test_buffer_is_capped_per_window(self):
+        """Test that a burst past the cap is dropped instead of growing without bound"""
+        digest = server.NotificationDigest(300, threshold=1, max_events=2)
+        digest.flusher_running = True
+
+        decisions = [digest.admit("new_contact") for _ in range(5)]
+
+        assert decisions == ["send", "buffer", "buffer", "drop", "drop"]
+        assert digest.stats["dropped"] == 2
+
+    def test_buffered_events_flush_through_outbox(self, mongo_db, monkeypatch):
+        """Test that buffered events are persisted and leave only once the digest is queued"""
+        digest = server.NotificationDigest(300, threshold=1, max_events=10)
+        digest.flusher_running = True
+        monkeypatch.setattr(server, "notification_digest", digest)
+        monkeypatch.setattr(server, "RESEND_API_KEY", "re_test_key")
+
+        async def run(db):
+            for i in range(3):
+                await server.notify_new_contact(f"Person {i}", f"p{i}@example.com", "accounting", "Hello")
+            buffered = await db.notification_digest.count_documents({})
+            await server.flush_notification_digest()
+            subjects = await db.email_outbox.distinct("subject")
+            return buffered, subjects, await db.notification_digest.count_documents({})
+
+        buffered, subjects, remaining = mongo_db.run(run)
+
+        assert buffered == 2
+        assert "[FINMAR Admin] Activity Digest: 2 events" in subjects
+        assert remaining == 0
+
+    def test_digest_counts_events_dropped_past_the_cap(self, mongo_db, monkeypatch):
+        """Test that events dropped once the digest is full still show up as "+N more" """
+        digest = server.NotificationDigest(300, threshold=1, max_events=2)
+        digest.flusher_running = True
+        monkeypatch.setattr(server, "notification_digest", digest)
+        monkeypatch.setattr(server, "RESEND_API_KEY", "re_test_key")
+
+        async def run(db):
+            for i in range(6):
+                await server.notify_new_contact(f"Person {i}", f"p{i}@example.com", "accounting", "Hello")
+            await server.notify_new_user("Late User", "late@example.com")
+            await server.flush_notification_digest()
+            return await db.email_outbox.find_one({"subject": {"$regex": "Activity Digest"}}, {"_id": 0})
+
+        email = mongo_db.run(run)
+
+        assert email["subject"] == "[FINMAR Admin] Activity Digest: 6 events"
+        assert "New Contact Inquiries (5)" in email["html"]
+        assert "+3 more (3 arrived after the digest was full)" in email["html"]
+        assert "New User Registrations (1)" in email["html"]
+        assert digest.overflow == {}
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
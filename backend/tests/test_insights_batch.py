@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Precomputed Insights Batch
+Checks job leases across workers and the per-run throughput report
+"""
+
+import pytest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+
+def leased_job(job_id, expires_in, **fields):
+    now = datetime.now(timezone.utc)
+    return {
+        "job_id": job_id,
+        "kind": "insights_batch",
+        "status": "running",
+        "progress": {},
+        "checkpoint": None,
+        "lease_owner": "insights_other",
+        "lease_expires_at": (now + timedelta(seconds=expires_in)).isoformat(),
+        "created_at": now.isoformat(),
+        **fields
+    }
+
+
+async def create_running_index(db):
+    """The unique partial index that allows one running insights job"""
+    for collection, keys, options in server.INDEX_SPECS:
+        if options.get("name") == "jobs_one_running_insights_batch":
+            await db[collection].create_index(keys, **options)
+
+
+class TestInsightsLease:
+    """Tests for claiming insights jobs"""
+
+    def test_concurrent_claims_create_one_job(self, mongo_db):
+        """Test that two workers claiming at once end up with a single running job"""
+        async def run(db):
+            await create_running_index(db)
+            claims = await server.asyncio.gather(*(server.claim_insights_job(resume=True) for _ in range(2)))
+            return claims, await db.jobs.count_documents({"status": "running"})
+
+        claims, running = mongo_db.run(run)
+
+        assert sum(claim is not None for claim in claims) == 1
+        assert running == 1
+
+    def test_nightly_run_starts_a_fresh_job(self, mongo_db, monkeypatch):
+        """Test that the nightly run does not resume an old job from its checkpoint"""
+        async def run(db):
+            await create_running_index(db)
+            await db.jobs.insert_one(leased_job("job_old", -60, status="interrupted", checkpoint="sub_5"))
+            claimed = await server.claim_insights_job(resume=False, params={"run_key": "2026-10-19"})
+            old = await db.jobs.find_one({"job_id": "job_old"})
+            return claimed, old
+
+        claimed, old = mongo_db.run(run)
+
+        assert claimed["job_id"] != "job_old"
+        assert claimed["checkpoint"] is None
+        assert claimed["params"]["run_key"] == "2026-10-19"
+        assert old["status"] == "interrupted"
+
+    def test_live_lease_is_not_resumed(self, mongo_db):
+        """Test that a job another worker is renewing is neither resumed nor duplicated"""
+        async def run(db):
+            await create_running_index(db)
+            await db.jobs.insert_one(leased_job("job_live", 60))
+            claimed = await server.start_insights_batch(resume=True)
+            return claimed, await db.jobs.count_documents({})
+
+        claimed, jobs = mongo_db.run(run)
+
+        assert claimed is None
+        assert jobs == 1
+
+    def test_expired_lease_is_resumed_with_run_rate(self, mongo_db, monkeypatch):
+        """Test that an abandoned job is taken over and its rate counts only this run"""
+        async def fake_response(session_id, text):
+            return "insight"
+
+        monkeypatch.setattr(server, "generate_ai_response", fake_response)
+
+        async def run(db):
+            await create_running_index(db)
+            await db.jobs.insert_one(leased_job("job_dead", -60, progress={"processed": 1000, "failed": 0, "skipped": 0}))
+            await db.users.insert_many([{"user_id": "user_1"}, {"user_id": "user_2"}])
+            await db.subscriptions.insert_many([
+                {"subscription_id": f"sub_{i}", "user_id": f"user_{i}", "status": "active", "plan_type": "finance", "plan_tier": "starter"}
+                for i in (1, 2)
+            ])
+            claimed = await server.start_insights_batch(resume=True)
+            return claimed, await db.jobs.find_one({"job_id": "job_dead"})
+
+        claimed, job = mongo_db.run(run)
+
+        assert claimed["job_id"] == "job_dead"
+        assert claimed["lease_owner"] != "insights_other"
+        assert job["status"] == "completed"
+        assert job["lease_expires_at"] is None
+        assert job["report"]["processed"] == 1002
+        assert job["report"]["run"]["processed"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the App Lifespan
+Enters the lifespan through TestClient with the startup work stubbed out
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+class TestLifespan:
+    """Tests for startup and shutdown ordering"""
+
+    def test_drains_supervised_tasks_before_closing_the_client(self, monkeypatch):
+        """Test that shutdown drains background work while MongoDB is still open"""
+        events = []
+
+        async def startup_tasks():
+            events.append("startup")
+
+        async def drain(timeout):
+            events.append("drain")
+            return {"cancelled": 0}
+
+        class Executor:
+            def shutdown(self, wait):
+                events.append("executor")
+
+        class Client:
+            def close(self):
+                events.append("close")
+
+        monkeypatch.setattr(server, "startup_tasks", startup_tasks)
+        monkeypatch.setattr(server, "RESEND_API_KEY", None)
+        monkeypatch.setattr(server, "background_services", [])
+        monkeypatch.setattr(server, "email_executor", Executor())
+        monkeypatch.setattr(server.task_supervisor, "drain", drain)
+        monkeypatch.setattr(server, "client", Client())
+
+        with TestClient(server.app) as client:
+            assert events == ["startup"]
+            assert client.get("/api/health").status_code == 200
+        assert events == ["startup", "drain", "executor", "close"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test Suite for MongoDB Command Monitoring
+Feeds pymongo command events to the listener directly, so no MongoDB server is needed
+"""
+
+import pytest
+import logging
+import os
+import sys
+from datetime import timedelta
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import mongo_monitor
+from mongo_monitor import CommandMonitor
+
+
+def run_command(monitor, command, milliseconds, request_id=1, succeeded=True):
+    """Deliver a started and a finished event for one command"""
+    name = next(iter(command))
+    monitor.started(monitoring.CommandStartedEvent(command, "finmar", request_id, ("db", 27017), request_id))
+    if succeeded:
+        monitor.succeeded(monitoring.CommandSucceededEvent(
+            timedelta(milliseconds=milliseconds), {"ok": 1}, name, request_id, ("db", 27017), request_id
+        ))
+    else:
+        monitor.failed(monitoring.CommandFailedEvent(
+            timedelta(milliseconds=milliseconds), {"ok": 0}, name, request_id, ("db", 27017), request_id
+        ))
+
+
+def find(**filter):
+    return {"find": "subscriptions", "filter": filter, "sort": {"created_at": -1}, "$db": "finmar", "lsid": {"id": 1}}
+
+
+class TestQueryShapes:
+    """Tests for query shape normalization and plan summaries"""
+
+    def test_literals_are_removed(self):
+        """Test that values, including $in lists, never reach the shape"""
+        shape = mongo_monitor.query_shape("find", find(user_id="u1", status={"$in": ["active", "pending"]}))
+
+        assert shape == '{"user_id":"?","status":{"$in":"?"}} sort {"created_at":-1}'
+        assert shape == mongo_monitor.query_shape("find", find(user_id="u2", status={"$in": ["cancelled"]}))
+
+    def test_logical_operators_and_pipelines(self):
+        """Test that $or branches keep their structure and only $match stages are expanded"""
+        command = {"aggregate": "users", "pipeline": [
+            {"$match": {"$or": [{"email": "a@b.com"}, {"name": "Ann"}]}},
+            {"$sort": {"created_at": -1}}, {"$skip": 40}, {"$limit": 20},
+        ]}
+
+        assert mongo_monitor.query_shape("aggregate", command) == \
+            '[{"$match":{"$or":[{"email":"?"},{"name":"?"}]}},"$sort","$skip","$limit"]'
+
+    def test_plan_summary(self):
+        """Test that the winning plan is found in an aggregate explain and collection scans are flagged"""
+        explain = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {
+            "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1"}
+        }}}}]}
+
+        summary = mongo_monitor.summarize_plan(explain)
+
+        assert summary["stages"] == ["FETCH", "IXSCAN"]
+        assert summary["indexes"] == ["user_id_1"]
+        assert not summary["collection_scan"]
+        assert mongo_monitor.summarize_plan({"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}})["collection_scan"]
+
+
+class TestCommandMonitor:
+    """Tests for the listener's statistics, route attribution and slow log"""
+
+    def test_stats_per_shape_and_route(self):
+        """Test that commands group by shape and remember which routes issued them"""
+        monitor = CommandMonitor(slow_ms=500)
+        monitor.route_of = lambda: "/api/subscriptions/current"
+        run_command(monitor, find(user_id="u1"), 4, request_id=1)
+        run_command(monitor, find(user_id="u2"), 6, request_id=2, succeeded=False)
+        monitor.route_of = lambda: None
+        run_command(monitor, find(user_id="u3"), 2, request_id=3)
+
+        shapes = monitor.snapshot()["shapes"]
+
+        assert len(shapes) == 1
+        assert shapes[0]["count"] == 3
+        assert shapes[0]["failures"] == 1
+        assert shapes[0]["avg_ms"] == 4.0
+        assert shapes[0]["routes"] == {"/api/subscriptions/current": 2, mongo_monitor.BACKGROUND_ROUTE: 1}
+        assert monitor.pending == {}
+
+    def test_slow_commands_are_explained_once_per_shape(self):
+        """Test that a slow shape is explained once and later entries reuse the plan"""
+        monitor = CommandMonitor(slow_ms=100)
+        explained = []
+        monitor.on_slow = lambda entry, command: (
+            explained.append(command), monitor.record_explain(entry, {"collection_scan": True})
+        )
+
+        run_command(monitor, find(user_id="u1"), 50, request_id=1)
+        run_command(monitor, find(user_id="u2"), 250, request_id=2)
+        run_command(monitor, find(user_id="u3"), 300, request_id=3)
+
+        slow = monitor.snapshot()["slow"]
+        assert [entry["duration_ms"] for entry in slow] == [300.0, 250.0]
+        assert all(entry["explain"] == {"collection_scan": True} for entry in slow)
+        assert len(explained) == 1
+        explain = mongo_monitor.explain_command(explained[0])
+        assert explain["explain"]["filter"] == {"user_id": "u2"}
+        assert "lsid" not in explain["explain"] and "$db" not in explain["explain"]
+
+    def test_server_commands_and_shape_limit(self):
+        """Test that commands without a collection are ignored and old shapes are evicted"""
+        monitor = CommandMonitor(slow_ms=500, shape_limit=2)
+        run_command(monitor, {"ping": 1}, 1, request_id=1)
+        for i, field in enumerate(("a", "b", "c")):
+            run_command(monitor, find(**{field: 1}), 1, request_id=10 + i)
+
+        shapes = [stats["shape"] for stats in monitor.snapshot(sort="count")["shapes"]]
+
+        assert len(shapes) == 2
+        assert not any('"a"' in shape for shape in shapes)
+
+    def test_slow_commands_are_logged_outside_the_lock(self, caplog):
+        """Test that the slow-command warning is emitted after the lock is released"""
+        monitor = CommandMonitor(slow_ms=100)
+        locked = []
+
+        class LockProbe(logging.Handler):
+            def emit(self, record):
+                locked.append(monitor.lock.locked())
+
+        probe = LockProbe()
+        mongo_monitor.logger.addHandler(probe)
+        try:
+            run_command(monitor, find(user_id="u1"), 250)
+        finally:
+            mongo_monitor.logger.removeHandler(probe)
+
+        assert locked == [False]
+        assert "Slow MongoDB find on subscriptions from background: 250ms" in caplog.text
+
+
+class TestCommandMetrics:
+    """Tests for the server's metric families fed by the monitor"""
+
+    def test_commands_reach_metrics_exposition(self, monkeypatch):
+        """Test that latency and route counters appear at /api/metrics"""
+        import server
+
+        monkeypatch.setattr(server.command_monitor, "route_of", lambda: "/api/admin/users")
+        run_command(server.command_monitor, {"find": "users", "filter": {"email": "a@b.com"}}, 3, request_id=99)
+
+        text = server.render_metrics()
+        assert 'mongodb_command_duration_seconds_count{collection="users",command="find"}' in text
+        assert 'mongodb_commands_total{route="/api/admin/users",collection="users",command="find",outcome="ok"}' in text
+        assert "a@b.com" not in text
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
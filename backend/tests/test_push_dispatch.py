@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Push Notification Dispatcher
+Sends through the APNs and FCM senders to a local fake push service. The fan-out
+and registry tests also need a reachable MONGO_URL.
+"""
+
+import pytest
+import asyncio
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone, timedelta
+
+import h2.config
+import h2.connection
+import h2.events
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+MESSAGE = {"title": "BAS due", "body": "Your BAS is due on the 28th", "data": {"screen": "compliance"}}
+
+
+class FakePushService:
+    """Minimal HTTP/2 (cleartext) stand-in for APNs and FCM.
+
+    Serves /3/device/<token> and /v1/projects/<id>/messages:send on one port. Tokens starting
+    with "dead" are unregistered, "bad" are malformed (FCM), "html" get an HTML error page
+    from an intermediary, and "flaky" get one 503 first.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.flaked = set()
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, "127.0.0.1", 0), self.loop
+        ).result()
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        streams = {}
+        while data := await reader.read(65535):
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    streams[event.stream_id] = (dict(event.headers), bytearray())
+                elif isinstance(event, h2.events.DataReceived):
+                    streams[event.stream_id][1].extend(event.data)
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    headers, body = streams.pop(event.stream_id)
+                    status, payload = self.respond(headers, json.loads(body))
+                    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode() if payload else b""
+                    conn.send_headers(event.stream_id, [
+                        (":status", str(status)), ("content-type", "application/json"), ("content-length", str(len(data)))
+                    ])
+                    conn.send_data(event.stream_id, data, end_stream=True)
+            writer.write(conn.data_to_send())
+            await writer.drain()
+        writer.close()
+
+    def respond(self, headers, body):
+        path = headers[":path"]
+        if path.startswith("/3/device/"):
+            platform, token = "apns", path.rsplit("/", 1)[1]
+        else:
+            platform, token = "fcm", body["message"]["token"]
+        self.requests.append((platform, token, headers, body))
+        if token.startswith("flaky") and token not in self.flaked:
+            self.flaked.add(token)
+            return 503, {}
+        if token.startswith("html"):
+            return 400, b"<html><body>400 Bad Request</body></html>"
+        if token.startswith("bad") and platform == "fcm":
+            return 400, {"error": {"status": "INVALID_ARGUMENT", "details": [
+                {"errorCode": "INVALID_ARGUMENT"},
+                {"fieldViolations": [{"field": "message.token", "description": "Invalid registration token"}]}
+            ]}}
+        if token.startswith("dead") and platform == "apns":
+            return 410, {"reason": "Unregistered"}
+        if token.startswith("dead"):
+            return 404, {"error": {"status": "NOT_FOUND", "details": [{"errorCode": "UNREGISTERED"}]}}
+        return 200, {"name": f"projects/test/messages/{token}"} if platform == "fcm" else {}
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def push_service(monkeypatch):
+    fake = FakePushService()
+    monkeypatch.setattr(server, "PUSH_RETRY_BASE_SECONDS", 0)
+    yield fake
+    fake.close()
+
+
+def token_doc(user_id, platform, token, days_ago=0):
+    seen = (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+    return {"user_id": user_id, "platform": platform, "token": token, "last_seen": seen, "updated_at": seen}
+
+
+def send(sender, tokens):
+    async def run():
+        try:
+            return await sender.send(tokens, MESSAGE)
+        finally:
+            await sender.close()
+    return asyncio.run(run())
+
+
+class TestPushDispatch:
+    """Tests for the per-service senders and the batched fan-out"""
+
+    def test_apns_request_and_pruning(self, push_service):
+        """Test that APNs requests carry the topic and alert, and 410s are marked invalid"""
+        results = send(server.ApnsSender(push_service.url, "au.com.finmar"), ["ios_a", "dead_ios"])
+
+        assert results["sent"] == ["ios_a"]
+        assert results["invalid"] == ["dead_ios"]
+        _, _, headers, body = next(r for r in push_service.requests if r[1] == "ios_a")
+        assert headers["apns-topic"] == "au.com.finmar"
+        assert body["aps"]["alert"]["title"] == "BAS due"
+        assert body["screen"] == "compliance"
+
+    def test_fcm_request_and_pruning(self, push_service):
+        """Test that FCM v1 messages target one token each and unregistered or malformed tokens are invalid"""
+        results = send(server.FcmSender(push_service.url, "finmar-test"), ["android_a", "dead_android", "bad_android"])
+
+        assert results["sent"] == ["android_a"]
+        assert results["invalid"] == ["dead_android", "bad_android"]
+        _, _, _, body = next(r for r in push_service.requests if r[1] == "android_a")
+        assert body["message"]["notification"]["body"] == MESSAGE["body"]
+        assert body["message"]["data"] == {"screen": "compliance"}
+
+    def test_transient_errors_are_retried(self, push_service):
+        """Test that a 503 is retried rather than counted as a failure"""
+        results = send(server.FcmSender(push_service.url, "finmar-test"), ["flaky_1"])
+
+        assert results["sent"] == ["flaky_1"]
+        assert [r[1] for r in push_service.requests] == ["flaky_1", "flaky_1"]
+
+    def test_non_json_errors_fail_one_token(self, push_service):
+        """Test that an HTML error page marks that token failed instead of aborting the batch"""
+        apns = send(server.ApnsSender(push_service.url, "au.com.finmar"), ["ios_a", "html_ios"])
+        fcm = send(server.FcmSender(push_service.url, "finmar-test"), ["android_a", "html_android"])
+
+        assert (apns["sent"], apns["failed"]) == (["ios_a"], ["html_ios"])
+        assert (fcm["sent"], fcm["failed"]) == (["android_a"], ["html_android"])
+
+    def test_concurrent_batch_delivers_every_token(self, push_service):
+        """Test that a large batch is delivered in full with bounded concurrency"""
+        tokens = [f"ios_{i}" for i in range(2000)]
+
+        results = send(server.ApnsSender(push_service.url, "au.com.finmar", concurrency=50), tokens)
+
+        assert len(results["sent"]) == 2000
+        assert len(push_service.requests) == 2000
+        # Multiplexed as HTTP/2 streams rather than one connection per request
+        assert push_service.connections <= server.PUSH_MAX_CONNECTIONS
+
+    def test_send_push_prunes_invalid_tokens(self, push_service, mongo_db, monkeypatch):
+        """Test that fan-out batches by platform, skips stale devices and deletes dead tokens"""
+        monkeypatch.setattr(server, "PUSH_BATCH_SIZE", 2)
+        fcm = server.FcmSender(push_service.url, "finmar-test")
+        monkeypatch.setattr(server, "push_senders", {
+            "ios": server.ApnsSender(push_service.url, "au.com.finmar"), "android": fcm, "web": fcm
+        })
+
+        async def run(db):
+            await db.push_tokens.insert_many([
+                token_doc("u1", "ios", "ios_u1"),
+                token_doc("u2", "android", "android_u2"),
+                token_doc("u3", "web", "dead_web"),
+                token_doc("u4", "ios", "dead_ios"),
+                token_doc("u5", "blackberry", "bb_u5"),
+                token_doc("u6", "ios", "ios_stale", days_ago=server.PUSH_TOKEN_STALE_DAYS + 1),
+            ])
+            try:
+                totals = await server.send_push(MESSAGE["title"], MESSAGE["body"], MESSAGE["data"])
+            finally:
+                await asyncio.gather(*(sender.close() for sender in set(server.push_senders.values())))
+            return totals, await db.push_tokens.distinct("token")
+
+        totals, remaining = mongo_db.run(run)
+
+        assert totals == {"sent": 2, "failed": 0, "pruned": 2, "skipped": 1}
+        assert sorted(remaining) == ["android_u2", "bb_u5", "ios_stale", "ios_u1"]
+        assert "ios_stale" not in {r[1] for r in push_service.requests}
+
+    def test_registry_dedupes_and_prunes_stale_tokens(self, mongo_db, monkeypatch):
+        """Test that duplicate tokens collapse to the latest owner and stale ones are pruned in batches"""
+        monkeypatch.setattr(server, "PUSH_PRUNE_BATCH_SIZE", 2)
+
+        async def run(db):
+            await db.push_tokens.insert_many([
+                dict(token_doc("old_owner", "ios", "shared", days_ago=2), last_seen=None),
+                dict(token_doc("new_owner", "ios", "shared", days_ago=1), last_seen=None),
+                *(token_doc(f"u{i}", "android", f"stale_{i}", days_ago=server.PUSH_TOKEN_STALE_DAYS + 1) for i in range(5)),
+                token_doc("u9", "android", "fresh"),
+            ])
+            await server.ensure_push_token_registry()
+            await server.ensure_indexes()
+            owners = await db.push_tokens.find({"token": "shared"}, {"_id": 0, "user_id": 1}).to_list(None)
+            removed = await server.prune_stale_push_tokens()
+            return owners, removed, await db.push_tokens.distinct("token")
+
+        owners, removed, remaining = mongo_db.run(run)
+
+        assert owners == [{"user_id": "new_owner"}]
+        assert removed == 5
+        assert sorted(remaining) == ["fresh", "shared"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
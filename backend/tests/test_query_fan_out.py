@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Query Fan-Out
+Checks that fan_out's timeout reaches real Motor operations as a pymongo deadline
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import _csot, monitoring
+from pymongo.errors import PyMongoError
+
+import server
+
+# Nothing listens on port 1, so server selection fails fast or waits out its deadline
+UNREACHABLE_URL = "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=30000"
+
+
+class CommandCapture(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class TestFanOut:
+    """Tests for fan_out timeouts"""
+
+    def test_factories_run_under_the_deadline(self):
+        """Test that each factory is called inside the pymongo deadline that becomes maxTimeMS"""
+        async def deadline():
+            return _csot.get_timeout()
+
+        results = asyncio.run(server.fan_out({"a": deadline, "b": deadline}, timeout=2.5))
+
+        assert results == {"a": 2.5, "b": 2.5}
+
+    def test_motor_operation_is_bounded_by_pymongo(self):
+        """Test that a Motor operation created by the factory is cut off by pymongo itself, not the backstop"""
+        async def run():
+            db = AsyncIOMotorClient(UNREACHABLE_URL)["finmar_test"]
+            started = time.perf_counter()
+            with pytest.raises(server.QueryTimeoutError) as error:
+                await server.fan_out({"users": lambda: db.users.count_documents({})}, timeout=0.3)
+            db.client.close()
+            return error.value, time.perf_counter() - started
+
+        error, elapsed = asyncio.run(run())
+
+        assert isinstance(error.__cause__, PyMongoError) and error.__cause__.timeout
+        assert elapsed < 0.3 + server.QUERY_TIMEOUT_BACKSTOP_SECONDS
+
+    def test_timeout_is_not_an_http_error(self):
+        """Test that background callers get a plain timeout, which endpoints map to 504"""
+        async def slow():
+            await asyncio.sleep(5)
+
+        with pytest.raises(server.QueryTimeoutError) as error:
+            asyncio.run(server.fan_out({"slow": slow}, timeout=0.05))
+
+        assert isinstance(error.value, TimeoutError)
+        response = asyncio.run(server.query_timeout_response(None, error.value))
+        assert response.status_code == 504
+        assert b"Query 'slow' timed out" in response.body
+
+    def test_max_time_ms_is_sent(self, mongo_db):
+        """Test that find, aggregate and count commands from fan_out carry maxTimeMS"""
+        capture = CommandCapture()
+
+        async def run(db):
+            client = AsyncIOMotorClient(mongo_db.url, event_listeners=[capture])
+            watched = client[mongo_db.name]
+            await watched.users.insert_one({"user_id": "user_1"})
+            capture.commands.clear()
+            try:
+                await server.fan_out({
+                    "count": lambda: watched.users.count_documents({}),
+                    "find": lambda: watched.users.find({}).to_list(10),
+                    "aggregate": lambda: watched.users.aggregate([{"$match": {}}]).to_list(10),
+                }, timeout=2)
+            finally:
+                client.close()
+
+        mongo_db.run(run)
+
+        assert len(capture.commands) == 3
+        assert all(0 < command["maxTimeMS"] <= 2000 for command in capture.commands)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Request Metrics
+Drives the app in-process and reads the Prometheus exposition at GET /api/metrics
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "")
+    # No context manager, so startup tasks (indexes, workers) do not run
+    return TestClient(server.app)
+
+
+def sample(text, line_prefix):
+    """Value of the first exposition line starting with line_prefix"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class TestRequestMetrics:
+    """Tests for the metrics middleware and exposition"""
+
+    def test_counts_requests_by_route_template(self, client):
+        """Test that path parameters collapse into the route template"""
+        before = sample(
+            client.get("/api/metrics").text,
+            'http_requests_total{method="GET",route="/api/admin/users/{user_id}",status="401"}'
+        )
+
+        for user_id in ("user_a", "user_b", "user_c"):
+            client.get(f"/api/admin/users/{user_id}")
+
+        text = client.get("/api/metrics").text
+        assert sample(text, 'http_requests_total{method="GET",route="/api/admin/users/{user_id}",status="401"}') == before + 3
+        assert "user_a" not in text
+
+    def test_unmatched_paths_share_one_label(self, client):
+        """Test that unknown paths cannot create new series"""
+        client.get("/api/no-such-route-12345")
+
+        text = client.get("/api/metrics").text
+        assert 'route="unmatched",status="404"' in text
+        assert "no-such-route-12345" not in text
+
+    def test_latency_and_size_histograms(self, client):
+        """Test that histograms are cumulative and consistent with their counts"""
+        client.get("/api/health")
+
+        text = client.get("/api/metrics").text
+        labels = '{method="GET",route="/api/health"'
+        count = sample(text, f"http_request_duration_seconds_count{labels}}}")
+        assert count >= 1
+        assert sample(text, f'http_request_duration_seconds_bucket{labels},le="+Inf"}}') == count
+        assert sample(text, f"http_response_size_bytes_sum{labels}}}") > 0
+        assert "# TYPE http_requests_in_flight gauge" in text
+
+    def test_metrics_token(self, client, monkeypatch):
+        """Test that a configured token is required to scrape"""
+        monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+
+        assert client.get("/api/metrics").status_code == 401
+        response = client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Admin User Search Keys
+Checks tokenization and the queries built from search strings
+"""
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finmar_test')
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+import server
+
+
+class TestUserSearch:
+    """Tests for search keys and search queries"""
+
+    def test_non_latin_and_accented_names_are_tokenized(self):
+        """Test that any script is searchable and accents fold away"""
+        keys = server.user_search_keys({"name": "José Müller", "business_name": "李小龙 Pty", "email": "jm@example.com"})
+
+        assert {"jose", "muller", "李小龙", "pty"} <= set(keys["search_tokens"])
+        assert server.user_search_query("josé", fuzzy=False) == {"search_tokens": {"$regex": "^jose"}}
+
+    def test_search_without_words_matches_nobody(self):
+        """Test that punctuation-only searches do not fall through to an unfiltered list"""
+        for search in ("@@", "--", "!"):
+            assert server.user_search_query(search, fuzzy=False) == server.USER_SEARCH_NO_MATCH
+            assert server.user_search_query(search, fuzzy=True) == server.USER_SEARCH_NO_MATCH
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,66 @@
+import { useEffect, useRef } from 'react';
+
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+
+// Listens to the admin Server-Sent Events feed and calls onChange with the batch of
+// deltas received in the last debounceMs. Uses fetch rather than EventSource so the
+// bearer token can be sent as a header; reconnects after errors.
+export const useAdminLiveFeed = (token, collections, onChange, debounceMs = 1000) => {
+    const handlerRef = useRef(onChange);
+    handlerRef.current = onChange;
+    const collectionsKey = collections.join(',');
+
+    useEffect(() => {
+        if (!token) return undefined;
+        const controller = new AbortController();
+        let pending = [];
+        let flushTimer;
+        let retryTimer;
+
+        const deliver = (event) => {
+            pending.push(event);
+            clearTimeout(flushTimer);
+            flushTimer = setTimeout(() => {
+                const events = pending;
+                pending = [];
+                handlerRef.current(events);
+            }, debounceMs);
+        };
+
+        const connect = async () => {
+            try {
+                const response = await fetch(`${API}/admin/live?collections=${collectionsKey}`, {
+                    headers: { Authorization: `Bearer ${token}` },
+                    signal: controller.signal
+                });
+                if (!response.ok) throw new Error(`Live feed failed: ${response.status}`);
+                const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                let buffer = '';
+                for (;;) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += value;
+                    const frames = buffer.split('\n\n');
+                    buffer = frames.pop();
+                    frames.forEach((frame) => {
+                        const data = frame.split('\n')
+                            .filter((line) => line.startsWith('data: '))
+                            .map((line) => line.slice(6))
+                            .join('\n');
+                        if (data) deliver(JSON.parse(data));
+                    });
+                }
+            } catch (error) {
+                if (controller.signal.aborted) return;
+            }
+            if (!controller.signal.aborted) retryTimer = setTimeout(connect, 5000);
+        };
+
+        connect();
+        return () => {
+            controller.abort();
+            clearTimeout(flushTimer);
+            clearTimeout(retryTimer);
+        };
+    }, [token, collectionsKey, debounceMs]);
+};
@@ -5,6 +5,7 @@ import { Badge } from '../../components/ui/badge';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../../components/ui/select';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '../../components/ui/dialog';
 import { useAdminAuth } from '../../context/AdminAuthContext';
+import { useAdminLiveFeed } from '../../hooks/use-admin-live-feed';
 import { toast } from 'sonner';
 import axios from 'axios';
 import { Loader2, ChevronLeft, ChevronRight, Trash2, Eye, Mail, Phone, Building2, MessageSquare } from 'lucide-react';
@@ -17,6 +18,7 @@ const AdminContactsPage = () => {
     const [loading, setLoading] = useState(true);
     const [filter, setFilter] = useState('all');
     const [page, setPage] = useState(0);
+    const [cursors, setCursors] = useState([null]);
     const [total, setTotal] = useState(0);
     const [selectedContact, setSelectedContact] = useState(null);
     const [showDetail, setShowDetail] = useState(false);
@@ -28,15 +30,18 @@ const AdminContactsPage = () => {
         fetchContacts();
     }, [page, filter]);
 
-    const fetchContacts = async () => {
-        setLoading(true);
+    useAdminLiveFeed(token, ['contacts'], () => fetchContacts(true));
+
+    const fetchContacts = async (silent = false) => {
+        if (!silent) setLoading(true);
         try {
             const response = await axios.get(`${API}/admin/contacts`, {
                 ...authHeaders,
-                params: { skip: page * limit, limit, status: filter !== 'all' ? filter : undefined }
+                params: { cursor: cursors[page] || undefined, limit, status: filter !== 'all' ? filter : undefined }
             });
             setContacts(response.data.contacts);
             setTotal(response.data.total);
+            setCursors(prev => [...prev.slice(0, page + 1), response.data.next_cursor]);
         } catch (error) {
             toast.error('Failed to fetch contacts');
         } finally {
@@ -99,7 +104,7 @@ const AdminContactsPage = () => {
                     <h1 className="font-heading text-3xl font-bold text-white">Contact Inquiries</h1>
                     <p className="text-slate-400 mt-1">{total} total inquiries</p>
                 </div>
-                <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); }}>
+                <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); setCursors([null]); }}>
                     <SelectTrigger className="w-40 bg-slate-800 border-slate-700 text-white">
                         <SelectValue placeholder="Filter" />
                     </SelectTrigger>
@@ -186,7 +191,7 @@ const AdminContactsPage = () => {
                                 <Button variant="outline" size="sm" disabled={page === 0} onClick={() => setPage(p => p - 1)} className="border-slate-700">
                                     <ChevronLeft className="w-4 h-4" />
                                 </Button>
-                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1} onClick={() => setPage(p => p + 1)} className="border-slate-700">
+                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1 || !cursors[page + 1]} onClick={() => setPage(p => p + 1)} className="border-slate-700">
                                     <ChevronRight className="w-4 h-4" />
                                 </Button>
                             </div>
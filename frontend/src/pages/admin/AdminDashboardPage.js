@@ -1,7 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { Card, CardContent, CardHeader, CardTitle } from '../../components/ui/card';
 import { useAdminAuth } from '../../context/AdminAuthContext';
+import { useAdminLiveFeed } from '../../hooks/use-admin-live-feed';
 import axios from 'axios';
 import {
     Users, CreditCard, MessageSquare, DollarSign, TrendingUp,
@@ -10,21 +11,32 @@ import {
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, LineChart, Line } from 'recharts';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+// The server caches dashboard stats for ADMIN_STATS_TTL_SECONDS (15s by default) and drops
+// the cache at most once per TTL, so one more fetch after it expires catches any late change
+const STATS_REFRESH_AFTER_MS = 16000;
 
 const AdminDashboardPage = () => {
     const { token } = useAdminAuth();
     const [stats, setStats] = useState(null);
     const [chartData, setChartData] = useState([]);
     const [loading, setLoading] = useState(true);
+    const trailingRefresh = useRef();
 
     const authHeaders = { headers: { Authorization: `Bearer ${token}` } };
 
     useEffect(() => {
         fetchData();
+        return () => clearTimeout(trailingRefresh.current);
     }, []);
 
-    const fetchData = async () => {
-        setLoading(true);
+    useAdminLiveFeed(token, ['contacts', 'subscriptions', 'payment_transactions', 'users'], () => {
+        fetchData(true);
+        clearTimeout(trailingRefresh.current);
+        trailingRefresh.current = setTimeout(() => fetchData(true), STATS_REFRESH_AFTER_MS);
+    });
+
+    const fetchData = async (silent = false) => {
+        if (!silent) setLoading(true);
         try {
             const [statsRes, chartRes] = await Promise.all([
                 axios.get(`${API}/admin/dashboard/stats`, authHeaders),
@@ -193,6 +205,20 @@ const AdminDashboardPage = () => {
                                         ${stats?.monthly_revenue?.toLocaleString() || 0}
                                     </span>
                                 </div>
+                                <div className="flex items-center justify-between mt-2">
+                                    <span className="text-slate-400">MRR</span>
+                                    <span className="text-xl font-bold text-finmar-gold">
+                                        ${stats?.mrr?.toLocaleString() || 0}
+                                    </span>
+                                </div>
+                                {stats?.mrr_movements && (
+                                    <div className="grid grid-cols-4 gap-2 mt-3 text-xs text-slate-400">
+                                        <span>New <span className="block text-green-400">+${stats.mrr_movements.new.toLocaleString()}</span></span>
+                                        <span>Expansion <span className="block text-green-400">+${stats.mrr_movements.expansion.toLocaleString()}</span></span>
+                                        <span>Contraction <span className="block text-amber-400">-${stats.mrr_movements.contraction.toLocaleString()}</span></span>
+                                        <span>Churn <span className="block text-red-400">-${stats.mrr_movements.churn.toLocaleString()}</span></span>
+                                    </div>
+                                )}
                             </div>
                         </CardContent>
                     </Card>
@@ -4,6 +4,7 @@ import { Button } from '../../components/ui/button';
 import { Badge } from '../../components/ui/badge';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../../components/ui/select';
 import { useAdminAuth } from '../../context/AdminAuthContext';
+import { useAdminLiveFeed } from '../../hooks/use-admin-live-feed';
 import { toast } from 'sonner';
 import axios from 'axios';
 import { Loader2, ChevronLeft, ChevronRight, CreditCard, Calendar, DollarSign } from 'lucide-react';
@@ -16,6 +17,7 @@ const AdminSubscriptionsPage = () => {
     const [loading, setLoading] = useState(true);
     const [filter, setFilter] = useState('all');
     const [page, setPage] = useState(0);
+    const [cursors, setCursors] = useState([null]);
     const [total, setTotal] = useState(0);
     const limit = 20;
 
@@ -25,15 +27,18 @@ const AdminSubscriptionsPage = () => {
         fetchSubscriptions();
     }, [page, filter]);
 
-    const fetchSubscriptions = async () => {
-        setLoading(true);
+    useAdminLiveFeed(token, ['subscriptions'], () => fetchSubscriptions(true));
+
+    const fetchSubscriptions = async (silent = false) => {
+        if (!silent) setLoading(true);
         try {
             const response = await axios.get(`${API}/admin/subscriptions`, {
                 ...authHeaders,
-                params: { skip: page * limit, limit, status: filter !== 'all' ? filter : undefined }
+                params: { cursor: cursors[page] || undefined, limit, status: filter !== 'all' ? filter : undefined }
             });
             setSubscriptions(response.data.subscriptions);
             setTotal(response.data.total);
+            setCursors(prev => [...prev.slice(0, page + 1), response.data.next_cursor]);
         } catch (error) {
             toast.error('Failed to fetch subscriptions');
         } finally {
@@ -78,7 +83,7 @@ const AdminSubscriptionsPage = () => {
                     <h1 className="font-heading text-3xl font-bold text-white">Subscriptions</h1>
                     <p className="text-slate-400 mt-1">{total} total subscriptions</p>
                 </div>
-                <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); }}>
+                <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); setCursors([null]); }}>
                     <SelectTrigger className="w-40 bg-slate-800 border-slate-700 text-white">
                         <SelectValue placeholder="Filter" />
                     </SelectTrigger>
@@ -167,7 +172,7 @@ const AdminSubscriptionsPage = () => {
                                     <ChevronLeft className="w-4 h-4" />
                                 </Button>
                                 <span className="text-slate-400 text-sm">Page {page + 1} of {totalPages}</span>
-                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1} onClick={() => setPage(p => p + 1)} className="border-slate-700">
+                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1 || !cursors[page + 1]} onClick={() => setPage(p => p + 1)} className="border-slate-700">
                                     <ChevronRight className="w-4 h-4" />
                                 </Button>
                             </div>
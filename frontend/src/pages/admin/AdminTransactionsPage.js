@@ -16,6 +16,7 @@ const AdminTransactionsPage = () => {
     const [loading, setLoading] = useState(true);
     const [filter, setFilter] = useState('all');
     const [page, setPage] = useState(0);
+    const [cursors, setCursors] = useState([null]);
     const [total, setTotal] = useState(0);
     const limit = 20;
 
@@ -30,10 +31,11 @@ const AdminTransactionsPage = () => {
         try {
             const response = await axios.get(`${API}/admin/transactions`, {
                 ...authHeaders,
-                params: { skip: page * limit, limit, status: filter !== 'all' ? filter : undefined }
+                params: { cursor: cursors[page] || undefined, limit, status: filter !== 'all' ? filter : undefined }
             });
             setTransactions(response.data.transactions);
             setTotal(response.data.total);
+            setCursors(prev => [...prev.slice(0, page + 1), response.data.next_cursor]);
         } catch (error) {
             toast.error('Failed to fetch transactions');
         } finally {
@@ -69,7 +71,7 @@ const AdminTransactionsPage = () => {
                         <p className="text-xs text-green-400">Page Revenue</p>
                         <p className="text-xl font-bold text-green-400">${totalRevenue.toLocaleString()}</p>
                     </div>
-                    <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); }}>
+                    <Select value={filter} onValueChange={(v) => { setFilter(v); setPage(0); setCursors([null]); }}>
                         <SelectTrigger className="w-40 bg-slate-800 border-slate-700 text-white">
                             <SelectValue placeholder="Filter" />
                         </SelectTrigger>
@@ -141,7 +143,7 @@ const AdminTransactionsPage = () => {
                                 <Button variant="outline" size="sm" disabled={page === 0} onClick={() => setPage(p => p - 1)} className="border-slate-700">
                                     <ChevronLeft className="w-4 h-4" />
                                 </Button>
-                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1} onClick={() => setPage(p => p + 1)} className="border-slate-700">
+                                <Button variant="outline" size="sm" disabled={page >= totalPages - 1 || !cursors[page + 1]} onClick={() => setPage(p => p + 1)} className="border-slate-700">
                                     <ChevronRight className="w-4 h-4" />
                                 </Button>
                             </div>
@@ -22,6 +22,7 @@ const AdminUsersPage = () => {
     const [loading, setLoading] = useState(true);
     const [search, setSearch] = useState('');
     const [page, setPage] = useState(0);
+    const [cursors, setCursors] = useState([null]);
     const [total, setTotal] = useState(0);
     const [selectedUser, setSelectedUser] = useState(null);
     const [userDetail, setUserDetail] = useState(null);
@@ -41,10 +42,11 @@ const AdminUsersPage = () => {
         try {
             const response = await axios.get(`${API}/admin/users`, {
                 ...authHeaders,
-                params: { skip: page * limit, limit, search: search || undefined }
+                params: { cursor: cursors[page] || undefined, limit, search: search || undefined }
             });
             setUsers(response.data.users);
             setTotal(response.data.total);
+            setCursors(prev => [...prev.slice(0, page + 1), response.data.next_cursor]);
         } catch (error) {
             toast.error('Failed to fetch users');
         } finally {
@@ -111,7 +113,7 @@ const AdminUsersPage = () => {
                     <Input
                         placeholder="Search users..."
                         value={search}
-                        onChange={(e) => { setSearch(e.target.value); setPage(0); }}
+                        onChange={(e) => { setSearch(e.target.value); setPage(0); setCursors([null]); }}
                         className="pl-10 bg-slate-800 border-slate-700 text-white"
                         data-testid="user-search-input"
                     />
@@ -226,7 +228,7 @@ const AdminUsersPage = () => {
                                 <Button
                                     variant="outline"
                                     size="sm"
-                                    disabled={page >= totalPages - 1}
+                                    disabled={page >= totalPages - 1 || !cursors[page + 1]}
                                     onClick={() => setPage(p => p + 1)}
                                     className="border-slate-700"
                                 >